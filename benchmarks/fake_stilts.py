@@ -0,0 +1,68 @@
+"""
+Stand-in for the STILTS `tmatchn` task, used by the benchmarks when no STILTS installation is available.
+
+It accepts the same argv as STILTS (JVM options, task name and key=value parameters), performs the sky match in group
+mode with the native engine functions and prints STILTS-like progress lines with timings. The `runner` parameter is
+accepted but has no effect, so all runners report the same result. Of the `icmdN` and `ocmd` filters, only `keepcols`
+is understood; other filter commands are ignored.
+"""
+import sys
+import time
+import shlex
+
+from CatMatcher.catalog_io import read_match_columns, fetch_rows, write_table
+from CatMatcher.native_matcher import radec_to_xyz, find_sky_pairs, group_members, select_joined_rows, join_tables
+
+
+def keepcols(command: str):
+    """ Columns of the last `keepcols` step of a filter command, or None if it has none."""
+
+    columns = None
+    for step in (command or "").split(";"):
+        words = shlex.split(step)
+        if words and words[0] == "keepcols":
+            columns = words[1].split()
+    return columns
+
+
+def main(argv):
+    args = [arg for arg in argv if not arg.startswith("-")]
+    task, params = args[0], dict(arg.split("=", 1) for arg in args[1:] if "=" in arg)
+    if task != "tmatchn" or params.get("matcher", "sky") != "sky" or params.get("multimode", "pairs") != "group":
+        print(f"fake stilts: only 'tmatchn matcher=sky multimode=group' is supported, got '{task}'", file=sys.stderr)
+        return 1
+
+    n_in = int(params["nin"])
+    files = [params[f"in{i}"] for i in range(1, n_in + 1)]
+    formats = [params.get(f"ifmt{i}", "csv") for i in range(1, n_in + 1)]
+
+    clock = time.perf_counter()
+    xyz_list = []
+    for i, (file, fmt) in enumerate(zip(files, formats), start=1):
+        positions = read_match_columns(file, fmt, params[f"values{i}"].split()[:2])
+        xyz_list.append(radec_to_xyz(positions[:, 0], positions[:, 1]))
+    print(f"Reading tables...... ({time.perf_counter() - clock:.3f}s)", file=sys.stderr, flush=True)
+
+    clock = time.perf_counter()
+    first, second, _ = find_sky_pairs(xyz_list, float(params["params"]))
+    print(f"Locating pairs...... ({time.perf_counter() - clock:.3f}s)", file=sys.stderr, flush=True)
+
+    clock = time.perf_counter()
+    members = group_members([len(xyz) for xyz in xyz_list], first, second, xyz_list)
+    members = select_joined_rows(members, [params.get(f"join{i}", "default") for i in range(1, n_in + 1)])
+    print(f"Grouping rows...... ({time.perf_counter() - clock:.3f}s)", file=sys.stderr, flush=True)
+
+    clock = time.perf_counter()
+    tables = [fetch_rows(file, fmt, members[:, t], columns=keepcols(params.get(f"icmd{t + 1}")))
+              for t, (file, fmt) in enumerate(zip(files, formats))]
+    suffixes = [params.get(f"suffix{i}", f"_{i}").lstrip("_") for i in range(1, n_in + 1)]
+    result = join_tables(members, tables, suffixes, params.get("fixcols", "dups"))
+    if keepcols(params.get("ocmd")) is not None:
+        result = result[keepcols(params.get("ocmd"))]
+    write_table(result, params["out"], params.get("ofmt", "csv"))
+    print(f"Writing output...... ({time.perf_counter() - clock:.3f}s)", file=sys.stderr, flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,102 @@
+"""
+Throughput of the query API of `SkyIndex`, in queries per second.
+
+A catalog is indexed once (a seeded synthetic catalog of the given size, or one of the example files), and batches of
+query positions drawn around its sources are answered by `cone_search`, `knn` and `match`. For every batch size, the
+best of a few repetitions is reported, together with the build time of the index and the mean number of results per
+query. Single-position batches show the fixed cost per call, large batches the vectorized throughput.
+
+Examples:
+    Synthetic catalog with 10^6 rows::
+
+        PYTHONPATH=src python benchmarks/query_benchmark.py --rows 1e6
+
+    Megeath example catalog, 30 arcsec cones and 10 neighbours::
+
+        PYTHONPATH=src python benchmarks/query_benchmark.py --catalog Data/example_files/Megeath_YSOs.csv \\
+            --columns RAJ2000,DEJ2000 --radius 30 --k 10
+"""
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+from CatMatcher.sky_index import SkyIndex
+from CatMatcher.native_matcher import radec_to_xyz
+from CatMatcher.synthetic import generate_catalogs
+
+BATCH_SIZES = [1, 100, 10_000, 100_000]
+
+
+def best_time(function, repeat: int):
+    """ Shortest wall time of `repeat` calls of `function`, in seconds, and its last result."""
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def query_positions(index: SkyIndex, n: int, scatter: float, rng: np.random.Generator):
+    """ Positions scattered by `scatter` arcseconds around randomly chosen rows of the index."""
+
+    tree, _ = index.index
+    xyz = tree.data[rng.integers(0, tree.n, n)] + rng.normal(0, np.radians(scatter / 3600), (n, 3))
+    xyz /= np.linalg.norm(xyz, axis=1)[:, None]
+    return np.degrees(np.arctan2(xyz[:, 1], xyz[:, 0])) % 360, np.degrees(np.arcsin(xyz[:, 2]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=lambda s: int(float(s)), default=100_000, help="rows of the synthetic catalog")
+    parser.add_argument("--catalog", help="index this csv catalog instead of a synthetic one")
+    parser.add_argument("--columns", default="RA,DE", help="RA and Dec columns of --catalog")
+    parser.add_argument("--batches", type=lambda s: [int(float(v)) for v in s.split(",")], default=BATCH_SIZES,
+                        help="numbers of queries per call, e.g. 1,1e4")
+    parser.add_argument("--radius", type=float, default=5.0, help="cone radius in arcseconds")
+    parser.add_argument("--k", type=int, default=5, help="number of neighbours")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.catalog:
+        index = SkyIndex.from_catalog(args.catalog, "csv", args.columns.split(","))
+    else:
+        catalog = generate_catalogs(args.rows, 1, seed=args.seed)[0]
+        index = SkyIndex(radec_to_xyz(catalog["RA"], catalog["DE"]))
+    results = {"rows": index.n_rows, "build_seconds": time.perf_counter() - start, "queries": {}}
+
+    rng = np.random.default_rng(args.seed)
+    queries = {
+        "cone_search": lambda ra, dec: index.cone_search(ra, dec, args.radius)[0],
+        "knn": lambda ra, dec: index.knn(ra, dec, args.k)[0],
+        "match": lambda ra, dec: index.match(ra, dec, args.radius)[0],
+    }
+    for batch in args.batches:
+        ra, dec = query_positions(index, batch, args.radius, rng)
+        for name, query in queries.items():
+            seconds, result = best_time(lambda: query(ra, dec), args.repeat)
+            n_results = np.count_nonzero(result >= 0) if name == "knn" else len(result)
+            results["queries"][f"{name}-{batch}"] = {"batch": batch, "queries_per_second": batch / seconds,
+                                                      "results_per_query": n_results / batch}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+
+    print(f"{results['rows']} rows indexed in {results['build_seconds']:.3f} s")
+    print(f"{'query':<12} {'batch':>8} {'queries/s':>12} {'results/query':>14}")
+    for key, result in results["queries"].items():
+        print(f"{key.rsplit('-', 1)[0]:<12} {result['batch']:>8} {result['queries_per_second']:>12.0f} "
+              f"{result['results_per_query']:>14.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
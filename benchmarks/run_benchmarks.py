@@ -0,0 +1,242 @@
+"""
+Benchmark suite for the match engines and the STILTS runners, on seeded synthetic catalogs.
+
+Every case (number of rows per table x number of tables) is matched by every backend: the native engine (unsharded and
+sharded) and STILTS with each `runner` setting. Each run is executed in its own process, so that its wall time and peak
+resident memory can be measured the same way for all backends. The outputs of a case are compared through a digest of
+their matched row ids, and the completeness (fraction of the sources common to all catalogs that are recovered as one
+complete group) is recorded as a sanity check.
+
+If no `stilts` executable is found on the PATH (or with --fake-stilts), the STILTS backends run `fake_stilts.py`, a
+stand-in built on the native engine, which keeps the harness and the recorded baseline usable without a Java
+installation. Timings of the stand-in say nothing about STILTS itself, so results are only compared with baseline
+entries recorded with the same kind of `stilts`.
+
+Examples:
+    Quick run, compared with the recorded baseline::
+
+        PYTHONPATH=src python benchmarks/run_benchmarks.py --compare benchmarks/baseline.json
+
+    Full grid (10^3 to 10^7 rows, 2 to 10 tables), recorded as new baseline::
+
+        PYTHONPATH=src python benchmarks/run_benchmarks.py --full --record benchmarks/baseline.json
+"""
+import os
+import sys
+import json
+import stat
+import shutil
+import hashlib
+import argparse
+import platform
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+import CatMatcher
+from CatMatcher.matcher import StiltsMatcher
+from CatMatcher.stilts_runner import run_stilts
+from CatMatcher.synthetic import generate_catalogs, write_catalogs
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+
+QUICK_SIZES = [1_000, 10_000]
+QUICK_TABLES = [2, 3]
+FULL_SIZES = [1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+FULL_TABLES = [2, 3, 5, 10]
+
+BACKENDS = {
+    "native": dict(engine="native"),
+    "native-sharded": dict(engine="native", n_shards=4),
+    **{f"stilts-{runner}": dict(engine="stilts", executor="direct", runner=runner)
+       for runner in ["parallel", "parallel-all", "sequential", "classic", "partest"]},
+}
+
+
+def install_fake_stilts(bin_dir: str):
+    """
+    Put an executable `stilts` that runs `fake_stilts.py` into `bin_dir` and prepend it to the PATH.
+    """
+
+    os.makedirs(bin_dir, exist_ok=True)
+    launcher = os.path.join(bin_dir, "stilts")
+    with open(launcher, "w") as f:
+        f.write(f"#!/bin/sh\nexec '{sys.executable}' '{os.path.join(BENCHMARK_DIR, 'fake_stilts.py')}' \"$@\"\n")
+    os.chmod(launcher, stat.S_IRWXU)
+
+    os.environ["PATH"] = bin_dir + os.pathsep + os.environ["PATH"]
+
+
+def output_summary(file: str, n_tables: int, n_shared: int):
+    """
+    Summarize a match output by a digest of its matched row ids and the completeness of the recovered sources.
+
+    Args:
+        file (str): Path of the output csv.
+        n_tables (int): Number of matched tables.
+        n_shared (int): Number of sources common to all tables.
+
+    Returns:
+        dict: Number of output rows, digest and completeness.
+    """
+
+    ids = pd.read_csv(file, usecols=[f"ID_t{t}" for t in range(1, n_tables + 1)] +
+                      [f"source_id_t{t}" for t in range(1, n_tables + 1)])
+    rows = ids[[f"ID_t{t}" for t in range(1, n_tables + 1)]].fillna(-1).to_numpy(np.int64)
+    rows = rows[np.lexsort(rows.T[::-1])]
+
+    sources = ids[[f"source_id_t{t}" for t in range(1, n_tables + 1)]].to_numpy(np.float64)
+    complete = np.isfinite(sources).all(axis=1) & (sources == sources[:, :1]).all(axis=1)
+
+    return {
+        "n_output_rows": int(len(rows)),
+        "digest": hashlib.blake2b(np.ascontiguousarray(rows).tobytes(), digest_size=8).hexdigest(),
+        "completeness": round(float(complete.sum() / n_shared), 6) if n_shared else None,
+    }
+
+
+def run_case(work_dir: str, n_rows: int, n_tables: int, backends: list, seed: int = 0, overlap: float = 0.5,
+             scatter: float = 0.2, match_radius: float = 1.0, timeout: float = None):
+    """
+    Generate the catalogs of one case and match them with every backend.
+
+    Returns:
+        dict: Results per backend, keyed by "<backend>/<n_rows>x<n_tables>".
+    """
+
+    case_dir = os.path.join(work_dir, f"{n_rows}x{n_tables}")
+    file_list = write_catalogs(generate_catalogs(n_rows, n_tables, overlap=overlap, scatter=scatter, seed=seed),
+                               case_dir)
+
+    results, reference = {}, None
+    for backend in backends:
+        config = dict(file_list=file_list, file_path=case_dir, match_radius=match_radius, match_values=["RA DE"],
+                      suffix_list=[f"t{t}" for t in range(1, n_tables + 1)], join_mode="default",
+                      output_file_name=f"{backend}.csv", use_index_cache=False, **BACKENDS[backend])
+
+        # every backend runs in its own process, which also isolates the peak memory of the native engine
+        run = run_stilts([sys.executable, os.path.abspath(__file__), "--worker", json.dumps(config)], timeout=timeout)
+        result = {"returncode": run.returncode, "wall_time": round(run.wall_time, 4),
+                  "throughput_rows_per_s": round(n_rows * n_tables / run.wall_time, 1),
+                  "peak_rss_mb": None if run.peak_rss_mb is None else round(run.peak_rss_mb, 1)}
+
+        output = os.path.join(case_dir, "CatMatcher_cwd", "matches", f"{backend}.csv")
+        if run.returncode == 0 and os.path.exists(output):
+            result.update(output_summary(output, n_tables, int(round(overlap * n_rows))))
+            reference = reference or result["digest"]
+            result["equal_to_reference"] = result["digest"] == reference
+        else:
+            result["error"] = "\n".join(run.stderr_lines[-5:])
+
+        results[f"{backend}/{n_rows}x{n_tables}"] = result
+        print(f"{backend:>20} {n_rows:>9}x{n_tables:<3} {json.dumps(result)}", flush=True)
+
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float):
+    """
+    Compare results with a baseline.
+
+    A regression is a failed run, a different output, a throughput below (1 - tolerance) times the baseline or a peak
+    memory above (1 + tolerance) times the baseline.
+
+    Returns:
+        list: Descriptions of the regressions.
+    """
+
+    if results["stilts"] != baseline["stilts"]:
+        print(f"Baseline was recorded with the {baseline['stilts']} stilts, this run used the {results['stilts']} one: "
+              f"nothing to compare.")
+        return []
+
+    regressions = []
+    for key, result in results["results"].items():
+        base = baseline["results"].get(key)
+        if base is None:
+            continue
+        if result["returncode"] != 0:
+            regressions.append(f"{key}: failed with return code {result['returncode']}")
+            continue
+        if base.get("digest") and result.get("digest") != base["digest"]:
+            regressions.append(f"{key}: output differs from the baseline")
+        if result["throughput_rows_per_s"] < (1 - tolerance) * base["throughput_rows_per_s"]:
+            regressions.append(f"{key}: throughput {result['throughput_rows_per_s']} rows/s, "
+                               f"baseline {base['throughput_rows_per_s']} rows/s")
+        if base.get("peak_rss_mb") and result.get("peak_rss_mb") and \
+                result["peak_rss_mb"] > (1 + tolerance) * base["peak_rss_mb"]:
+            regressions.append(f"{key}: peak memory {result['peak_rss_mb']} MB, baseline {base['peak_rss_mb']} MB")
+
+    return regressions
+
+
+def worker(config: str):
+    """ Run a single match in this process (called by `run_case` in a subprocess) and return its exit code."""
+
+    result = StiltsMatcher(**json.loads(config)).perform_Nmatch(return_output=False, log_file=False)
+    return 0 if result is None else result.returncode
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--full", action="store_true", help="run the full grid instead of the quick one")
+    parser.add_argument("--sizes", type=lambda s: [int(float(v)) for v in s.split(",")], help="rows per table, e.g. 1e3,1e5")
+    parser.add_argument("--tables", type=lambda s: [int(v) for v in s.split(",")], help="numbers of tables, e.g. 2,5")
+    parser.add_argument("--backends", type=lambda s: s.split(","), default=list(BACKENDS), help="comma separated")
+    parser.add_argument("--fake-stilts", action="store_true", help="use the stand-in even if STILTS is installed")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=None, help="seconds per run")
+    parser.add_argument("--record", help="write the results to this baseline file")
+    parser.add_argument("--compare", help="compare the results with this baseline file")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="relative tolerance of the comparison")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        return worker(args.worker)
+
+    # the worker processes (and the STILTS stand-in) import CatMatcher from the same location as this script
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(CatMatcher.__file__)))
+    os.environ["PYTHONPATH"] = os.pathsep.join(filter(None, [package_root, os.environ.get("PYTHONPATH")]))
+
+    sizes = args.sizes or (FULL_SIZES if args.full else QUICK_SIZES)
+    tables = args.tables or (FULL_TABLES if args.full else QUICK_TABLES)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        fake = args.fake_stilts or shutil.which("stilts") is None
+        if fake:
+            install_fake_stilts(os.path.join(work_dir, "bin"))
+
+        results = {"stilts": "fake" if fake else "real", "seed": args.seed,
+                   "machine": {"platform": platform.platform(), "python": platform.python_version(),
+                               "cpus": os.cpu_count()},
+                   "results": {}}
+        for n_rows in sizes:
+            for n_tables in tables:
+                results["results"].update(run_case(work_dir, n_rows, n_tables, args.backends, seed=args.seed,
+                                                   timeout=args.timeout))
+
+    unequal = [key for key, result in results["results"].items() if result.get("equal_to_reference") is False]
+    for key in unequal:
+        print(f"Result differs from the other backends: {key}")
+
+    if args.record:
+        with open(args.record, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {args.record}")
+
+    regressions = []
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if not regressions:
+            print("No regressions.")
+
+    return 1 if (regressions or unequal) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+"""
+Concurrent execution of many match configurations.
+
+Every STILTS job with `executor="shell"` writes its own command file and runs only that file (instead of the default
+script, which executes every command file in `scripts/` one after another); jobs with `executor="direct"` run through
+`perform_Nmatch`, with their timeout and the measured outcome of the run. Jobs run on a thread pool with a bounded
+number of workers, and a shared memory budget makes sure that the summed JVM heaps of all concurrently running STILTS
+jobs stay below a limit.
+Native-engine jobs run on the same threads and share the index, result and staging caches of their working directory,
+whose entries and temporary files are written under unique names and moved into place atomically.
+"""
+import os
+import re
+import time
+import threading
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+
+from CatMatcher.shell_helper import execute_shell_script
+from CatMatcher.stilts_runner import StiltsRunResult, StiltsRunError
+
+
+@dataclass
+class BatchJobResult:
+    """
+    Outcome of one job of a batch run.
+
+    Attributes:
+        name (str): Name of the job (the command file name).
+        returncode (int): Return code of the STILTS process (shell script for `executor="shell"`). Native jobs run
+            no process: 0 if the match succeeded, 1 if it raised an error.
+        wall_time (float): Wall-clock run time in seconds, excluding the time spent waiting for memory.
+        output_path (str): Path of the match output file.
+        heap_mb (float): Memory reserved for the job in megabytes.
+        stdout (str): Captured standard output.
+        stderr (str): Captured standard error, or the error message of a failed match.
+        run_result (Optional[StiltsRunResult]): Outcome of a job with `executor="direct"` (timings, peak memory,
+            timeout), None for other jobs.
+    """
+
+    name: str
+    returncode: int
+    wall_time: float
+    output_path: str
+    heap_mb: float
+    stdout: str = ""
+    stderr: str = ""
+    run_result: StiltsRunResult = None
+
+
+def heap_to_mb(heap: str):
+    """
+    Convert a JVM heap size string to megabytes.
+
+    Args:
+        heap (str): Heap size as given to the -Xmx option, e.g. "512M", "4G" or "1048576k".
+
+    Returns:
+        float: Heap size in megabytes.
+
+    Raises:
+        ValueError: If the string is not a valid heap size.
+    """
+
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)([kKmMgGtT]?)", str(heap).strip())
+    if not match:
+        raise ValueError(f"Invalid JVM heap size '{heap}'. Expected e.g. '512M' or '4G'.")
+
+    value, unit = float(match.group(1)), match.group(2).lower()
+    return value * {"": 1 / 1024 ** 2, "k": 1 / 1024, "m": 1, "g": 1024, "t": 1024 ** 2}[unit]
+
+
+class _MemoryBudget:
+    """
+    Counting semaphore over megabytes of memory. A request larger than the total budget is granted once nothing
+    else is running, so that an oversized job can never block the batch forever.
+    """
+
+    def __init__(self, total_mb: float):
+        self.total_mb = total_mb
+        self.used_mb = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self, mb: float):
+        with self._condition:
+            self._condition.wait_for(lambda: self.used_mb == 0 or self.used_mb + mb <= self.total_mb)
+            self.used_mb += mb
+
+    def release(self, mb: float):
+        with self._condition:
+            self.used_mb -= mb
+            self._condition.notify_all()
+
+
+def _run_job(matcher, budget: _MemoryBudget, heap_mb: float, shell: str):
+    """
+    Worker function: build and execute the match of a single configuration.
+
+    Args:
+        matcher (StiltsMatcher): Configured matcher of the job.
+        budget (_MemoryBudget): Shared memory budget of the batch.
+        heap_mb (float): Memory reserved for the job in megabytes.
+        shell (str): Shell used to execute the STILTS command of jobs with `executor="shell"`.
+
+    Returns:
+        BatchJobResult: Outcome of the job.
+    """
+
+    name = matcher.command_file_name
+    output_path = matcher._match_path + matcher.output_file_name
+
+    run_result = None
+    budget.acquire(heap_mb)
+    start = time.perf_counter()
+    try:
+        if matcher.engine == "native":
+            try:
+                matcher.perform_Nmatch()
+                returncode, stdout, stderr = 0, "", ""
+            except Exception as e:
+                returncode, stdout, stderr = 1, "", f"{type(e).__name__}: {e}"
+        elif matcher.executor == "direct":
+            try:
+                run_result = matcher.perform_Nmatch(return_output=False)  # None if restored from the result cache
+                returncode, stderr = 0, ""
+            except StiltsRunError as e:
+                run_result = e.result
+                # a run that exited with 0 but wrote no output failed as well
+                returncode, stderr = (run_result.returncode if run_result is not None else 0) or 1, str(e)
+            except Exception as e:
+                returncode, stderr = 1, f"{type(e).__name__}: {e}"
+            lines = run_result.stderr_lines if run_result is not None else []
+            stdout = "\n".join(run_result.stdout_lines) if run_result is not None else ""
+            stderr = "\n".join(lines + [stderr] if stderr else lines)
+        else:
+            matcher.build_N_match()
+            content = f"#!/bin/{shell}\n\n# Source the ~/.{shell}rc file\nsource ~/.{shell}rc\n\n./'{name}'\n"
+            result = execute_shell_script(destination_path=matcher._script_path, name=f"{name}.sh", content=content,
+                                          shell=shell)
+            returncode, stdout, stderr = result.returncode, result.stdout, result.stderr
+    finally:
+        budget.release(heap_mb)
+
+    return BatchJobResult(name=name, returncode=returncode, wall_time=time.perf_counter() - start,
+                          output_path=output_path, heap_mb=heap_mb, stdout=stdout, stderr=stderr, run_result=run_result)
+
+
+def run_batch(matchers: list, max_workers: int = None, max_total_heap: str = None, default_heap: str = "1G",
+              shell: str = "zsh"):
+    """
+    Run many match configurations concurrently.
+
+    Args:
+        matchers (list): Configured `StiltsMatcher` instances. Each needs its own command file and output file.
+        max_workers (int, optional): Maximum number of concurrent jobs. Defaults to the number of CPUs.
+        max_total_heap (str, optional): Upper limit of the summed JVM heap sizes of all running jobs, e.g. "16G". If
+            None, only `max_workers` limits the concurrency.
+        default_heap (str, optional): Heap assumed for jobs without `jvm_heap` (and for native-engine jobs).
+            (Default: "1G")
+        shell (str, optional): Shell used to execute the STILTS commands of jobs with `executor="shell"`, whose
+            `timeout` is not applied, as for `perform_Nmatch`. (Default: "zsh")
+
+    Returns:
+        list: One `BatchJobResult` per matcher, in the order of the input list.
+
+    Raises:
+        ValueError: If two jobs would write the same command file or the same output file.
+    """
+
+    command_files = [os.path.abspath(m._script_path + m.command_file_name) for m in matchers]
+    output_files = [os.path.abspath(m._match_path + m.output_file_name) for m in matchers]
+    for attribute, paths in (("command_file_name", command_files), ("output_file_name", output_files)):
+        if len(set(paths)) != len(paths):
+            raise ValueError(f"Each job of a batch needs a unique {attribute}.")
+
+    # planned heaps have to be known before the memory budget is handed out
+    for m in matchers:
+        if m.auto_plan and m.engine == "stilts":
+            m.plan_resources()
+
+    budget = _MemoryBudget(heap_to_mb(max_total_heap) if max_total_heap else float("inf"))
+
+    with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as pool:
+        futures = [pool.submit(_run_job, m, budget, heap_to_mb(m.jvm_heap or default_heap), shell) for m in matchers]
+        return [future.result() for future in futures]
@@ -0,0 +1,421 @@
+"""
+On-disk caches of the CatMatcher working directory.
+
+All caches are keyed by the content hash of the input files, so renaming or touching a file does not invalidate
+them, while any change of the data does. Every cache entry is a directory whose `meta.json` modification time serves
+as the last-access stamp for the least-recently-used eviction.
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+
+import numpy as np
+
+
+def _read_memo(memo_file: str):
+    """ Digests remembered in a memo file, empty if the file is missing or unreadable."""
+
+    try:
+        with open(memo_file) as f:
+            memo = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return memo if isinstance(memo, dict) else {}
+
+
+def file_digest(file: str, memo_file: str = None, chunk_size: int = 1 << 22):
+    """
+    Compute the content hash of a file.
+
+    Args:
+        file (str): Path to the file.
+        memo_file (str, optional): JSON file remembering the digests of previously hashed files. If the size and
+            modification time of the file are unchanged, the remembered digest is returned without reading the file.
+            The memo is replaced atomically, so that concurrent callers never read a partly written memo.
+        chunk_size (int, optional): Number of bytes read at a time.
+
+    Returns:
+        str: Hexadecimal BLAKE2b digest of the file content.
+    """
+
+    stat = os.stat(file)
+    signature = [stat.st_size, stat.st_mtime_ns]
+    path = os.path.abspath(file)
+
+    if memo_file:
+        known = _read_memo(memo_file).get(path)
+        if isinstance(known, dict) and known.get("signature") == signature:
+            return known["digest"]
+
+    digest = hashlib.blake2b(digest_size=20)
+    with open(file, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+
+    if memo_file:
+        memo = _read_memo(memo_file)
+        memo[path] = {"signature": signature, "digest": digest.hexdigest()}
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(memo_file)), prefix=".digests.",
+                                   suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(memo, f)
+            os.replace(tmp, memo_file)
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    return digest.hexdigest()
+
+
+def directory_size(path: str):
+    """
+    Get the total size of all files below a directory.
+
+    Args:
+        path (str): Path to the directory.
+
+    Returns:
+        int: Size in bytes.
+    """
+
+    size = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                size += os.path.getsize(os.path.join(root, name))
+            except OSError:  # removed meanwhile
+                pass
+    return size
+
+
+def enforce_size_cap(cache_dir: str, max_size_mb: float, keep: tuple = ()):
+    """
+    Evict least-recently-used cache entries until the cache fits into the size cap.
+
+    Args:
+        cache_dir (str): Cache directory holding one subdirectory per entry.
+        max_size_mb (float): Maximum total size of the entries in megabytes.
+        keep (tuple, optional): Names of entries that must not be evicted (e.g. the entry that was just written).
+
+    Returns:
+        list: Names of the evicted entries.
+    """
+
+    entries = []
+    for name in os.listdir(cache_dir):
+        entry = os.path.join(cache_dir, name)
+        if os.path.isdir(entry) and not name.startswith("."):
+            try:
+                last_used = os.path.getmtime(os.path.join(entry, "meta.json"))
+            except OSError:
+                last_used = 0
+            entries.append((last_used, name, directory_size(entry)))
+
+    total = sum(size for _, _, size in entries)
+    evicted = []
+    for _, name, size in sorted(entries):
+        if total <= max_size_mb * 1024 ** 2:
+            break
+        if name in keep:
+            continue
+        shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+        total -= size
+        evicted.append(name)
+
+    return evicted
+
+
+def sorted_position_arrays(xyz):
+    """
+    Build the declination-sorted representation of a table that is stored in the index cache.
+
+    Only the sorted positions are cached, not the KD-tree over them: rebuilding the tree from the memory-mapped
+    positions takes a fraction of the time needed to read and convert the catalog.
+
+    Args:
+        xyz (np.ndarray): Unit vectors of shape (n, 3), rows with missing coordinates are NaN.
+
+    Returns:
+        dict: Arrays "xyz" (valid unit vectors sorted by declination) and "rows" (their original row indices).
+    """
+
+    rows = np.flatnonzero(np.isfinite(xyz).all(axis=1))
+    order = np.argsort(xyz[rows, 2], kind="stable")  # z increases with the declination
+
+    return {"xyz": np.ascontiguousarray(xyz[rows[order]]), "rows": rows[order]}
+
+
+class IndexCache:
+    """
+    Persistent cache of the spatial structures of input catalogs.
+
+    Each entry holds the declination-sorted unit vectors and the matching original row indices of one catalog as
+    `.npy` files, which are opened memory-mapped. Entries are keyed by the content hash of the catalog, the format it is
+    read as and the columns used for matching, and the least recently used entries are evicted when the cache grows beyond
+    `max_size_mb`.
+
+    Args:
+        cache_dir (str): Directory of the cache (usually `CatMatcher_cwd/index_cache/`).
+        max_size_mb (float, optional): Size cap of the cache in megabytes. (Default: 1024)
+    """
+
+    def __init__(self, cache_dir: str, max_size_mb: float = 1024):
+        self.cache_dir = cache_dir
+        self.max_size_mb = max_size_mb
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, file: str, fmt: str, columns: list):
+        """
+        Build the cache key of a catalog.
+
+        Args:
+            file (str): Path to the catalog file.
+            fmt (str): Format the file is read as, since the same bytes read as another format give other positions.
+            columns (list): Names of the columns used for matching.
+
+        Returns:
+            str: Cache key.
+        """
+
+        digest = file_digest(file, memo_file=os.path.join(self.cache_dir, ".digests.json"))
+        return hashlib.blake2b(f"{digest}|{fmt}|{'|'.join(columns)}".encode(), digest_size=20).hexdigest()
+
+    def load(self, key: str):
+        """
+        Open a cache entry and mark it as recently used.
+
+        Args:
+            key (str): Cache key, see `key`.
+
+        Returns:
+            dict: The memory-mapped arrays of the entry plus its "meta" dictionary, or None if the entry does not exist
+            (or was evicted by a concurrent process while it was opened).
+        """
+
+        entry = os.path.join(self.cache_dir, key)
+        meta_file = os.path.join(entry, "meta.json")
+        try:
+            with open(meta_file) as f:
+                arrays = {"meta": json.load(f)}
+            for name in arrays["meta"]["arrays"]:
+                arrays[name] = np.load(os.path.join(entry, f"{name}.npy"), mmap_mode="r")
+            os.utime(meta_file)  # last-access stamp for the LRU eviction
+        except OSError:  # no entry, or evicted right now
+            return None
+        return arrays
+
+    def store(self, key: str, arrays: dict, **meta):
+        """
+        Write a new cache entry and evict old entries if the size cap is exceeded.
+
+        The entry is written to a temporary directory first and then renamed, so that an interrupted run never leaves
+        a partial entry behind.
+
+        Args:
+            key (str): Cache key, see `key`.
+            arrays (dict): Arrays to store, see `sorted_position_arrays`.
+            **meta: Additional JSON-serializable information stored with the entry.
+
+        Returns:
+            dict: The stored entry, opened as with `load`.
+        """
+
+        entry = os.path.join(self.cache_dir, key)
+        tmp = tempfile.mkdtemp(prefix=f".{key}.", suffix=".tmp", dir=self.cache_dir)
+
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp, f"{name}.npy"), array)
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump({"arrays": list(arrays), "created": time.time(), **meta}, f)
+
+        try:
+            os.rename(tmp, entry)
+        except OSError:  # written concurrently by another process or thread, keep theirs
+            shutil.rmtree(tmp, ignore_errors=True)
+
+        enforce_size_cap(self.cache_dir, self.max_size_mb, keep=(key,))
+        return self.load(key)
+
+
+def canonical_config(config: dict):
+    """
+    Serialize match settings in a canonical form, as part of a cache key.
+
+    Keys are sorted, tuples become lists, NumPy scalars become Python numbers, and objects with a `fingerprint`
+    method (e.g. `TransformPipeline`) are represented by their fingerprint.
+
+    Args:
+        config (dict): The settings.
+
+    Returns:
+        str: JSON string, equal for equal settings.
+    """
+
+    def default(value):
+        if hasattr(value, "fingerprint"):
+            return {type(value).__name__: value.fingerprint()}
+        if isinstance(value, np.generic):
+            return value.item()
+        if isinstance(value, os.PathLike):
+            return os.fspath(value)
+        raise TypeError(f"Setting of type {type(value).__name__} can not be part of a cache key.")
+
+    return json.dumps(config, sort_keys=True, default=default)
+
+
+class ResultCache:
+    """
+    Content-addressed cache of match results.
+
+    Entries are keyed by the content hash of every input file plus the canonical form of the match settings (see
+    `canonical_config`), so an unchanged re-run finds the result of the earlier run, wherever the inputs are located.
+    An entry holds the output file, the run log and/or the returned table as FITS, hard-linked to the files in the
+    `matches/` directory where possible. The size and modification time of every file are recorded, and an entry whose
+    files were changed in place is dropped when it is opened. The least recently used entries are evicted when the
+    cache grows beyond `max_size_mb`.
+
+    Args:
+        cache_dir (str): Directory of the cache (usually `CatMatcher_cwd/result_cache/`).
+        max_size_mb (float, optional): Size cap of the cache in megabytes. (Default: 4096)
+    """
+
+    def __init__(self, cache_dir: str, max_size_mb: float = 4096):
+        self.cache_dir = cache_dir
+        self.max_size_mb = max_size_mb
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, files: list, config: dict):
+        """
+        Build the cache key of a match.
+
+        Args:
+            files (list): Paths of the input files, in the order of the match.
+            config (dict): Match settings, see `canonical_config`.
+
+        Returns:
+            str: Cache key.
+        """
+
+        memo_file = os.path.join(self.cache_dir, ".digests.json")
+        digests = [file_digest(file, memo_file=memo_file) for file in files]
+        return hashlib.blake2b(f"{'|'.join(digests)}|{canonical_config(config)}".encode(), digest_size=20).hexdigest()
+
+    def load(self, key: str):
+        """
+        Open a cache entry and mark it as recently used.
+
+        Args:
+            key (str): Cache key, see `key`.
+
+        Returns:
+            dict: The "meta" dictionary of the entry and the paths of its "files" by name, or None if the entry does
+            not exist or one of its files was changed.
+        """
+
+        entry = os.path.join(self.cache_dir, key)
+        meta_file = os.path.join(entry, "meta.json")
+        try:
+            with open(meta_file) as f:
+                meta = json.load(f)
+        except OSError:  # no entry, or replaced by a concurrent store right now
+            return None
+
+        files = {}
+        for name, info in meta["files"].items():
+            path = os.path.join(entry, name)
+            stat = os.stat(path) if os.path.exists(path) else None
+            if stat is None or [stat.st_size, stat.st_mtime_ns] != info["signature"]:
+                # a hard-linked output was overwritten in place: the entry no longer holds the cached result
+                shutil.rmtree(entry, ignore_errors=True)
+                return None
+            files[name] = path
+
+        try:
+            os.utime(meta_file)  # last-access stamp for the LRU eviction
+        except OSError:
+            return None
+        return {"meta": meta, "files": files}
+
+    def store(self, key: str, files: dict, **meta):
+        """
+        Write a new cache entry and evict old entries if the size cap is exceeded.
+
+        The files are hard-linked into the entry (copied if the file system does not support links). The entry is
+        written to a temporary directory first and then renamed, so that an interrupted run never leaves a partial
+        entry behind. An existing entry with the same key is replaced.
+
+        Args:
+            key (str): Cache key, see `key`.
+            files (dict): Paths of the files to store, by name (e.g. "output", "log", "table").
+            **meta: Additional JSON-serializable information stored with the entry.
+
+        Returns:
+            dict: The stored entry, opened as with `load`. None if a concurrent store replaced it in the meantime.
+        """
+
+        entry = os.path.join(self.cache_dir, key)
+        tmp = tempfile.mkdtemp(prefix=f".{key}.", suffix=".tmp", dir=self.cache_dir)
+
+        signatures = {}
+        for name, file in files.items():
+            _link_or_copy(file, os.path.join(tmp, name))
+            stat = os.stat(os.path.join(tmp, name))
+            signatures[name] = {"source": os.path.basename(file), "signature": [stat.st_size, stat.st_mtime_ns]}
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump({"files": signatures, "created": time.time(), **meta}, f)
+
+        shutil.rmtree(entry, ignore_errors=True)
+        try:
+            os.rename(tmp, entry)
+        except OSError:  # written concurrently by another process or thread, keep theirs
+            shutil.rmtree(tmp, ignore_errors=True)
+
+        enforce_size_cap(self.cache_dir, self.max_size_mb, keep=(key,))
+        return self.load(key)
+
+    def restore(self, entry: dict, name: str, destination: str):
+        """
+        Put a file of a cache entry at its destination, as hard link if possible.
+
+        Args:
+            entry (dict): Cache entry, see `load`.
+            name (str): Name of the file in the entry.
+            destination (str): Path of the restored file. An existing file is replaced.
+        """
+
+        if os.path.lexists(destination):
+            os.remove(destination)
+        _link_or_copy(entry["files"][name], destination)
+
+    def invalidate(self, key: str = None):
+        """
+        Remove one entry, or all entries.
+
+        Args:
+            key (str, optional): Cache key of the entry to remove. All entries are removed if None.
+
+        Returns:
+            int: Number of removed entries.
+        """
+
+        names = [key] if key is not None else [name for name in os.listdir(self.cache_dir)
+                                               if not name.startswith(".")]
+        removed = 0
+        for name in names:
+            if os.path.isdir(os.path.join(self.cache_dir, name)):
+                shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+                removed += 1
+        return removed
+
+
+def _link_or_copy(source: str, destination: str):
+    """ Hard-link a file, or copy it if the file system does not support links."""
+
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
@@ -0,0 +1,1116 @@
+"""
+Reading and writing the catalog formats of `MatchConfigurator` without STILTS.
+
+All readers work in chunks of rows (see `iter_table`), and only the requested columns are converted:
+
+- csv: parsed by pandas.
+- tst: Starlink tab-separated table, parsed by pandas between the column header and the `[EOD]` line.
+- ecsv: the YAML header gives the type and unit of every column, the body is parsed by pandas.
+- fits and colfits: the first binary table extension is memory-mapped, row-oriented (fits) or column-oriented
+  (colfits, a single row holding every column as one array), so only the requested columns and rows are read from disk
+  and converted to native byte order.
+- votable: TABLEDATA serialization; the header is parsed as XML, the rows are scanned block-wise.
+
+Column types are kept as far as the format declares them (e.g. integer columns stay integers unless they have missing
+values, which pandas can only hold as float). Column units (ecsv, fits, colfits and votable) are returned in
+`table.attrs["units"]`, and `write_table` writes them back.
+"""
+import io
+import os
+import re
+import csv
+import json
+import mmap
+import xml.etree.ElementTree as ElementTree
+from xml.sax.saxutils import escape, quoteattr
+
+import numpy as np
+import pandas as pd
+
+FORMATS = ("colfits", "csv", "ecsv", "fits", "tst", "votable")
+
+
+def _check_format(fmt: str):
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported file format '{fmt}'. Allowed formats are: {sorted(FORMATS)}")
+
+
+def iter_table(file: str, fmt: str, columns: list = None, chunk_size: int = 100_000):
+    """
+    Read a catalog file in chunks of rows.
+
+    Args:
+        file (str): Path to the catalog file.
+        fmt (str): Format of the file, see `MatchConfigurator.ifmt` for the accepted formats.
+        columns (list, optional): Names of the columns to read. All columns are read if None.
+        chunk_size (int, optional): Number of rows per chunk, or None for a single chunk. (Default: 100000)
+
+    Returns:
+        Iterator[pd.DataFrame]: The chunks, with the columns in file order, indexed by row number, and the column
+        units in `attrs["units"]`. At least one (possibly empty) chunk is returned.
+
+    Raises:
+        ValueError: If the format is not supported, the file does not match it, or a requested column is missing.
+    """
+
+    _check_format(fmt)
+    if fmt in ("fits", "colfits"):
+        return _iter_fits(file, fmt == "colfits", columns, chunk_size)
+    if fmt == "votable":
+        return _iter_votable(file, columns, chunk_size)
+    return _iter_text(file, fmt, columns, chunk_size)
+
+
+def read_table(file: str, fmt: str, columns: list = None, chunk_size: int = 100_000):
+    """
+    Read a catalog file into memory.
+
+    Args:
+        file (str): Path to the catalog file.
+        fmt (str): Format of the file, see `MatchConfigurator.ifmt` for the accepted formats.
+        columns (list, optional): Names of the columns to read. All columns are read if None.
+        chunk_size (int, optional): Number of rows converted at a time (not for csv and tst). (Default: 100000)
+
+    Returns:
+        pd.DataFrame: Table with one column per catalog column, indexed by row number (starting at 0), with the
+        column units in `attrs["units"]`.
+
+    Raises:
+        ValueError: If the format is not supported, the file does not match it, or a requested column is missing.
+    """
+
+    # csv and tst declare no column types, which pandas can only infer consistently from all rows at once
+    chunks = list(iter_table(file, fmt, columns, None if fmt in ("csv", "tst") else chunk_size))
+    table = chunks[0] if len(chunks) == 1 else pd.concat(chunks)
+    table.attrs["units"] = chunks[0].attrs.get("units", {})
+    return table
+
+
+def read_column_names(file: str, fmt: str):
+    """
+    Read only the column names of a catalog.
+
+    Args:
+        file (str): Path to the catalog file.
+        fmt (str): Format of the file, see `MatchConfigurator.ifmt` for the accepted formats.
+
+    Returns:
+        list: Column names in file order.
+    """
+
+    if fmt == "csv":
+        return list(pd.read_csv(file, nrows=0).columns)
+    if fmt in ("fits", "colfits"):
+        return [column["name"] for column in _fits_columns(_fits_layout(file)[0], fmt == "colfits")]
+
+    return list(next(iter_table(file, fmt, chunk_size=1)).columns)
+
+
+def count_rows(file: str, fmt: str):
+    """
+    Count the data rows of a catalog without parsing its values.
+
+    For csv files, this counts the lines with a vectorized newline scan (assuming one line per row). FITS and colfits
+    files give the number in their header.
+
+    Args:
+        file (str): Path to the catalog file.
+        fmt (str): Format of the file, see `MatchConfigurator.ifmt` for the accepted formats.
+
+    Returns:
+        int: Number of rows.
+    """
+
+    if fmt == "csv":
+        return max(len(line_offsets(file)) - 2, 0)
+    if fmt in ("fits", "colfits"):
+        return _fits_source(file, fmt == "colfits")[0]
+    if fmt == "tst":
+        n_rows = _text_layout(file, fmt)["nrows"]
+        if n_rows is not None:
+            return n_rows
+
+    first = read_column_names(file, fmt)[:1]
+    return sum(len(chunk) for chunk in iter_table(file, fmt, columns=first))
+
+
+def read_match_columns(file: str, fmt: str, columns: list, chunk_size: int = 100_000):
+    """
+    Read only the match columns of a catalog, in fixed-size chunks, into a compact float64 array.
+
+    Only the requested columns are parsed, so that time and peak memory scale with the number of match columns
+    instead of the table width. The row id of each value is its position in the returned array.
+
+    Args:
+        file (str): Path to the catalog file.
+        fmt (str): Format of the file, see `MatchConfigurator.ifmt` for the accepted formats.
+        columns (list): Names of the columns to read.
+        chunk_size (int, optional): Number of rows parsed at a time. (Default: 100000)
+
+    Returns:
+        np.ndarray: Array of shape (n_rows, len(columns)), with the columns in the requested order.
+    """
+
+    if fmt != "csv":
+        chunks = [chunk[columns].to_numpy(np.float64) for chunk in iter_table(file, fmt, columns, chunk_size)]
+    else:
+        chunks = [chunk[columns].to_numpy(np.float64)
+                  for chunk in pd.read_csv(file, usecols=columns, chunksize=chunk_size, dtype=np.float64)]
+
+    return np.concatenate(chunks) if chunks else np.empty((0, len(columns)))
+
+
+def read_key_columns(file: str, fmt: str, columns: list, chunk_size: int = 100_000):
+    """
+    Read only the key columns of a catalog for the exact matcher, in fixed-size chunks, keeping their types.
+
+    Args:
+        file (str): Path to the catalog file.
+        fmt (str): Format of the file, see `MatchConfigurator.ifmt` for the accepted formats.
+        columns (list): Names of the columns to read.
+        chunk_size (int, optional): Number of rows parsed at a time. (Default: 100000)
+
+    Returns:
+        pd.DataFrame: The key columns in the requested order, indexed by row number.
+    """
+
+    if fmt != "csv":
+        return read_table(file, fmt, columns, chunk_size)[columns]
+
+    # strings are kept as they are written (e.g. with whitespace padding), the matcher normalizes them
+    chunks = list(pd.read_csv(file, usecols=columns, chunksize=chunk_size))
+    if not chunks:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(chunks, ignore_index=True)[columns]
+
+
+def line_offsets(file: str, block_size: int = 1 << 26):
+    """
+    Locate the start of every line of a text file with a vectorized, block-wise newline scan.
+
+    Args:
+        file (str): Path to the file.
+        block_size (int, optional): Number of bytes scanned at a time.
+
+    Returns:
+        np.ndarray: Byte offset of the start of every (non-empty) line, followed by the file size.
+    """
+
+    size = os.path.getsize(file)
+    if size == 0:
+        return np.zeros(1, dtype=np.int64)
+
+    data = np.memmap(file, dtype=np.uint8, mode="r")
+    starts = [np.zeros(1, dtype=np.int64)]
+    for start in range(0, size, block_size):
+        starts.append(np.flatnonzero(data[start:start + block_size] == ord("\n")).astype(np.int64) + start + 1)
+    starts = np.concatenate(starts)
+
+    return np.concatenate((starts[starts < size], [size]))
+
+
+def fetch_rows(file: str, fmt: str, row_ids, n_rows: int = None, chunk_size: int = 100_000, columns: list = None):
+    """
+    Read all (or the given) columns of a catalog, but only for the given rows.
+
+    For csv files, the byte offsets of the lines are located first and only the requested lines are parsed. This
+    requires one text line per row, which is verified against `n_rows` (the number of rows found by
+    `read_match_columns`). If the check fails (e.g. quoted line breaks), or `n_rows` is not given, the table is parsed
+    chunk-wise and only the requested rows are kept in memory, as for the other text formats and votable. FITS and
+    colfits files are memory-mapped, so only the requested rows are read.
+
+    Args:
+        file (str): Path to the catalog file.
+        fmt (str): Format of the file, see `MatchConfigurator.ifmt` for the accepted formats.
+        row_ids (np.ndarray): Row ids to read. Negative ids (missing group entries) are ignored.
+        n_rows (int, optional): Number of data rows of the catalog, enables the line-offset fast path for csv files.
+        chunk_size (int, optional): Number of rows parsed at a time on the chunk-wise path. (Default: 100000)
+        columns (list, optional): Names of the columns to read, in output order. All columns are read if None.
+
+    Returns:
+        pd.DataFrame: The requested rows, indexed by their row id.
+    """
+
+    row_ids = np.unique(np.asarray(row_ids))
+    row_ids = row_ids[row_ids >= 0]
+
+    if fmt in ("fits", "colfits"):
+        _, described, raw = _fits_source(file, fmt == "colfits")
+        names = _select_columns(file, list(described), columns)
+        table = _fits_frame({name: _fits_decode(raw[name][row_ids], described[name]) for name in names}, described,
+                            pd.Index(row_ids))
+        return table if columns is None else table[columns]
+
+    if fmt == "csv" and n_rows is not None:
+        offsets = line_offsets(file)
+        if len(offsets) - 2 == n_rows:  # header line + one line per row
+            with open(file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                lines = [data[offsets[0]:offsets[1]]]
+                lines += [data[offsets[i + 1]:offsets[i + 2]] for i in row_ids]
+            text = b"".join(line if line.endswith(b"\n") else line + b"\n" for line in lines)
+            table = pd.read_csv(io.BytesIO(text), usecols=columns)
+            table.index = row_ids
+            return table if columns is None else table[columns]
+
+    chunks = pd.read_csv(file, chunksize=chunk_size, usecols=columns) if fmt == "csv" else \
+        iter_table(file, fmt, columns, chunk_size)
+    parts, empty = [], None
+    for chunk in chunks:
+        lo, hi = np.searchsorted(row_ids, [chunk.index[0], chunk.index[-1] + 1]) if len(chunk) else (0, 0)
+        parts.append(chunk.loc[row_ids[lo:hi]])
+        empty = chunk.iloc[:0]
+
+    if parts:
+        table = pd.concat(parts)
+    else:
+        table = pd.read_csv(file, nrows=0, usecols=columns) if empty is None else empty
+    return table if columns is None else table[columns]
+
+
+def write_table(table, file: str, fmt: str, units: dict = None, chunk_size: int = 100_000):
+    """
+    Write a table to disk.
+
+    Args:
+        table (pd.DataFrame): Table to write.
+        file (str): Path of the output file.
+        fmt (str): Output format, see `MatchConfigurator.ofmt` for the accepted formats.
+        units (dict, optional): Unit of every column, written by the formats that have units (ecsv, fits, colfits and
+            votable). Defaults to `table.attrs["units"]`.
+        chunk_size (int, optional): Number of rows converted at a time. (Default: 100000)
+
+    Returns:
+        None
+
+    Raises:
+        ValueError: If the format is not supported.
+    """
+
+    _check_format(fmt)
+    units = table.attrs.get("units", {}) if units is None else units
+
+    if fmt == "csv":
+        table.to_csv(file, index=False, chunksize=chunk_size)
+    elif fmt == "tst":
+        _write_tst(table, file, chunk_size)
+    elif fmt == "ecsv":
+        _write_ecsv(table, file, units, chunk_size)
+    elif fmt == "votable":
+        _write_votable(table, file, units, chunk_size)
+    else:
+        with open(file, "wb") as f:
+            write_fits_table(table, f, units, colfits=fmt == "colfits", chunk_rows=chunk_size)
+
+
+def _select_columns(file: str, names: list, columns: list = None):
+    """ The requested columns in file order, checking that they exist."""
+
+    if columns is None:
+        return names
+    missing = [column for column in columns if column not in names]
+    if missing:
+        raise ValueError(f"Columns {missing} not found in {file}.")
+    return [name for name in names if name in columns]
+
+
+# ---------------------------
+# Text formats (csv, tst, ecsv)
+
+_TST_UNDERLINE = re.compile(r"-+(\t-+)*")
+
+
+def _text_layout(file: str, fmt: str):
+    """
+    Locate the column names and the data of a text catalog.
+
+    Returns:
+        dict: Keyword arguments of `pd.read_csv` ("sep", "skiprows", "header", "names" and "nrows") and the declared
+        "datatypes" and "units" of the columns (ecsv).
+    """
+
+    layout = {"sep": ",", "skiprows": 0, "header": 0, "names": None, "nrows": None, "datatypes": {}, "units": {}}
+
+    if fmt == "tst":
+        # the column names are the line underlined with dashes, the data ends at the [EOD] line
+        with open(file, newline="") as f:
+            previous = None
+            for number, line in enumerate(f):
+                line = line.rstrip("\r\n")
+                if previous is not None and _TST_UNDERLINE.fullmatch(line):
+                    break
+                previous = line
+            else:
+                raise ValueError(f"{file} is not a tst file: no column header found.")
+
+        offsets = line_offsets(file)
+        with open(file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            eod = data.rfind(b"\n[EOD]")
+        nrows = None if eod < 0 else int(np.searchsorted(offsets, eod + 1)) - (number + 1)
+        layout.update(sep="\t", skiprows=number + 1, header=None, names=previous.split("\t"), nrows=nrows)
+
+    elif fmt == "ecsv":
+        header = []
+        with open(file) as f:
+            for line in f:
+                if not line.startswith("#"):
+                    break
+                header.append(line.rstrip("\r\n"))
+        if not header or not header[0].startswith("# %ECSV"):
+            raise ValueError(f"{file} is not an ECSV file.")
+        delimiter, columns = _parse_ecsv_header(header[1:])
+        layout.update(sep=delimiter, skiprows=len(header),
+                      datatypes={c["name"]: c.get("datatype", "string") for c in columns},
+                      units={c["name"]: c["unit"] for c in columns if c.get("unit")})
+
+    return layout
+
+
+def _iter_text(file: str, fmt: str, columns: list, chunk_size: int):
+    """ Chunks of a csv, tst or ecsv file, see `iter_table`."""
+
+    layout = _text_layout(file, fmt)
+    datatypes = layout["datatypes"]
+    # floats and strings are parsed as declared, integers and booleans only if no value is missing
+    parse_types = {name: (str if datatype == "string" else datatype) for name, datatype in datatypes.items()
+                   if datatype == "string" or datatype.startswith("float")}
+    units = {name: unit for name, unit in layout["units"].items() if columns is None or name in columns}
+
+    options = dict(sep=layout["sep"], skiprows=layout["skiprows"], header=layout["header"], names=layout["names"],
+                   usecols=columns, dtype=parse_types or None,
+                   quoting=csv.QUOTE_NONE if fmt == "tst" else csv.QUOTE_MINIMAL)
+    if layout["nrows"] == 0:
+        chunks = []
+    elif chunk_size is None:
+        chunks = [pd.read_csv(file, nrows=layout["nrows"], **options)]
+    else:
+        chunks = pd.read_csv(file, nrows=layout["nrows"], chunksize=chunk_size, **options)
+    empty = True
+    for chunk in chunks:
+        empty = False
+        for name in chunk.columns:
+            datatype = datatypes.get(name, "string")
+            if (datatype == "bool" or datatype.startswith(("int", "uint"))) and chunk[name].notna().all():
+                chunk[name] = chunk[name].astype(datatype)
+        chunk.attrs["units"] = units
+        yield chunk
+
+    if empty:
+        chunk = pd.read_csv(file, nrows=0, **options)
+        chunk.attrs["units"] = units
+        yield chunk
+
+
+def _yaml_scalar(text: str):
+    """ Value of a plain or quoted YAML scalar."""
+
+    text = text.strip()
+    if text.startswith("'"):
+        return text[1:-1].replace("''", "'")
+    if text.startswith('"'):
+        return json.loads(text)
+    return text
+
+
+def _yaml_quote(value: str):
+    """ Write a string as YAML scalar, quoted unless it is a plain name."""
+
+    value = str(value)
+    return value if re.fullmatch(r"[A-Za-z_][\w.-]*", value) else json.dumps(value)
+
+
+_YAML_FLOW_ITEM = re.compile(r"""([\w-]+)\s*:\s*('(?:[^']|'')*'|"(?:[^"\\]|\\.)*"|[^,}]*)""")
+
+
+def _parse_ecsv_header(lines: list):
+    """
+    Read the delimiter and the column descriptions of an ECSV header.
+
+    Only the parts of the YAML header that describe the table layout are parsed: the `delimiter` and the name, unit
+    and datatype of every `datatype` entry, in flow (`- {name: ra, unit: deg, datatype: float64}`) or block style.
+
+    Returns:
+        tuple: The delimiter and the list of column descriptions.
+    """
+
+    delimiter, columns, section = " ", [], None
+    for line in lines:
+        text = line[2:] if line.startswith("# ") else line[1:]
+        if text.strip() in ("", "---"):
+            continue
+        if not text.startswith((" ", "-")):
+            key, _, value = text.partition(":")
+            section = key.strip()
+            if section == "delimiter":
+                delimiter = _yaml_scalar(value)
+            continue
+        if section != "datatype":
+            continue
+
+        item = text.strip()
+        if text.startswith("- "):
+            columns.append({})
+            item = item[2:].strip()
+        elif len(text) - len(text.lstrip()) != 2 or not columns:
+            continue  # nested metadata of a column
+        if item.startswith("{"):
+            columns[-1].update((key, _yaml_scalar(value)) for key, value in _YAML_FLOW_ITEM.findall(item[1:-1]))
+        elif ":" in item:
+            key, _, value = item.partition(":")
+            columns[-1][key.strip()] = _yaml_scalar(value)
+
+    return delimiter, columns
+
+
+def _ecsv_datatype(values: pd.Series):
+    """ ECSV datatype of a column."""
+
+    dtype = getattr(values.dtype, "numpy_dtype", values.dtype)
+    if pd.api.types.is_bool_dtype(values.dtype):
+        return "bool"
+    if isinstance(dtype, np.dtype) and dtype.kind in "iuf":
+        return dtype.name
+    return "string"
+
+
+def _write_ecsv(table: pd.DataFrame, file: str, units: dict, chunk_size: int):
+    """ Write a table as comma-separated ECSV file, with the type and unit of every column in the header."""
+
+    header = ["# %ECSV 1.0", "# ---", "# delimiter: ','", "# datatype:"]
+    for name in table.columns:
+        unit = f", unit: {_yaml_quote(units[name])}" if units.get(name) else ""
+        header.append(f"# - {{name: {_yaml_quote(name)}{unit}, datatype: {_ecsv_datatype(table[name])}}}")
+    header.append("# schema: astropy-2.0")
+
+    with open(file, "w", newline="") as f:
+        f.write("\n".join(header) + "\n")
+        table.to_csv(f, index=False, chunksize=chunk_size, lineterminator="\n")
+
+
+def _write_tst(table: pd.DataFrame, file: str, chunk_size: int):
+    """ Write a table as tab-separated table (tst), named after the file."""
+
+    with open(file, "w", newline="") as f:
+        f.write(f"{os.path.splitext(os.path.basename(file))[0]}\n\n")
+        f.write("\t".join(str(name) for name in table.columns) + "\n")
+        f.write("\t".join("-" * max(len(str(name)), 1) for name in table.columns) + "\n")
+        table.to_csv(f, sep="\t", header=False, index=False, chunksize=chunk_size, lineterminator="\n",
+                     quoting=csv.QUOTE_NONE, escapechar="\\")
+        f.write("[EOD]\n")
+
+
+# ---------------------------
+# VOTable
+
+_VOTABLE_TYPES = {"boolean": "?", "bit": "?", "unsignedByte": "u1", "short": "i2", "int": "i4", "long": "i8",
+                  "float": "f4", "double": "f8"}
+
+
+def _votable_column(texts: list, field: dict):
+    """ Convert the cell texts of one VOTable column to an array of its type."""
+
+    kind = _VOTABLE_TYPES.get(field["datatype"])
+    if kind is None or field["arraysize"] not in (None, "1"):
+        # strings, and arrays kept as their text
+        text = np.array(texts, dtype=object)
+        text[text == ""] = None
+        return text
+
+    if kind != "?" and field["null"] is None:
+        try:  # fast path without missing values
+            return np.array(texts, dtype=np.float64 if kind[0] == "f" else np.int64).astype(kind)
+        except ValueError:
+            pass
+
+    text = np.char.strip(np.array(texts, dtype=str))
+    missing = text == ""
+    if field["null"] is not None:
+        missing |= text == field["null"]
+
+    if kind == "?":
+        values = pd.Series(text).str[:1].str.upper().map({"T": True, "1": True, "F": False, "0": False})
+        missing |= values.isna().to_numpy()
+        return values.to_numpy(bool) if not missing.any() else values.where(~missing, None).to_numpy(object)
+    if kind[0] == "f":
+        return np.where(missing, "nan", text).astype(np.float64).astype(kind)
+    if not missing.any():
+        return text.astype(np.int64).astype(kind)
+    return np.where(missing, "nan", text).astype(np.float64)
+
+
+_VOTABLE_DATA = re.compile(rb"<((?:[\w.-]+:)?)(TABLEDATA|BINARY2?|FITS)\b[^>]*>")
+_VOTABLE_CELL = re.compile(r"<(?:[\w.-]+:)?TD\b[^>]*?(?:/>|>(.*?)</(?:[\w.-]+:)?TD>)", re.S)
+
+
+def _votable_fields(header: bytes, file: str):
+    """ Fields of the last table opened in a VOTable header."""
+
+    fields, parser = [], ElementTree.XMLPullParser(events=("start", "end"))
+    parser.feed(header)
+    for event, element in parser.read_events():
+        tag = element.tag.rpartition("}")[2]
+        if event == "start" and tag == "TABLE":
+            fields = []
+        elif event == "end" and tag == "FIELD":
+            values = next((child for child in element if child.tag.rpartition("}")[2] == "VALUES"), None)
+            name = element.get("name") or element.get("ID") or f"col{len(fields) + 1}"
+            while name in [f["name"] for f in fields]:
+                name += "_"
+            fields.append({"name": name, "datatype": element.get("datatype", "char"),
+                           "arraysize": element.get("arraysize"), "unit": element.get("unit"),
+                           "null": values.get("null") if values is not None else None})
+    if not fields:
+        raise ValueError(f"{file} holds no VOTable table.")
+    return fields
+
+
+def _votable_cells_of(block: str):
+    """ Texts of all cells of a block of complete TABLEDATA rows, with entities and CDATA sections replaced."""
+
+    plain = block.count("<TD>")
+    if plain == block.count("<TD") and 2 * plain == block.count("TD>"):
+        # plain <TD>...</TD> cells: every second piece between the cell tags is a cell text
+        cells = block.replace("</TD>", "<TD>").split("<TD>")[1::2]
+    else:
+        cells = _VOTABLE_CELL.findall(block)
+
+    if "&" in block or "<![CDATA[" in block:
+        cells = [(ElementTree.fromstring(f"<TD>{text}</TD>").text or "") if "&" in text or "<!" in text else text
+                 for text in cells]
+    return cells
+
+
+def _iter_votable(file: str, columns: list, chunk_size: int, block_size: int = 1 << 24):
+    """
+    Chunks of the first table of a VOTable file (TABLEDATA serialization), see `iter_table`.
+
+    Only the header is parsed as XML. The rows are split into cell texts block-wise, by string operations on all rows
+    of a block at once, and converted column-wise, so that parsing costs no Python call per cell.
+    """
+
+    with open(file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        found = _VOTABLE_DATA.search(data)
+        if found is not None and found.group(2) != b"TABLEDATA":
+            raise ValueError(f"Only the TABLEDATA serialization of VOTable is supported, {file} uses "
+                             f"{found.group(2).decode()}.")
+        fields = _votable_fields(data[:found.start()] if found is not None else data[:], file)
+        names = _select_columns(file, [f["name"] for f in fields], columns)
+        selected = [i for i, f in enumerate(fields) if f["name"] in names]
+        units = {fields[i]["name"]: fields[i]["unit"] for i in selected if fields[i]["unit"]}
+
+        def frame(cells, start):
+            n = len(cells) // len(fields)
+            values = {}
+            for i in selected:
+                values[fields[i]["name"]] = _votable_column(cells[i::len(fields)], fields[i])
+            table = pd.DataFrame(values, index=pd.RangeIndex(start, start + n))
+            table.attrs["units"] = units
+            return table
+
+        if found is None:
+            yield frame([], 0)
+            return
+
+        prefix = found.group(1)
+        row_end, data_end = "</" + prefix.decode() + "TR>", b"</" + prefix + b"TABLEDATA>"
+        position, start, cells = found.end(), 0, []
+        end = data.find(data_end, position)
+        end = len(data) if end < 0 else end
+        while position < end:
+            # cut the block after its last complete row
+            stop = min(position + block_size, end)
+            if stop < end:
+                last = data.rfind(row_end.encode(), position, stop)
+                if last < 0:
+                    last = data.find(row_end.encode(), stop, end)
+                stop = end if last < 0 else last + len(row_end)
+            block = data[position:stop].decode("utf-8")
+            position = stop
+
+            n_rows = block.count(row_end)
+            block_cells = _votable_cells_of(block)
+            if len(block_cells) != n_rows * len(fields):
+                raise ValueError(f"The rows of {file} do not all have {len(fields)} cells.")
+            cells += block_cells
+            while chunk_size is not None and len(cells) >= chunk_size * len(fields):
+                yield frame(cells[:chunk_size * len(fields)], start)
+                start, cells = start + chunk_size, cells[chunk_size * len(fields):]
+
+        if cells or start == 0:
+            yield frame(cells, start)
+
+
+def _votable_field(values: pd.Series):
+    """ Datatype and arraysize of the VOTable field of a column."""
+
+    dtype = getattr(values.dtype, "numpy_dtype", values.dtype)
+    if pd.api.types.is_bool_dtype(values.dtype):
+        return "boolean", None
+    if isinstance(dtype, np.dtype) and dtype.kind in "iuf":
+        if dtype.kind == "f":
+            return ("float" if dtype.itemsize == 4 else "double"), None
+        if dtype == np.uint8:
+            return "unsignedByte", None
+        if dtype == np.uint64 and values.max() >= 1 << 63:
+            return "char", "*"  # beyond the range of long, kept exact as text
+        # unsigned values move to the next larger signed type
+        size = dtype.itemsize * (2 if dtype.kind == "u" else 1)
+        return {1: "short", 2: "short", 4: "int"}.get(size, "long"), None
+    return "char", "*"
+
+
+def _votable_cells(values: pd.Series, datatype: str):
+    """ Cell texts of a column, empty for missing values."""
+
+    missing = values.isna().to_numpy()
+    if datatype == "boolean":
+        text = np.where(values.fillna(False).to_numpy(bool), "T", "F").astype(object)
+    elif datatype == "char":
+        text = values.map(lambda value: escape(str(value)), na_action="ignore").to_numpy(object)
+    else:
+        text = values.astype(str).to_numpy(object)
+    text[missing] = ""
+    return text
+
+
+def _write_votable(table: pd.DataFrame, file: str, units: dict, chunk_size: int):
+    """ Write a table as VOTable with TABLEDATA serialization."""
+
+    fields, datatypes = [], []
+    for name in table.columns:
+        datatype, arraysize = _votable_field(table[name])
+        attributes = f"name={quoteattr(str(name))} datatype=\"{datatype}\""
+        if arraysize:
+            attributes += f" arraysize=\"{arraysize}\""
+        if units.get(name):
+            attributes += f" unit={quoteattr(units[name])}"
+        fields.append(f"<FIELD {attributes}/>\n")
+        datatypes.append(datatype)
+
+    with open(file, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<VOTABLE version="1.4" xmlns="http://www.ivoa.net/xml/VOTable/v1.3">\n<RESOURCE>\n'
+                f"<TABLE name={quoteattr(os.path.splitext(os.path.basename(file))[0])}>\n")
+        f.write("".join(fields))
+        f.write("<DATA><TABLEDATA>\n")
+        for start in range(0, len(table), chunk_size):
+            chunk = table.iloc[start:start + chunk_size]
+            rows = np.full(len(chunk), "<TR>", dtype=object)
+            for name, datatype in zip(table.columns, datatypes):
+                rows = rows + "<TD>" + _votable_cells(chunk[name], datatype) + "</TD>"
+            f.write("".join(rows + "</TR>\n"))
+        f.write("</TABLEDATA></DATA>\n</TABLE>\n</RESOURCE>\n</VOTABLE>\n")
+
+
+# ---------------------------
+# FITS and colfits
+
+_FITS_BLOCK = 2880
+_FITS_TYPES = {"L": "u1", "B": "u1", "I": ">i2", "J": ">i4", "K": ">i8", "E": ">f4", "D": ">f8"}
+
+
+def _read_exact(stream, n_bytes: int):
+    """ Read exactly `n_bytes` from a stream (pipes may return less per call), or less at the end of the stream."""
+
+    parts, remaining = [], n_bytes
+    while remaining > 0:
+        part = stream.read(remaining)
+        if not part:
+            break
+        parts.append(part)
+        remaining -= len(part)
+    return b"".join(parts)
+
+
+def _read_fits_header(stream):
+    """
+    Read one FITS header from a stream.
+
+    Returns:
+        dict: Keywords and their values (str, int, float or bool), in header order. None at the end of the stream.
+    """
+
+    header = {}
+    while True:
+        block = _read_exact(stream, _FITS_BLOCK)
+        if len(block) < _FITS_BLOCK:
+            if not block and not header:
+                return None
+            raise ValueError("Truncated FITS header.")
+
+        for i in range(0, _FITS_BLOCK, 80):
+            card = block[i:i + 80].decode("ascii", errors="replace")
+            key = card[:8].strip()
+            if key == "END":
+                return header
+            if card[8:10] != "= ":
+                continue
+
+            value = card[10:].strip()
+            if value.startswith("'"):
+                header[key] = value[1:].split("'")[0].rstrip()
+                continue
+            value = value.split("/")[0].strip()
+            if value in ("T", "F"):
+                header[key] = value == "T"
+            else:
+                try:
+                    header[key] = int(value)
+                except ValueError:
+                    try:
+                        header[key] = float(value.replace("D", "E"))
+                    except ValueError:
+                        header[key] = value
+
+
+def _fits_data_size(header: dict):
+    """ Size in bytes of the data unit described by a header, including the padding to full blocks."""
+
+    n_axis = header.get("NAXIS", 0)
+    if not n_axis:
+        return 0
+
+    size = abs(header["BITPIX"]) // 8
+    for i in range(1, n_axis + 1):
+        size *= header[f"NAXIS{i}"]
+    size = (size + header.get("PCOUNT", 0)) * header.get("GCOUNT", 1)
+    return -(-size // _FITS_BLOCK) * _FITS_BLOCK
+
+
+def _fits_columns(header: dict, colfits: bool = False):
+    """
+    Describe the columns of a binary table header.
+
+    In a colfits table, the single row holds every column as one array, whose last dimension (TDIMn) is the number of
+    rows.
+
+    Returns:
+        list: Per column a dict with its "name", TFORM "code", element "dtype" in the file, "native" dtype after
+        decoding, byte "offset" in the row, "n_rows" (colfits) and the "unit", "null" (TNULL), "ucd", "scale" and
+        "zero" (TSCAL, TZERO).
+
+    Raises:
+        ValueError: If a column type is not supported.
+    """
+
+    columns, names, offset = [], set(), 0
+    for i in range(1, header["TFIELDS"] + 1):
+        tform = str(header[f"TFORM{i}"]).strip()
+        repeat, code = int(tform[:-1] or 1), tform[-1]
+        if code != "A" and code not in _FITS_TYPES:
+            raise ValueError(f"Unsupported FITS column type '{tform}' of column {i}.")
+
+        n_rows = None
+        if colfits:
+            dims = [int(d) for d in re.findall(r"\d+", str(header.get(f"TDIM{i}", "")))]
+            n_rows = dims[-1] if dims else repeat
+            repeat = repeat // n_rows if n_rows else (dims[0] if len(dims) > 1 else 1)
+
+        scale, zero = header.get(f"TSCAL{i}", 1), header.get(f"TZERO{i}", 0)
+        if code == "A":
+            dtype = native = np.dtype(f"S{repeat}")
+        else:
+            element = np.dtype(_FITS_TYPES[code])
+            bits = 8 * element.itemsize
+            if code == "L":
+                native = np.dtype("?")
+            elif code in "IJK" and scale == 1 and zero == 1 << (bits - 1):
+                native = np.dtype(f"u{element.itemsize}")  # unsigned integers, stored with an offset
+            elif (scale, zero) != (1, 0):
+                native = np.dtype("f8")
+            else:
+                native = element.newbyteorder("=")
+            dtype = element if repeat == 1 else np.dtype((element, (repeat,)))
+            native = native if repeat == 1 else np.dtype((native, (repeat,)))
+
+        name = str(header.get(f"TTYPE{i}", f"col{i}"))
+        while name in names:
+            name += "_"
+        names.add(name)
+        columns.append({"name": name, "code": code, "dtype": dtype, "native": native, "offset": offset,
+                        "n_rows": n_rows, "unit": header.get(f"TUNIT{i}"), "null": header.get(f"TNULL{i}"),
+                        "ucd": header.get(f"TUCD{i}"), "scale": scale, "zero": zero})
+        offset += dtype.itemsize * (n_rows or 1)
+
+    return columns
+
+
+def _fits_decode(raw, column: dict):
+    """ Convert raw values of a column (file byte order) to its native type."""
+
+    if column["code"] == "L":
+        return raw == ord("T")
+    if column["code"] == "A":
+        return np.asarray(raw)
+    base = column["native"].base
+    if base.kind == "u" and column["code"] != "B":
+        signed = raw.astype(f"i{base.itemsize}")
+        return signed.view(base) ^ base.type(1 << (8 * base.itemsize - 1))
+    if (column["scale"], column["zero"]) != (1, 0):
+        return raw * column["scale"] + column["zero"]
+    return raw.astype(base)
+
+
+def _fits_layout(file: str):
+    """ Header and byte offset of the data of the first binary table extension of a FITS file."""
+
+    with open(file, "rb") as f:
+        primary = _read_fits_header(f)
+        if primary is None or not primary.get("SIMPLE"):
+            raise ValueError(f"{file} is not a FITS file.")
+        f.seek(_fits_data_size(primary), os.SEEK_CUR)
+        header = _read_fits_header(f)
+        if header is None or header.get("XTENSION") != "BINTABLE":
+            raise ValueError(f"{file} holds no binary table extension.")
+        return header, f.tell()
+
+
+def _fits_source(file: str, colfits: bool):
+    """
+    Memory-map the first binary table of a FITS or colfits file.
+
+    Returns:
+        tuple: Number of rows, column descriptions by name (see `_fits_columns`) and the raw values of every column
+        (memory-mapped, in file byte order) by name.
+    """
+
+    header, data_offset = _fits_layout(file)
+    columns = _fits_columns(header, colfits)
+
+    if colfits:
+        n_rows = columns[0]["n_rows"] if columns else 0
+        raw = {c["name"]: np.memmap(file, dtype=c["dtype"], mode="r", offset=data_offset + c["offset"],
+                                    shape=(n_rows,)) if n_rows else np.empty(0, dtype=c["dtype"]) for c in columns}
+    else:
+        n_rows = header["NAXIS2"]
+        dtype = np.dtype({"names": [c["name"] for c in columns], "formats": [c["dtype"] for c in columns],
+                          "offsets": [c["offset"] for c in columns], "itemsize": header["NAXIS1"]})
+        rows = np.memmap(file, dtype=dtype, mode="r", offset=data_offset, shape=(n_rows,)) if n_rows else \
+            np.empty(0, dtype=dtype)
+        raw = {c["name"]: rows[c["name"]] for c in columns}
+
+    return n_rows, {c["name"]: c for c in columns}, raw
+
+
+def _iter_fits(file: str, colfits: bool, columns: list, chunk_size: int):
+    """ Chunks of a memory-mapped FITS or colfits table, see `iter_table`."""
+
+    n_rows, described, raw = _fits_source(file, colfits)
+    names = _select_columns(file, list(described), columns)
+    units = {name: described[name]["unit"] for name in names if described[name]["unit"]}
+
+    chunk_size = chunk_size or max(n_rows, 1)
+    for start in range(0, max(n_rows, 1), chunk_size):
+        stop = min(start + chunk_size, n_rows)
+        table = _fits_frame({name: _fits_decode(raw[name][start:stop], described[name]) for name in names}, described,
+                            pd.RangeIndex(start, stop))
+        table.attrs["units"] = units
+        yield table
+
+
+def read_fits_table(stream, chunk_rows: int = 100_000):
+    """
+    Decode the first binary table of a FITS stream incrementally.
+
+    The stream is consumed in chunks of `chunk_rows` rows, which are converted to native byte order straight into the
+    preallocated result, so that neither the raw stream nor a second copy of the table is held in memory. This works
+    on pipes (e.g. the standard output of `stilts ... out=- ofmt=fits`) and HTTP responses as well as on files.
+
+    Args:
+        stream (BinaryIO): Readable binary stream positioned at the start of the FITS file.
+        chunk_rows (int, optional): Number of rows decoded at a time. (Default: 100000)
+
+    Returns:
+        tuple: The table as NumPy structured array, and a dictionary with the "unit", "null" (TNULL value of integer
+        columns) and "ucd" of every column.
+
+    Raises:
+        ValueError: If the stream holds no binary table, or the table uses unsupported column types.
+    """
+
+    primary = _read_fits_header(stream)
+    if primary is None or not primary.get("SIMPLE"):
+        raise ValueError("Stream is not a FITS file.")
+    _read_exact(stream, _fits_data_size(primary))
+
+    header = _read_fits_header(stream)
+    if header is None or header.get("XTENSION") != "BINTABLE":
+        raise ValueError("FITS stream holds no binary table extension.")
+
+    n_rows, row_bytes = header["NAXIS2"], header["NAXIS1"]
+    columns = _fits_columns(header)
+    file_dtype = np.dtype({"names": [c["name"] for c in columns], "formats": [c["dtype"] for c in columns],
+                           "offsets": [c["offset"] for c in columns], "itemsize": row_bytes})
+    table = np.empty(n_rows, dtype=[(c["name"], c["native"]) for c in columns])
+
+    for start in range(0, n_rows, chunk_rows):
+        stop = min(start + chunk_rows, n_rows)
+        buffer = _read_exact(stream, (stop - start) * row_bytes)
+        if len(buffer) < (stop - start) * row_bytes:
+            raise ValueError(f"FITS stream ended after {start + len(buffer) // row_bytes} of {n_rows} rows.")
+        chunk = np.frombuffer(buffer, dtype=file_dtype)
+        for column in columns:
+            table[column["name"]][start:stop] = _fits_decode(chunk[column["name"]], column)
+
+    return table, {c["name"]: {key: c[key] for key in ("unit", "null", "ucd")} for c in columns}
+
+
+def _fits_frame(values: dict, meta: dict, index):
+    """ Build a DataFrame from decoded FITS columns, see `fits_to_dataframe`."""
+
+    columns = {}
+    for name, column in values.items():
+        if column.dtype.kind == "S":
+            column = np.char.rstrip(np.char.decode(column, "ascii", errors="replace")).astype(object)
+            # FITS has no null strings; like STILTS, blank strings are read as missing
+            column[column == ""] = None
+        elif column.ndim > 1:
+            column = list(column)
+        elif meta[name]["null"] is not None and column.dtype.kind in "iu":
+            missing = column == meta[name]["null"]
+            if missing.any():
+                column = np.where(missing, np.nan, column.astype(np.float64))
+        columns[name] = column
+
+    return pd.DataFrame(columns, index=index)
+
+
+def fits_to_dataframe(table, meta: dict):
+    """
+    Convert a decoded FITS table into a DataFrame, with strings decoded and blank strings and null integers as
+    missing values.
+
+    Args:
+        table (np.ndarray): Structured array, see `read_fits_table`.
+        meta (dict): Column metadata, see `read_fits_table`.
+
+    Returns:
+        pd.DataFrame: The table.
+    """
+
+    return _fits_frame({name: table[name] for name in table.dtype.names}, meta, pd.RangeIndex(len(table)))
+
+
+def _fits_encoding(values: pd.Series):
+    """
+    Choose the FITS representation of a column.
+
+    Returns:
+        tuple: TFORM code, element dtype in the file, TNULL and TZERO values (or None), and a function encoding the
+        rows `start:stop` of the column to the file dtype.
+    """
+
+    dtype = getattr(values.dtype, "numpy_dtype", values.dtype)
+
+    if pd.api.types.is_bool_dtype(values.dtype):
+        def encode(start, stop):
+            part = values.iloc[start:stop]
+            return np.where(part.isna(), 0, np.where(part.fillna(False).to_numpy(bool), ord("T"), ord("F"))).astype("u1")
+        return "L", np.dtype("u1"), None, None, encode
+
+    if isinstance(dtype, np.dtype) and dtype.kind in "iu":
+        has_null = bool(values.isna().any())
+        if dtype == np.uint8:
+            code, fill, null, zero = "B", 255, 255, None
+        elif dtype.kind == "u":
+            # unsigned integers are stored as signed ones with an offset, missing values as the largest value
+            code = {2: "I", 4: "J"}.get(dtype.itemsize, "K")
+            fill, zero = np.iinfo(dtype).max, 1 << (8 * dtype.itemsize - 1)
+            null = np.iinfo(f"i{dtype.itemsize}").max
+        else:
+            code = {1: "I", 2: "I", 4: "J"}.get(dtype.itemsize, "K")
+            fill = null = int(np.iinfo(_FITS_TYPES[code]).min)
+            zero = None
+        file_dtype = np.dtype(_FITS_TYPES[code])
+
+        def encode(start, stop):
+            data = values.iloc[start:stop].to_numpy(dtype=dtype, na_value=fill)
+            if zero is not None:
+                data = (data ^ dtype.type(zero)).view(f"i{dtype.itemsize}")
+            return data.astype(file_dtype)
+        return code, file_dtype, (null if has_null else None), zero, encode
+
+    if isinstance(dtype, np.dtype) and dtype.kind == "f":
+        code = "E" if dtype.itemsize == 4 else "D"
+        file_dtype = np.dtype(_FITS_TYPES[code])
+        return code, file_dtype, None, None, \
+            lambda start, stop: values.iloc[start:stop].to_numpy(dtype=np.float64, na_value=np.nan).astype(file_dtype)
+
+    # everything else as strings; missing strings are written as empty strings
+    encoded = values.map(lambda value: str(value).encode("utf-8"), na_action="ignore").fillna(b"").tolist()
+    data = np.array(encoded, dtype=f"S{max(max(map(len, encoded), default=1), 1)}")
+    return "A", data.dtype, None, None, lambda start, stop: data[start:stop]
+
+
+def write_fits_table(table: pd.DataFrame, stream, units: dict = None, colfits: bool = False,
+                     chunk_rows: int = 100_000):
+    """
+    Write a table as FITS file with one binary table extension.
+
+    Args:
+        table (pd.DataFrame): Table to write. Numeric, boolean and string columns are supported; missing strings are
+            written as empty strings, missing integers as TNULL values.
+        stream (BinaryIO): Writable binary stream.
+        units (dict, optional): Unit of every column, written as TUNITn.
+        colfits (bool, optional): If True, the table is written column-oriented (colfits): a single row holding every
+            column as one array, so that a reader can memory-map each column contiguously. (Default: False)
+        chunk_rows (int, optional): Number of rows converted at a time. (Default: 100000)
+
+    Returns:
+        None
+    """
+
+    def card(key, value=None):
+        if value is None:
+            return f"{key:<80}"
+        if isinstance(value, bool):
+            return f"{key:<8}= {'T' if value else 'F':>20}".ljust(80)
+        if isinstance(value, str):
+            quoted = "'" + value.replace("'", "''").ljust(8) + "'"
+            return f"{key:<8}= {quoted:<20}".ljust(80)
+        return f"{key:<8}= {value:>20}".ljust(80)
+
+    def write_header(cards):
+        text = "".join(cards + [card("END")])
+        text += " " * (-len(text) % _FITS_BLOCK)
+        stream.write(text.encode("ascii"))
+
+    write_header([card("SIMPLE", True), card("BITPIX", 8), card("NAXIS", 0), card("EXTEND", True)])
+
+    n_rows = len(table)
+    encodings, cards = [], []
+    for i, name in enumerate(table.columns, start=1):
+        code, dtype, null, zero, encode = _fits_encoding(table[name])
+        encodings.append((dtype, encode))
+        width = dtype.itemsize if code == "A" else 1
+        if colfits:
+            cards += [card(f"TTYPE{i}", str(name)), card(f"TFORM{i}", f"{n_rows * width}{code}"),
+                      card(f"TDIM{i}", f"({width},{n_rows})" if code == "A" else f"({n_rows})")]
+        else:
+            cards += [card(f"TTYPE{i}", str(name)), card(f"TFORM{i}", f"{width}{code}")]
+        if null is not None:
+            cards.append(card(f"TNULL{i}", int(null)))
+        if zero is not None:
+            cards.append(card(f"TZERO{i}", int(zero)))
+        if units and units.get(name):
+            cards.append(card(f"TUNIT{i}", units[name]))
+
+    row_bytes = sum(dtype.itemsize for dtype, _ in encodings)
+    write_header([card("XTENSION", "BINTABLE"), card("BITPIX", 8), card("NAXIS", 2),
+                  card("NAXIS1", row_bytes * (n_rows if colfits else 1)), card("NAXIS2", 1 if colfits else n_rows),
+                  card("PCOUNT", 0), card("GCOUNT", 1), card("TFIELDS", len(table.columns))] + cards)
+
+    if colfits:
+        for dtype, encode in encodings:
+            for start in range(0, n_rows, chunk_rows):
+                stream.write(encode(start, min(start + chunk_rows, n_rows)).tobytes())
+    else:
+        row_dtype = np.dtype([(f"f{i}", dtype) for i, (dtype, _) in enumerate(encodings)])
+        for start in range(0, n_rows, chunk_rows):
+            stop = min(start + chunk_rows, n_rows)
+            rows = np.empty(stop - start, dtype=row_dtype)
+            for i, (_, encode) in enumerate(encodings):
+                rows[f"f{i}"] = encode(start, stop)
+            stream.write(rows.tobytes())
+
+    size = row_bytes * n_rows
+    stream.write(b"\0" * (-size % _FITS_BLOCK))
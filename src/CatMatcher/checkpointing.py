@@ -0,0 +1,156 @@
+"""
+Tile-level checkpointing of the native sky matcher.
+
+The pair search, which takes most of the time of a large match, is split into declination tiles like the sharded
+search (see `CatMatcher.sharding`). A manifest lists the tiles together with a fingerprint of the inputs and settings.
+The pairs of every finished tile are written to their own `.npz` file, and the manifest is updated after every tile;
+both are written to a temporary name and renamed, so a crash never leaves a partial tile behind. A restarted run with
+the same fingerprint only searches the tiles that are not finished yet, and the pairs of all tiles are merged at the
+end. After a failure, at most the tiles that were running at that moment (one per worker) are computed again.
+"""
+import os
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from CatMatcher.native_matcher import table_offsets
+from CatMatcher.sharding import xyz_to_dec, declination_zones, _match_zone
+
+MANIFEST_VERSION = 1
+
+
+def _write_json_atomic(file: str, content: dict):
+    """ Write a JSON file under a temporary name and rename it."""
+
+    tmp = f"{file}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(content, f)
+    os.replace(tmp, file)
+
+
+def load_manifest(tile_dir: str, fingerprint: dict):
+    """
+    Read the tile manifest of an earlier run.
+
+    Args:
+        tile_dir (str): Directory of the tiles.
+        fingerprint (dict): JSON-serializable description of the inputs and settings of the current run.
+
+    Returns:
+        dict: The manifest, or None if there is none, or it belongs to other inputs or settings.
+    """
+
+    file = os.path.join(tile_dir, "manifest.json")
+    if not os.path.exists(file):
+        return None
+    with open(file) as f:
+        manifest = json.load(f)
+    if manifest.get("version") != MANIFEST_VERSION or manifest.get("fingerprint") != fingerprint:
+        return None
+    return manifest
+
+
+def completed_tiles(tile_dir: str, manifest: dict):
+    """
+    Get the tiles of a manifest whose pairs are stored.
+
+    Args:
+        tile_dir (str): Directory of the tiles.
+        manifest (dict): The tile manifest, see `load_manifest`.
+
+    Returns:
+        list: Indices of the completed tiles.
+    """
+
+    return [tile["zone"] for tile in manifest["tiles"]
+            if tile["done"] and os.path.exists(os.path.join(tile_dir, tile["file"]))]
+
+
+def find_sky_pairs_checkpointed(xyz_list: list, match_radius: float, n_tiles: int, tile_dir: str,
+                                fingerprint: dict, n_workers: int = None, on_tile=None):
+    """
+    Find all pairs of rows from different tables within the match radius, tile by tile, resuming an earlier run.
+
+    Args:
+        xyz_list (list): Unit vectors of every input table.
+        match_radius (float): Match radius in arcseconds.
+        n_tiles (int): Number of declination tiles.
+        tile_dir (str): Directory for the manifest and the pairs of the finished tiles. It is created if necessary.
+        fingerprint (dict): JSON-serializable description of the inputs and settings (e.g. content hashes, columns and
+            radius). Tiles of an earlier run are only reused if it matches.
+        n_workers (int, optional): Number of worker processes. With one worker, the tiles are searched in this
+            process. Defaults to the number of CPUs.
+        on_tile (callable, optional): Called with the index of every tile after its pairs were stored.
+
+    Returns:
+        tuple: Global node ids of the first and second pair member, and the separation of each pair in arcseconds,
+        sorted by node ids. The pairs are identical to the ones of `find_sky_pairs`.
+    """
+
+    os.makedirs(tile_dir, exist_ok=True)
+    manifest_file = os.path.join(tile_dir, "manifest.json")
+    dec_list = [xyz_to_dec(xyz) for xyz in xyz_list]
+
+    manifest = load_manifest(tile_dir, fingerprint)
+    if manifest is None:
+        # tiles of other inputs or settings are useless
+        for name in os.listdir(tile_dir):
+            if name.startswith("tile_") and name.endswith(".npz"):
+                os.remove(os.path.join(tile_dir, name))
+        edges = declination_zones(dec_list, n_tiles)
+        manifest = {"version": MANIFEST_VERSION, "fingerprint": fingerprint, "edges": edges.tolist(),
+                    "created": time.time(),
+                    "tiles": [{"zone": zone, "file": f"tile_{zone:05d}.npz", "done": False, "n_pairs": None}
+                              for zone in range(len(edges) - 1)]}
+        _write_json_atomic(manifest_file, manifest)
+
+    # the edges of the first attempt are kept, so that the stored tiles and the remaining ones fit together
+    edges = np.asarray(manifest["edges"])
+    done = set(completed_tiles(tile_dir, manifest))
+    offsets = table_offsets([len(xyz) for xyz in xyz_list])
+    margin = match_radius / 3600 + 1e-9  # angular separation is never smaller than the declination difference
+
+    def job(zone):
+        lo, hi = edges[zone], edges[zone + 1] + margin
+        rows = [np.flatnonzero((dec >= lo) & (dec < hi)) for dec in dec_list]
+        return (zone, edges, [xyz[r] for xyz, r in zip(xyz_list, rows)], [r + offsets[t] for t, r in enumerate(rows)],
+                match_radius)
+
+    def store(zone, pairs):
+        tile = manifest["tiles"][zone]
+        tmp = os.path.join(tile_dir, f".{tile['file']}.{os.getpid()}.tmp.npz")
+        np.savez(tmp, first=pairs[0], second=pairs[1], sep=pairs[2])
+        os.replace(tmp, os.path.join(tile_dir, tile["file"]))
+        tile.update(done=True, n_pairs=int(len(pairs[0])))
+        _write_json_atomic(manifest_file, manifest)
+        if on_tile is not None:
+            on_tile(zone)
+
+    pending = [tile["zone"] for tile in manifest["tiles"] if tile["zone"] not in done]
+    if (n_workers or os.cpu_count()) == 1:
+        for zone in pending:
+            store(zone, _match_zone(*job(zone)))
+    elif pending:
+        with ProcessPoolExecutor(max_workers=n_workers or os.cpu_count()) as pool:
+            futures = {pool.submit(_match_zone, *job(zone)): zone for zone in pending}
+            try:
+                for future in as_completed(futures):
+                    store(futures[future], future.result())
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+
+    parts = []
+    for tile in manifest["tiles"]:
+        with np.load(os.path.join(tile_dir, tile["file"])) as pairs:
+            parts.append((pairs["first"], pairs["second"], pairs["sep"]))
+
+    first = np.concatenate([p[0] for p in parts])
+    second = np.concatenate([p[1] for p in parts])
+    sep = np.concatenate([p[2] for p in parts])
+
+    order = np.lexsort((second, first))
+    return first[order], second[order], sep[order]
@@ -0,0 +1,131 @@
+"""
+In-process replacement for the STILTS `exact` matcher.
+
+Rows match if their key (one or several columns, e.g. a catalog id) is equal. Instead of searching pairs, the keys of
+all tables are factorized together into integer codes with a hash table, so equal keys share a code and every code is
+a match group. String keys are compared without surrounding whitespace, so that padded values such as "IRS2   " match
+"IRS2". Rows with a missing key value never match.
+"""
+import numpy as np
+import pandas as pd
+
+from CatMatcher.native_matcher import split_groups, append_unmatched_rows
+
+
+def normalize_key(values: pd.Series):
+    """
+    Normalize a key column for comparison: strings are stripped of surrounding whitespace, empty strings are missing.
+
+    Args:
+        values (pd.Series): Key values.
+
+    Returns:
+        pd.Series: Normalized key values.
+    """
+
+    if values.dtype.kind in "biufcmM":
+        return values
+
+    stripped = values.astype("string").str.strip()
+    return stripped.mask(stripped == "")
+
+
+def key_codes(key_tables: list):
+    """
+    Factorize the keys of all tables together into integer codes.
+
+    Every key column is factorized over all tables at once, and multi-column keys are combined column by column into a
+    single code, which is factorized again after every step, so that the codes stay below the number of rows.
+
+    Args:
+        key_tables (list): DataFrames with the key columns of every table, in the same order for all tables.
+
+    Returns:
+        list: Integer code of every row of every table. Equal keys have equal codes, missing keys have the code -1.
+
+    Raises:
+        ValueError: If the tables have different numbers of key columns.
+    """
+
+    n_columns = {table.shape[1] for table in key_tables}
+    if len(n_columns) != 1:
+        raise ValueError(f"All tables need the same number of key columns, got {sorted(n_columns)}.")
+
+    n_rows = [len(table) for table in key_tables]
+    codes = None
+    for column in range(n_columns.pop()):
+        values = pd.concat([normalize_key(table.iloc[:, column]) for table in key_tables], ignore_index=True)
+        column_codes, uniques = pd.factorize(values)
+        column_codes = column_codes.astype(np.int64)
+        if codes is None:
+            codes = column_codes
+            continue
+
+        valid = (codes >= 0) & (column_codes >= 0)
+        combined = np.full(len(codes), -1, dtype=np.int64)
+        combined[valid] = pd.factorize(codes[valid] * len(uniques) + column_codes[valid])[0]
+        codes = combined
+
+    if codes is None:
+        codes = np.full(sum(n_rows), -1, dtype=np.int64)
+    return np.split(codes, np.cumsum(n_rows)[:-1])
+
+
+def exact_group_members(codes: list):
+    """
+    Form the match groups of the exact matcher: all rows with the same key, at most one row per table.
+
+    If a table has several rows with the same key, the first of them is kept in the group and the others become rows
+    of their own, like the sky matcher does for rows that are not the closest to their group centre.
+
+    Args:
+        codes (list): Key code of every row of every table, see `key_codes`.
+
+    Returns:
+        np.ndarray: Group membership array, see `CatMatcher.native_matcher.group_members`.
+    """
+
+    n_rows = [len(c) for c in codes]
+    labels = np.concatenate(codes) if codes else np.empty(0, dtype=np.int64)
+
+    # rows without a key form groups of their own
+    missing = np.flatnonzero(labels < 0)
+    labels = labels.copy()
+    labels[missing] = (labels.max() + 1 if len(labels) else 0) + np.arange(len(missing))
+
+    return split_groups(n_rows, labels)
+
+
+def exact_pair_members(codes: list, iref: int, unmatched_tables: list = ()):
+    """
+    Form the output rows of the pairs mode for the exact matcher: every row of the reference table with the first row
+    of the same key in each of the other tables.
+
+    Args:
+        codes (list): Key code of every row of every table, see `key_codes`.
+        iref (int): Zero-based index of the reference table.
+        unmatched_tables (list, optional): Tables whose rows that are no match of any reference row are appended as
+            rows of their own (those with join mode "always").
+
+    Returns:
+        np.ndarray: Group membership array with one row per reference row, in row order, followed by the unused rows of
+        the `unmatched_tables`.
+    """
+
+    n_rows = [len(c) for c in codes]
+    n_codes = max((int(c.max()) + 1 for c in codes if len(c)), default=0)
+    ref_codes = codes[iref]
+
+    members = np.full((n_rows[iref], len(codes)), -1, dtype=np.int64)
+    members[:, iref] = np.arange(n_rows[iref])
+    for t, table_codes in enumerate(codes):
+        if t == iref:
+            continue
+        # the first row per code, with an extra entry (no match) for missing reference keys
+        first_row = np.full(n_codes + 1, n_rows[t], dtype=np.int64)
+        valid = np.flatnonzero(table_codes >= 0)
+        np.minimum.at(first_row, table_codes[valid], valid)
+        first_row[first_row == n_rows[t]] = -1
+        members[:, t] = first_row[np.where(ref_codes >= 0, ref_codes, n_codes)]
+
+    return append_unmatched_rows(members, n_rows, unmatched_tables, iref)
@@ -0,0 +1,443 @@
+"""
+Incremental re-matching of the native engine.
+
+The state of a match is kept next to its output: the match groups with more than one member, all pairs within the
+match radius, and per input table a hash of every row plus its positions in row and declination order. When input
+catalogs change, only their new, modified or removed rows are looked up, with a declination-band search in the stored
+positions of the other tables, and only the groups touched by these rows are formed again. Tables whose content is
+unchanged are not read at all.
+"""
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+from CatMatcher.catalog_io import iter_table
+from CatMatcher.native_matcher import radec_to_xyz, arcsec_to_chord, chord_to_arcsec, table_offsets, group_members
+from CatMatcher.transforms import TransformPipeline
+
+STATE_VERSION = 1
+
+
+def row_hashes_and_positions(file: str, fmt: str, columns: list, chunk_size: int = 100_000,
+                             transform: TransformPipeline = None):
+    """
+    Read a catalog once to get a hash of every row and its match positions.
+
+    Args:
+        file (str): Path to the catalog file.
+        fmt (str): Format of the file.
+        columns (list): Names of the RA and Dec columns.
+        chunk_size (int, optional): Number of rows parsed at a time. (Default: 100000)
+        transform (TransformPipeline, optional): Transform applied to the positions before they are stored.
+
+    Returns:
+        tuple: Array of uint64 row hashes and the unit vectors of shape (n_rows, 3), NaN for missing positions.
+    """
+
+    if fmt == "csv":
+        chunks = pd.read_csv(file, dtype=str, keep_default_na=False, chunksize=chunk_size)
+    else:
+        chunks = (chunk.astype(str) for chunk in iter_table(file, fmt, chunk_size=chunk_size))
+
+    hashes, xyz = [np.empty(0, dtype=np.uint64)], [np.empty((0, 3))]
+    for chunk in chunks:
+        hashes.append(pd.util.hash_pandas_object(chunk, index=False).to_numpy(np.uint64))
+        extra = transform.columns if transform is not None else []
+        positions = chunk[columns + extra].apply(pd.to_numeric, errors="coerce").to_numpy(np.float64)
+        ra, dec = positions[:, 0], positions[:, 1]
+        if transform is not None:
+            ra, dec, _ = transform.apply(ra, dec, {column: positions[:, 2 + i] for i, column in enumerate(extra)})
+        xyz.append(radec_to_xyz(ra, dec))
+
+    return np.concatenate(hashes), np.concatenate(xyz)
+
+
+def declination_order(xyz):
+    """
+    Sort the valid positions of a table by declination.
+
+    Args:
+        xyz (np.ndarray): Unit vectors of shape (n, 3) in row order.
+
+    Returns:
+        tuple: Row indices of the valid positions in declination order, and their z components (sin of Dec).
+    """
+
+    rows = np.flatnonzero(np.isfinite(xyz).all(axis=1))
+    order = rows[np.argsort(xyz[rows, 2], kind="stable")]
+    return order, np.ascontiguousarray(xyz[order, 2])
+
+
+def band_pairs(xyz, order, z_sorted, query_xyz, match_radius: float):
+    """
+    Find the rows of a table within the match radius of some query positions.
+
+    Candidates are taken from the declination band of every query position (a binary search in the declination
+    order), so the cost scales with the number of queries and the band population, not with the table size.
+
+    Args:
+        xyz (np.ndarray): Unit vectors of the table in row order.
+        order (np.ndarray): Row indices in declination order, see `declination_order`.
+        z_sorted (np.ndarray): z components in declination order, see `declination_order`.
+        query_xyz (np.ndarray): Unit vectors of the queries, shape (m, 3). Queries with NaN never match.
+        match_radius (float): Match radius in arcseconds.
+
+    Returns:
+        tuple: Query index, row index in the table and separation (arcseconds) of every pair.
+    """
+
+    radius = np.radians(float(match_radius) / 3600)
+    dec = np.arcsin(np.clip(query_xyz[:, 2], -1, 1))
+    lo = np.searchsorted(z_sorted, np.sin(np.maximum(dec - radius, -np.pi / 2)), side="left")
+    hi = np.searchsorted(z_sorted, np.sin(np.minimum(dec + radius, np.pi / 2)), side="right")
+    lengths = np.where(np.isfinite(dec), hi - lo, 0)
+
+    query = np.repeat(np.arange(len(query_xyz)), lengths)
+    position = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths) + np.repeat(lo, lengths)
+    rows = np.asarray(order)[position]
+
+    chord = np.linalg.norm(np.asarray(xyz)[rows] - query_xyz[query], axis=1)
+    close = chord <= arcsec_to_chord(match_radius)
+    return query[close], rows[close], chord_to_arcsec(chord[close])
+
+
+def changed_rows(old_hashes, new_hashes):
+    """
+    Find the rows that were added, modified or removed between two versions of a table.
+
+    Rows are identified by their position in the table, as for catalogs that grow by appending rows.
+
+    Args:
+        old_hashes (np.ndarray): Row hashes of the previous version.
+        new_hashes (np.ndarray): Row hashes of the current version.
+
+    Returns:
+        np.ndarray: Sorted row indices (of either version) that changed.
+    """
+
+    n_common = min(len(old_hashes), len(new_hashes))
+    modified = np.flatnonzero(np.asarray(old_hashes[:n_common]) != np.asarray(new_hashes[:n_common]))
+    return np.concatenate([modified, np.arange(n_common, max(len(old_hashes), len(new_hashes)))]).astype(np.int64)
+
+
+def pairs_to_rows(first, second, n_rows: list):
+    """
+    Convert pairs of global node ids into (table_a, row_a, table_b, row_b) rows, which stay valid when tables grow.
+
+    Args:
+        first (np.ndarray): Global node ids of the first pair member.
+        second (np.ndarray): Global node ids of the second pair member.
+        n_rows (list): Number of rows of each table.
+
+    Returns:
+        np.ndarray: Array of shape (n_pairs, 4).
+    """
+
+    offsets = table_offsets(n_rows)
+    table_a = np.searchsorted(offsets, first, side="right") - 1
+    table_b = np.searchsorted(offsets, second, side="right") - 1
+    return np.column_stack([table_a, first - offsets[table_a], table_b, second - offsets[table_b]]).astype(np.int64)
+
+
+def rows_to_pairs(pairs, n_rows: list):
+    """
+    Convert (table_a, row_a, table_b, row_b) rows back into global node ids, see `pairs_to_rows`.
+
+    Returns:
+        tuple: Global node ids of the first and second pair member.
+    """
+
+    offsets = table_offsets(n_rows)
+    return offsets[pairs[:, 0]] + pairs[:, 1], offsets[pairs[:, 2]] + pairs[:, 3]
+
+
+def update_pairs(old_pairs, old_separations, changed: list, tables: list, match_radius: float):
+    """
+    Update the pair list after a change: drop the pairs of changed rows and look the changed rows up again.
+
+    Args:
+        old_pairs (np.ndarray): Previous pairs as (table_a, row_a, table_b, row_b) rows.
+        old_separations (np.ndarray): Separations of the previous pairs in arcseconds.
+        changed (list): Changed row indices of every table, see `changed_rows`.
+        tables (list): Current state of every table: "n_rows" and the arrays "xyz", "order" and "z_sorted".
+        match_radius (float): Match radius in arcseconds.
+
+    Returns:
+        tuple: The current pairs and their separations.
+    """
+
+    old_pairs = np.asarray(old_pairs, dtype=np.int64).reshape(-1, 4)
+    keep = np.ones(len(old_pairs), dtype=bool)
+    for t, rows in enumerate(changed):
+        keep &= ~_pairs_on(old_pairs, t, rows)
+
+    pairs, separations = [old_pairs[keep]], [np.asarray(old_separations)[keep]]
+    for t, rows in enumerate(changed):
+        query = rows[rows < tables[t]["n_rows"]]
+        if not len(query):
+            continue
+        query_xyz = np.asarray(tables[t]["xyz"])[query]
+
+        for u, table in enumerate(tables):
+            if u == t:
+                continue
+            index, found, sep = band_pairs(table["xyz"], table["order"], table["z_sorted"], query_xyz, match_radius)
+            if u < t:
+                # pairs of two changed rows were already found from table u
+                fresh = ~np.isin(found, changed[u])
+                index, found, sep = index[fresh], found[fresh], sep[fresh]
+                pairs.append(np.column_stack([np.full(len(found), u), found, np.full(len(found), t), query[index]]))
+            else:
+                pairs.append(np.column_stack([np.full(len(found), t), query[index], np.full(len(found), u), found]))
+            separations.append(sep)
+
+    return np.concatenate(pairs).astype(np.int64), np.concatenate(separations)
+
+
+def merge_groups(groups, n_rows: list, changed: list, old_pairs, pairs, xyz_list: list):
+    """
+    Form the match groups again for the rows touched by a change and merge them with the untouched groups.
+
+    Starting from the changed rows and their previous partners, the set of rows to group again is grown by the
+    current pairs and by the previous groups until it is closed under both. Every connected component of the current
+    pair graph is then either completely inside or completely outside this set, so the result equals a full
+    regrouping, while only the rows inside the set are processed by `group_members`.
+
+    Args:
+        groups (np.ndarray): Previous groups with at least two members, shape (n_groups, n_tables).
+        n_rows (list): Current number of rows of each table.
+        changed (list): Changed row indices of every table, see `changed_rows`.
+        old_pairs (np.ndarray): Previous pairs as (table_a, row_a, table_b, row_b) rows.
+        pairs (np.ndarray): Current pairs in the same layout.
+        xyz_list (list): Current unit vectors of every table in row order.
+
+    Returns:
+        tuple: The current groups with at least two members (in the order of `group_members`), and the number of rows
+        that were grouped again.
+    """
+
+    n_tables = len(n_rows)
+    old_pairs = np.asarray(old_pairs, dtype=np.int64).reshape(-1, 4)
+    pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 4)
+
+    # seeds: the changed rows and their previous partners
+    frontier = [[np.asarray(c, dtype=np.int64)] for c in changed]
+    for t in range(n_tables):
+        on_changed = _pairs_on(old_pairs, t, changed[t])
+        for side in (0, 2):
+            for u in range(n_tables):
+                frontier[u].append(old_pairs[on_changed & (old_pairs[:, side] == u), side + 1])
+    frontier = [np.unique(np.concatenate(f)) for f in frontier]
+
+    is_node = [np.zeros(n, dtype=bool) for n in n_rows]
+    affected = np.zeros(len(groups), dtype=bool)
+    while any(len(f) for f in frontier):
+        grown = [[np.empty(0, dtype=np.int64)] for _ in range(n_tables)]
+        for t in range(n_tables):
+            # grow by the previous groups (removed rows still point to theirs)...
+            group = _lookup_groups(groups, frontier[t], t)
+            hit = np.unique(group[group >= 0])
+            hit = hit[~affected[hit]]
+            affected[hit] = True
+            for u in range(n_tables):
+                grown[u].append(groups[hit, u][groups[hit, u] >= 0])
+
+            # ...and by the current pairs
+            frontier[t] = frontier[t][frontier[t] < n_rows[t]]
+            is_node[t][frontier[t]] = True
+            on_frontier = _pairs_on(pairs, t, frontier[t])
+            for side in (0, 2):
+                for u in range(n_tables):
+                    grown[u].append(pairs[on_frontier & (pairs[:, side] == u), side + 1])
+
+        frontier = [_unseen(np.unique(np.concatenate(g)), is_node[t]) for t, g in enumerate(grown)]
+
+    nodes = [np.flatnonzero(mask) for mask in is_node]
+
+    # group the collected rows with local node ids, then translate back to row indices
+    local = pairs[_pairs_inside(pairs, is_node)]
+    offsets = table_offsets([len(n) for n in nodes])
+    first = offsets[local[:, 0]] + _local_ids(nodes, local[:, 0], local[:, 1])
+    second = offsets[local[:, 2]] + _local_ids(nodes, local[:, 2], local[:, 3])
+    local_members = group_members([len(n) for n in nodes], first, second,
+                                  [np.asarray(xyz_list[t])[nodes[t]] for t in range(n_tables)])
+
+    members = np.full_like(local_members, -1)
+    for t, n in enumerate(nodes):
+        present = local_members[:, t] >= 0
+        members[present, t] = n[local_members[present, t]]
+    members = members[(members >= 0).sum(axis=1) >= 2]
+
+    return sort_groups(np.concatenate([groups[~affected], members]), n_rows), sum(map(len, nodes))
+
+
+def _unseen(rows, is_node):
+    """ Drop the rows that are already marked; rows beyond the end of the table (removed rows) are kept."""
+
+    current = rows < len(is_node)
+    return np.concatenate([rows[~current], rows[current][~is_node[rows[current]]]])
+
+
+def _pairs_on(pairs, t: int, rows):
+    """ Flag the pairs with a member among the given rows of table t."""
+
+    return ((pairs[:, 0] == t) & np.isin(pairs[:, 1], rows)) | ((pairs[:, 2] == t) & np.isin(pairs[:, 3], rows))
+
+
+def _pairs_inside(pairs, is_node: list):
+    """ Flag the pairs whose two members are both marked in `is_node`."""
+
+    inside = np.ones(len(pairs), dtype=bool)
+    for side in (0, 2):
+        for t, mask in enumerate(is_node):
+            on_table = pairs[:, side] == t
+            inside[on_table] &= mask[pairs[on_table, side + 1]]
+    return inside
+
+
+def _lookup_groups(groups, rows, t: int):
+    """ Index of the group holding each row of table t, or -1 for rows that are not part of any group."""
+
+    present = np.flatnonzero(groups[:, t] >= 0)
+    order = np.argsort(groups[present, t])
+    keys = groups[present, t][order]
+    if not len(keys):
+        return np.full(len(rows), -1, dtype=np.int64)
+
+    position = np.minimum(np.searchsorted(keys, rows), len(keys) - 1)
+    return np.where(keys[position] == rows, present[order][position], -1)
+
+
+def _local_ids(nodes, tables, rows):
+    """ Position of every (table, row) in the sorted node list of its table."""
+
+    local = np.empty(len(rows), dtype=np.int64)
+    for t, n in enumerate(nodes):
+        on_table = tables == t
+        local[on_table] = np.searchsorted(n, rows[on_table])
+    return local
+
+
+def sort_groups(groups, n_rows: list):
+    """
+    Sort groups by their lowest node id, the order used by `group_members`.
+
+    Args:
+        groups (np.ndarray): Group membership array.
+        n_rows (list): Number of rows of each table.
+
+    Returns:
+        np.ndarray: The sorted groups.
+    """
+
+    if not len(groups):
+        return groups.reshape(0, len(n_rows)).astype(np.int64)
+
+    first_table = np.argmax(groups >= 0, axis=1)
+    first_node = table_offsets(n_rows)[first_table] + groups[np.arange(len(groups)), first_table]
+    return groups[np.argsort(first_node, kind="stable")]
+
+
+def add_singletons(groups, n_rows: list):
+    """
+    Add a single-member group for every row that is not part of any of the given groups.
+
+    Args:
+        groups (np.ndarray): Groups with at least two members.
+        n_rows (list): Number of rows of each table.
+
+    Returns:
+        np.ndarray: All groups, in the order of `group_members`.
+    """
+
+    singletons = []
+    for t, n in enumerate(n_rows):
+        covered = np.zeros(n, dtype=bool)
+        covered[groups[groups[:, t] >= 0, t]] = True
+        rows = np.flatnonzero(~covered)
+        single = np.full((len(rows), len(n_rows)), -1, dtype=np.int64)
+        single[:, t] = rows
+        singletons.append(single)
+
+    return sort_groups(np.concatenate([groups] + singletons), n_rows)
+
+
+def load_match_state(state_dir: str):
+    """
+    Open the stored state of a match.
+
+    Args:
+        state_dir (str): Directory of the state.
+
+    Returns:
+        dict: The state description ("fingerprint", "tables", "groups", "pairs", "separations" and per table
+        "hashes", "xyz", "order", "z_sorted" arrays, memory-mapped), or None if there is no usable state.
+    """
+
+    state_file = os.path.join(state_dir, "state.json")
+    if not os.path.exists(state_file):
+        return None
+
+    with open(state_file) as f:
+        state = json.load(f)
+    if state.get("version") != STATE_VERSION:
+        return None
+
+    def load(name):
+        return np.load(os.path.join(state_dir, name), mmap_mode="r")
+
+    for key in ("groups", "pairs", "separations"):
+        state[key] = load(state["files"][key])
+    for table in state["tables"]:
+        for key in ("hashes", "xyz", "order", "z_sorted"):
+            table[key] = load(table["files"][key])
+
+    return state
+
+
+def save_match_state(state_dir: str, fingerprint: dict, tables: list, groups, pairs, separations):
+    """
+    Store the state of a match.
+
+    Arrays are written under new names first and `state.json` is replaced last, so an interrupted update leaves the
+    previous state intact. Arrays of tables that did not change are kept as they are.
+
+    Args:
+        state_dir (str): Directory of the state. It is created if necessary.
+        fingerprint (dict): Match settings the state is valid for.
+        tables (list): Per table a dictionary with "digest", "n_rows" and the arrays "hashes", "xyz", "order" and
+            "z_sorted". Tables that already have stored arrays carry their file names under "files" instead.
+        groups (np.ndarray): Groups with at least two members.
+        pairs (np.ndarray): All pairs as (table_a, row_a, table_b, row_b) rows.
+        separations (np.ndarray): Separation of every pair in arcseconds.
+    """
+
+    os.makedirs(state_dir, exist_ok=True)
+    run = f"{os.getpid()}_{np.random.default_rng().integers(1 << 32):08x}"
+
+    files = {}
+    for key, array in (("groups", groups), ("pairs", pairs), ("separations", separations)):
+        files[key] = f"{key}_{run}.npy"
+        np.save(os.path.join(state_dir, files[key]), np.asarray(array))
+
+    described = []
+    for t, table in enumerate(tables):
+        if "files" not in table:
+            table = dict(table, files={})
+            for key in ("hashes", "xyz", "order", "z_sorted"):
+                table["files"][key] = f"table{t}_{table['digest'][:16]}_{key}.npy"
+                np.save(os.path.join(state_dir, table["files"][key]), np.asarray(table[key]))
+        described.append({"digest": table["digest"], "n_rows": int(table["n_rows"]), "files": table["files"]})
+
+    state = {"version": STATE_VERSION, "fingerprint": fingerprint, "tables": described, "files": files}
+    with open(os.path.join(state_dir, "state.json.tmp"), "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(os.path.join(state_dir, "state.json.tmp"), os.path.join(state_dir, "state.json"))
+
+    # remove the arrays of previous states
+    used = set(files.values()) | {name for table in described for name in table["files"].values()}
+    for name in os.listdir(state_dir):
+        if name.endswith(".npy") and name not in used:
+            os.remove(os.path.join(state_dir, name))
@@ -4,6 +4,8 @@ from pathlib import Path
 from dataclasses import dataclass
 from typing import Optional, Literal, Union
 
+from CatMatcher.transforms import TransformPipeline
+
 
 @dataclass
 class MatchConfigurator:
@@ -20,7 +22,7 @@ class MatchConfigurator:
             file_list (Union[list, str]): List of input file names. Alternatively, a single file as a string, but note that this can only be used when a separate reference file is provided. :no-index:
             file_path (str): Path at which the input files are located.
             match_radius (float): Matching radius for positional matching, in arcseconds.
-            match_values (Union[str, list], optional): Columns used for matching, default "RA DEC". If the match columns are not identical across all input columns, a list with all the column names, in the same order as the file_list, needs to be provided.
+            match_values (Union[str, list], optional): Columns used for matching, default "RA DEC". If the match columns are not identical across all input columns, a list with all the column names, in the same order as the file_list, needs to be provided. For matcher="skyerr", a third column holds the error radius of every row in arcseconds.
 
             output_mode (str, fixed): Output mode for the matcher tool. Currently frozen to one specific mode.
             output_file_name (str, optional): Name of the output file to write matched results, including the desired file type. See imft or ofmt for supported filetypes. (Default: "matched.csv)
@@ -29,16 +31,37 @@ class MatchConfigurator:
 
             matcher (Literal, ["sky", "skyerr", "exact"]): Type of matching engine to use. (Default: "sky")
             multimode (Literal, ["pairs", "group"]): Matching mode, either "pairs" or "group". (Default: "group")
-            join_mode (Literal, ["default", "match", "nomatch", "always"]): How results are joined across matched/unmatched catalogs. (Default: "match")
+            join_mode (Union[Literal, list], ["default", "match", "nomatch", "always"]): How results are joined across matched/unmatched catalogs. A single mode applies to all tables, a list gives the mode of every table in the order of the file_list. (Default: "match")
             runner (Literal, ["parallel", "parallel-all", "sequential", "classic", "partest"]): Execution mode for the STILTS matcher. (Default: "parallel")
             progress (Literal, ["none", "log", "time", "profile"]): Logging/progress output during matching. (Default: "time")
             fixcols (Literal, ["none", "dups", "all"]): Determines how input columns are renamed in the output table, according to the suffix_list parameters. If "none", no columns are renamed, if "dups" only columns which would otherwise have duplicate names in the output are renamed, if "all" every column will be renamed.
+            engine (Literal, ["stilts", "native"]): Backend used to perform the match. "stilts" writes and executes a STILTS command file, "native" performs the match in-process with NumPy/SciPy (the sky, skyerr and exact matchers, in group and pairs mode). (Default: "stilts")
 
             reference_file (Optional[str], optional): Optional reference file for input format inference. If provided, a single string input for file_list is acceptable.
             suffix_list (Optional[list], optional): Optional list of suffixes for identifying files. If None, suffixes will be numeric indices _1, _2,... according to the order of the file_list.
-            iref (Optional[int], optional): If multimode="pairs" this parameter gives the index of the table in the file_list, which serves as the reference table, i.e. must be matched by other tables.
-            input_command (Optional[str], optional): Custom command string indicating actions to be performed on columns of all input tables.
-            output_command (Optional[str], optional): Custom command string indicating actions to be performed on columns of the output table.
+            n_shards (Optional[int], optional): If given, the native sky matcher splits the sky into this many declination zones (overlapping by match_radius) and matches them in parallel worker processes. The result is identical to the unsharded match.
+            n_workers (Optional[int], optional): Number of worker processes used for sharded (or checkpointed) matching. Defaults to the number of CPUs.
+            checkpoint_tiles (Optional[int], optional): If given, the native sky matcher (group mode) makes the match resumable: the pair search is split into this many declination tiles, the pairs of every finished tile are written to `<output name>_tiles/` inside the `matches/` directory next to a manifest, and a restarted run with unchanged inputs and settings only searches the unfinished tiles before merging all of them (see `CatMatcher.checkpointing`). The tiles are removed once the output is written.
+            executor (Literal, ["shell", "direct"]): How the STILTS engine is executed. "shell" writes the command file and runs it via a zsh script, "direct" runs STILTS from an argv list without a shell, streams its output and records per-phase timings and peak memory. (Default: "shell")
+            timeout (Optional[float], optional): Seconds after which a direct STILTS run is stopped. If None, no limit is applied.
+            jvm_heap (Optional[str], optional): Maximum JVM heap size passed to STILTS as -Xmx option, e.g. "4G" or "512M". If None, the Java default is used.
+            tuning (Optional[int], optional): Tuning parameter of the STILTS match engine. For the sky matchers, this is the HEALPix level of the bins used to find candidate pairs. If None, STILTS chooses it from the match radius.
+            disk (bool, optional): If True, STILTS stores the input tables on disk instead of in memory (-disk flag), which allows matching tables larger than the JVM heap at the cost of speed. (Default: False)
+            auto_plan (bool, optional): If True, the resource planner (see `CatMatcher.planner`) estimates the input sizes before every STILTS run and chooses jvm_heap, tuning and disk (unless set explicitly) as well as the runner. The plan is written to `<command_file_name>_plan.json` in the `scripts/` directory. (Default: False)
+            max_memory (Optional[str], optional): Memory the planner may assign to a match, e.g. "16G". If None, the memory available on the machine is used.
+            stage_inputs (bool, optional): If True, text inputs (csv, ecsv, tst) are converted once to binary colfits files in `staged/` inside the working directory, which STILTS can memory-map. The staged files are reused until the content of the source file changes. (Default: False)
+            chunk_size (int, optional): Number of rows parsed at a time when the native engine reads the input catalogs. Only the match columns are parsed for all rows, the remaining columns only for matched rows. (Default: 100000)
+            use_index_cache (bool, optional): If True, the native engine stores the declination-sorted positions of every input catalog in `index_cache/` inside the working directory and reuses them as long as the file content, input format and match columns are unchanged. The KD-tree is rebuilt from them on every load. (Default: True)
+            index_cache_size (float, optional): Size cap of the index cache in megabytes. Least recently used entries are evicted beyond it. (Default: 1024)
+            use_result_cache (bool, optional): If True, `perform_Nmatch` stores its output, run log and returned table in `result_cache/` inside the working directory, keyed by the content hash of all inputs and the settings that determine the output (not e.g. n_workers, chunk_size, executor, timeout or the JVM settings). A re-run with unchanged inputs and settings then links the stored output (and log) into the `matches/` directory instead of matching again. (Default: False)
+            result_cache_size (float, optional): Size cap of the result cache in megabytes. Least recently used entries are evicted beyond it. (Default: 4096)
+            incremental (bool, optional): If True, the native engine keeps the match state (groups, pairs and per-row hashes and positions of every input) in `<output name>_state/` inside the `matches/` directory. Later runs then only look up the new, modified or removed rows of changed inputs and form only the affected groups again, with the same result as a full match. (Default: False)
+            iref (Optional[int], optional): If multimode="pairs" this parameter gives the one-based index (as in STILTS) of the table in the file_list, which serves as the reference table, i.e. must be matched by other tables. If None, the first table is used.
+            transforms (Optional[Union[TransformPipeline, list]], optional): Vectorized transforms of the match columns (unit scaling, frame rotation, epoch propagation, see `CatMatcher.transforms`) applied before the sky matchers. A single pipeline applies to all tables, a list gives the pipeline (or None) of every table in the order of the file_list. The transformed positions are cached with the index of the native engine, and STILTS reads transformed copies of the inputs from `staged/`. If None, the match columns are used as they are.
+            keep_columns (Optional[Union[str, list]], optional): Columns of the input tables to carry into the match, as whitespace-separated names. A string applies to all tables, a list gives the columns (or None for all columns) of every table in the order of the file_list. The match_values columns are always kept. STILTS drops the other columns right after reading every input (`icmdN='keepcols ...'`), and the native engine does not read them, so memory and output size do not scale with unused columns. If None, all columns are kept.
+            output_columns (Optional[Union[str, list]], optional): Columns of the output table (names after the fixcols renaming), as a whitespace-separated string or a list, in output order. STILTS prunes the output before writing it (`ocmd='keepcols ...'`). Note that the run log can only compute match statistics if the match columns are part of the output. If None, all columns are written.
+            input_command (Optional[str], optional): Custom command string indicating actions to be performed on columns of all input tables. It is applied before the keep_columns pruning.
+            output_command (Optional[str], optional): Custom command string indicating actions to be performed on columns of the output table. It is applied before the output_columns pruning.
             ifmt (Optional[list or Literal], ["colfits", "csv", "ecsv", "fits", "tst", "votable"]): Input format(s) for catalog files. Accepted formats are: ["colfits", "csv", "ecsv", "fits", "tst", "votable"]. If not provided, they will be inferred from the file_list.
             ofmt (Optional[Literal], ["colfits", "csv", "ecsv", "fits", "tst", "votable"]): Output format for result file. Accepted formats are: ["colfits", "csv", "ecsv", "fits", "tst", "votable"]. If not provided, it will be inferred from the output_file_name.
         """
@@ -62,17 +85,37 @@ class MatchConfigurator:
     matcher: Literal[
         "sky", "skyerr", "exact"] = "sky"  # More available: https://www.star.bris.ac.uk/mbt/stilts/sun256/MatchEngine.html
     multimode: Literal["pairs", "group"] = "group"  # multimode = pairs | group
-    join_mode: Literal["default", "match", "nomatch", "always"] = "match"
+    join_mode: Union[Literal["default", "match", "nomatch", "always"], list] = "match"
     runner: Literal["parallel", "parallel-all", "sequential", "classic", "partest"] = "parallel"
     progress: Literal["none", "log", "time", "profile"] = "time"
     fixcols: Literal["none", "dups", "all"] = "dups"
-    # TODO: tuning: < tuning - params >
+    engine: Literal["stilts", "native"] = "stilts"
 
     # ----------------------------
     # Optional
     reference_file: Optional[str] = None
     suffix_list: Optional[list] = None
-    iref: Optional[str] = None
+    n_shards: Optional[int] = None
+    n_workers: Optional[int] = None
+    checkpoint_tiles: Optional[int] = None
+    executor: Literal["shell", "direct"] = "shell"
+    timeout: Optional[float] = None
+    jvm_heap: Optional[str] = None
+    tuning: Optional[int] = None
+    disk: bool = False
+    auto_plan: bool = False
+    max_memory: Optional[str] = None
+    stage_inputs: bool = False
+    chunk_size: int = 100_000
+    use_index_cache: bool = True
+    index_cache_size: float = 1024
+    use_result_cache: bool = False
+    result_cache_size: float = 4096
+    incremental: bool = False
+    iref: Optional[int] = None
+    transforms: Optional[Union[TransformPipeline, list]] = None
+    keep_columns: Optional[Union[str, list]] = None
+    output_columns: Optional[Union[str, list]] = None
     input_command: Optional[str] = None
     output_command: Optional[str] = None
     ifmt: Optional[Literal["colfits", "csv", "ecsv", "fits", "tst", "votable"]] = None
@@ -114,6 +157,9 @@ class MatchConfigurator:
         if type(self.match_values) == str:  # needed for command printing of StiltsMatcher.build_N_match()
             self.match_values = [self.match_values]
 
+        if isinstance(self.output_columns, str):
+            self.output_columns = self.output_columns.split()
+
         self.normalized_path = Path(self.file_path).as_posix()  # normalize path (to work across systems)
 
         # ----------------------------
@@ -131,6 +177,27 @@ class MatchConfigurator:
         if self.suffix_list and any(s == "" or (isinstance(s, float) and np.isnan(s)) for s in self.suffix_list):
             raise ValueError("Empty strings or NAN entries encountered in user-provided suffix list.")
 
+        # check the reference table and the join modes
+        if self.iref is not None:
+            if isinstance(self.iref, bool) or int(self.iref) != self.iref or not 1 <= int(self.iref) <= self.n_in:
+                raise ValueError(f"iref must be the one-based index of an input table (1 to {self.n_in}), "
+                                 f"got {self.iref!r}.")
+            self.iref = int(self.iref)
+        join_modes = self._table_join_modes()
+        if any(mode not in ("default", "match", "nomatch", "always") for mode in join_modes):
+            raise ValueError(f"Unsupported join mode in {join_modes}. Allowed modes are: "
+                             f"['always', 'default', 'match', 'nomatch']")
+
+        # check the transforms
+        if any(t is not None and not isinstance(t, TransformPipeline) for t in self._table_transforms()):
+            raise ValueError("transforms must be a TransformPipeline or a list with one TransformPipeline (or None) "
+                             "per input file.")
+
+        # check the column selections
+        self._table_keep_columns()
+        if self.output_columns is not None and not self.output_columns:
+            raise ValueError("output_columns must name at least one column.")
+
     @staticmethod
     def _infer_fmt(filename):
         """
@@ -159,6 +226,86 @@ class MatchConfigurator:
 
         return fmt
 
+    def _table_match_values(self):
+        """
+        Expand the match values to one list of column names per input table.
+
+        Returns:
+            list: List with one entry per input file, each holding the column names used for matching that file.
+        """
+
+        if len(self.match_values) == 1:
+            return [self.match_values[0].split() for _ in range(self.n_in)]
+        return [values.split() for values in self.match_values]
+
+    def _table_join_modes(self):
+        """
+        Expand the join mode to one mode per input table.
+
+        Returns:
+            list: List with one join mode per input file.
+
+        Raises:
+            ValueError: If a list of join modes does not have one entry per input file.
+        """
+
+        if isinstance(self.join_mode, str):
+            return [self.join_mode for _ in range(self.n_in)]
+        if len(self.join_mode) != self.n_in:
+            raise ValueError("Length of join_mode list does not match number of input files.")
+        return list(self.join_mode)
+
+    def _table_transforms(self):
+        """
+        Expand the transforms to one pipeline per input table.
+
+        Returns:
+            list: List with one `TransformPipeline` (or None) per input file.
+
+        Raises:
+            ValueError: If a list of pipelines does not have one entry per input file.
+        """
+
+        if not isinstance(self.transforms, list):
+            return [self.transforms for _ in range(self.n_in)]
+        if len(self.transforms) != self.n_in:
+            raise ValueError("Length of transforms list does not match number of input files.")
+        return list(self.transforms)
+
+    def _table_keep_columns(self):
+        """
+        Expand the kept columns to one column list per input table, including the match columns.
+
+        Returns:
+            list: List with one list of column names (match columns first, or None to keep all columns) per input file.
+
+        Raises:
+            ValueError: If a list of column selections does not have one entry per input file.
+        """
+
+        if not isinstance(self.keep_columns, list):
+            keep_columns = [self.keep_columns for _ in range(self.n_in)]
+        elif len(self.keep_columns) != self.n_in:
+            raise ValueError("Length of keep_columns list does not match number of input files.")
+        else:
+            keep_columns = self.keep_columns
+
+        return [None if keep is None else
+                list(dict.fromkeys(values + (keep.split() if isinstance(keep, str) else list(keep))))
+                for keep, values in zip(keep_columns, self._table_match_values())]
+
+    def _table_formats(self):
+        """
+        Expand the input formats to one format per input table.
+
+        Returns:
+            list: List with one input format per input file.
+        """
+
+        if len(self.ifmt) == 1:
+            return [self.ifmt[0] for _ in range(self.n_in)]
+        return list(self.ifmt)
+
     def _generate_match_values_from_suffix(self):
         """
         Generate a list of match columns based on the input string and the supplied suffix list.
@@ -180,7 +327,9 @@ class MatchConfigurator:
         """
         Create and initialize the working directory structure used by the StiltsMatcher class.
 
-        Directories include the main working path, a scripts directory, and a matches directory.
+        Directories include the main working path, a scripts directory, a matches directory, an index_cache directory
+        used by the native engine, a result_cache directory for the result cache, and a staged directory for binary
+        copies of text inputs.
         """
 
         # define path to working directory (cwd)
@@ -192,12 +341,19 @@ class MatchConfigurator:
         # Create various subdirectories
         script_dir = cwd_path + "/scripts/"
         match_dir = cwd_path + "/matches/"
+        index_dir = cwd_path + "/index_cache/"
+        staged_dir = cwd_path + "/staged/"
+        result_dir = cwd_path + "/result_cache/"
 
         # assigin script_path variable because it is needed later to build the N match
         self._script_path = script_dir
+        self._match_path = match_dir  # needed by the native engine, which writes the output directly
+        self._index_path = index_dir
+        self._staged_path = staged_dir
+        self._result_path = result_dir
 
         # store in directory_list
-        dirs = [cwd_path, script_dir, match_dir]
+        dirs = [cwd_path, script_dir, match_dir, index_dir, staged_dir, result_dir]
 
         # create directories
         for d in dirs:
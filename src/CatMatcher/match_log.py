@@ -0,0 +1,107 @@
+"""
+Machine-readable logs of match runs.
+
+A log is a JSON file next to the match output, holding the match parameters, the input row counts, matched and
+unmatched counts per table, the group-size distribution, a histogram of the separations within the output rows and
+the elapsed time per phase. All statistics are computed with vectorized NumPy operations on the group membership
+(native engine) or on the projected match columns of the output (STILTS engine).
+"""
+import json
+import time
+import dataclasses
+
+import numpy as np
+
+from CatMatcher.native_matcher import chord_to_arcsec
+
+
+def row_separations(xyz: list):
+    """
+    Compute the separations between the entries of the same output row, one for every two tables present in the row.
+
+    Args:
+        xyz (list): Unit vectors of every table, each of shape (n_output_rows, 3), with NaN where a table has no entry
+            in an output row.
+
+    Returns:
+        np.ndarray: The separations in arcseconds.
+    """
+
+    present = [np.isfinite(v).all(axis=1) for v in xyz]
+    separations = [np.empty(0)]
+    for a in range(len(xyz)):
+        for b in range(a + 1, len(xyz)):
+            both = present[a] & present[b]
+            separations.append(chord_to_arcsec(np.linalg.norm(xyz[a][both] - xyz[b][both], axis=1)))
+    return np.concatenate(separations)
+
+
+def match_statistics(present, n_rows: list, separations, match_radius: float, suffix_list: list, n_bins: int = 20):
+    """
+    Compute the statistics of a match result.
+
+    Args:
+        present (np.ndarray): Boolean array of shape (n_output_rows, n_tables), True where a table has an entry in an
+            output row.
+        n_rows (list): Number of input rows of every table (entries may be None if unknown).
+        separations (np.ndarray): Separations (in arcseconds) between entries of the same output row, see
+            `row_separations`.
+        match_radius (float): Match radius in arcseconds, used as upper end of the separation histogram.
+        suffix_list (list): Suffix of every input table, used to label the per-table statistics.
+        n_bins (int, optional): Number of bins of the separation histogram. (Default: 20)
+
+    Returns:
+        dict: The statistics, ready to be written as JSON.
+    """
+
+    sizes = present.sum(axis=1)
+    matched = (present & (sizes >= 2)[:, None]).sum(axis=0)
+
+    group_sizes, group_counts = np.unique(sizes, return_counts=True)
+    separations = np.asarray(separations, dtype=np.float64)
+    separations = separations[np.isfinite(separations)]
+    upper = max(float(match_radius), float(separations.max()) if len(separations) else 0.0) or 1.0
+    counts, edges = np.histogram(separations, bins=n_bins, range=(0, upper))
+
+    return {
+        "n_output_rows": int(len(present)),
+        "tables": {
+            suffix: {
+                "input_rows": None if n is None else int(n),
+                "matched": int(m),
+                "unmatched": None if n is None else int(n - m),
+            }
+            for suffix, n, m in zip(suffix_list, n_rows, matched)
+        },
+        "group_sizes": {int(size): int(count) for size, count in zip(group_sizes, group_counts)},
+        "separation_histogram": {"bin_edges": edges.tolist(), "counts": counts.tolist()},
+        "separation_median": float(np.median(separations)) if len(separations) else None,
+        "separation_max": float(separations.max()) if len(separations) else None,
+    }
+
+
+def write_match_log(file: str, config, statistics: dict, phase_times: list):
+    """
+    Write the log of a match run as JSON.
+
+    Args:
+        file (str): Path of the log file.
+        config (MatchConfigurator): Configuration of the match; all dataclass fields are logged as parameters.
+        statistics (dict): Match statistics, see `match_statistics`. May be None if the output could not be read.
+        phase_times (list): Tuples of (phase, seconds).
+
+    Returns:
+        None
+    """
+
+    parameters = {f.name: getattr(config, f.name) for f in dataclasses.fields(config)}
+
+    log = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "parameters": parameters,
+        "statistics": statistics,
+        "phase_times": [{"phase": phase, "seconds": round(seconds, 6)} for phase, seconds in phase_times],
+    }
+
+    with open(file, "w") as f:
+        json.dump(log, f, indent=2, default=str)
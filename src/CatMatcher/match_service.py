@@ -0,0 +1,330 @@
+"""
+Long-running local match service that keeps reference catalogs in memory.
+
+Matching many small target lists against the same large catalogs with `tmatchn` reads and indexes the catalogs (and
+starts a JVM) for every list. A `MatchService` reads every reference catalog of a `MatchConfigurator` once, keeps the
+table and a `SkyIndex` of its positions in memory, and answers match requests over HTTP, so a request only costs the
+index queries for its own rows. The requests of concurrent clients are served by threads that share the read-only
+indexes. A reference whose file changes is reloaded on the next request and swapped in as a whole, so running requests
+finish on the previous version.
+
+Endpoints:
+
+- `GET /health`: Status and size of every reference catalog.
+- `POST /match`: JSON body with "reference" (its suffix in the configuration), "ra" and "dec" (lists, degrees), and
+  optionally "match_radius" (arcseconds, default of the configuration), "find" ("best" or "all") and "columns"
+  (reference columns to return, all if missing). The answer holds "query_row", "reference_row", "separation" and the
+  requested "columns" of every match.
+
+Example:
+    >>> config = MatchConfigurator(file_list=["gaia_orion.csv"], file_path="Data", match_radius=1,
+    ...                            match_values="ra dec", suffix_list=["gaia"])
+    >>> with MatchService(config, port=8765) as service:
+    ...     matches = query_match_service(service.url, "gaia", ra=[85.4], dec=[-1.9])
+"""
+import os
+import json
+import time
+import threading
+import urllib.error
+import urllib.request
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from CatMatcher.match_configurator import MatchConfigurator
+from CatMatcher.catalog_io import read_table
+from CatMatcher.native_matcher import radec_to_xyz
+from CatMatcher.sky_index import SkyIndex
+
+
+class UnknownReference(KeyError):
+    """ Raised if a request addresses a reference catalog that the service does not hold."""
+
+
+@dataclass
+class ReferenceCatalog:
+    """
+    One loaded reference catalog.
+
+    Attributes:
+        name (str): Name of the reference (its suffix in the configuration).
+        file (str): Path of the catalog file.
+        table (pd.DataFrame): The catalog, with transformed match columns if the configuration has transforms.
+        index (SkyIndex): Index of the catalog positions.
+        signature (tuple): Size and modification time of the file when it was read.
+        loaded (float): Time of loading (seconds since the epoch).
+    """
+
+    name: str
+    file: str
+    table: pd.DataFrame
+    index: SkyIndex
+    signature: tuple
+    loaded: float
+
+
+def _file_signature(file: str):
+    stat = os.stat(file)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _json_values(values):
+    """ Convert a column to a list of JSON values, with missing values (which JSON has no NaN for) as None."""
+
+    missing = pd.isna(values)
+    values = values.tolist()
+    for idx in np.flatnonzero(missing):
+        values[idx] = None
+    return values
+
+
+class MatchService:
+    """
+    HTTP service matching query positions with the reference catalogs of a configuration.
+
+    The catalogs are `config.file_list` (located in `config.file_path`), with their `match_values`, `ifmt` and
+    `transforms`, and are addressed by their `suffix_list` entry. `match_radius` is the default radius of a request.
+
+    Args:
+        config (MatchConfigurator): Configuration of the reference catalogs.
+        host (str, optional): Host name to listen on. (Default: "localhost")
+        port (int, optional): Port to listen on, 0 picks a free port. (Default: 8765)
+        reload_interval (float, optional): Minimum number of seconds between two checks whether a reference file
+            changed. (Default: 1)
+    """
+
+    def __init__(self, config: MatchConfigurator, host: str = "localhost", port: int = 8765,
+                 reload_interval: float = 1.0):
+        self.config = config
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._checked = {}
+        self.reload_errors = {}
+
+        self.references = {}
+        for idx, name in enumerate(config.suffix_list):
+            self.references[name] = self._load(idx)
+            self._checked[name] = time.monotonic()
+
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        """ Base URL of the service."""
+
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _load(self, idx: int):
+        """ Read and index the reference catalog at position `idx` of the file list."""
+
+        file = os.path.join(self.config.normalized_path, self.config.file_list[idx])
+        signature = _file_signature(file)
+        columns = self.config._table_match_values()[idx][:2]
+        transform = self.config._table_transforms()[idx]
+
+        table = read_table(file, self.config._table_formats()[idx])
+        if transform is not None:
+            table = transform.apply_table(table, columns)
+        index = SkyIndex(radec_to_xyz(table[columns[0]], table[columns[1]]))
+        return ReferenceCatalog(self.config.suffix_list[idx], file, table, index, signature, time.time())
+
+    def reference(self, name: str):
+        """
+        Get a reference catalog, reloading it first if its file changed.
+
+        If reloading fails (e.g. while the file is being written), the previous version is kept and the error is
+        recorded in `reload_errors`, until a later check succeeds.
+
+        Args:
+            name (str): Name of the reference.
+
+        Returns:
+            ReferenceCatalog: The current version of the reference.
+
+        Raises:
+            UnknownReference: If there is no reference of this name.
+        """
+
+        if name not in self.references:
+            raise UnknownReference(f"Unknown reference '{name}'. Available references: {sorted(self.references)}")
+
+        if time.monotonic() - self._checked[name] >= self.reload_interval:
+            with self._lock:
+                reference = self.references[name]
+                if time.monotonic() - self._checked[name] >= self.reload_interval:
+                    self._checked[name] = time.monotonic()
+                    try:
+                        if _file_signature(reference.file) != reference.signature:
+                            self.references[name] = self._load(self.config.suffix_list.index(name))
+                        self.reload_errors.pop(name, None)
+                    except (OSError, ValueError, KeyError) as e:
+                        self.reload_errors[name] = str(e)
+
+        return self.references[name]
+
+    def match(self, name: str, ra, dec, match_radius: float = None, find: str = "best", columns: list = None):
+        """
+        Match query positions with a reference catalog.
+
+        Args:
+            name (str): Name of the reference.
+            ra (list): Right ascension of the query positions in degrees.
+            dec (list): Declination of the query positions in degrees.
+            match_radius (float, optional): Match radius in arcseconds. Defaults to the radius of the configuration.
+            find (str, optional): "best" or "all", see `SkyIndex.match`. (Default: "best")
+            columns (list, optional): Reference columns to return. All columns if None.
+
+        Returns:
+            dict: "reference", "query_row", "reference_row", "separation" and the "columns" of every match.
+
+        Raises:
+            UnknownReference: If the reference does not exist.
+            KeyError: If a requested column does not exist.
+            ValueError: If the positions or options are invalid.
+        """
+
+        ra, dec = np.asarray(ra, dtype=np.float64), np.asarray(dec, dtype=np.float64)
+        if ra.shape != dec.shape or ra.ndim != 1:
+            raise ValueError("ra and dec must be lists of equal length.")
+
+        reference = self.reference(name)
+        radius = float(self.config.match_radius if match_radius is None else match_radius)
+        query_rows, rows, sep = reference.index.match(ra, dec, radius, find)
+
+        if columns is None:
+            columns = list(reference.table.columns)
+        missing = [column for column in columns if column not in reference.table.columns]
+        if missing:
+            raise KeyError(f"Unknown columns {missing} in reference '{name}'.")
+
+        return {"reference": name, "query_row": query_rows.tolist(), "reference_row": rows.tolist(),
+                "separation": sep.tolist(),
+                "columns": {c: _json_values(reference.table[c].to_numpy()[rows]) for c in columns}}
+
+    def health(self):
+        """
+        Describe the state of the service.
+
+        Returns:
+            dict: "status" and, per reference, its file, number of rows, loading time and the last reload error.
+        """
+
+        return {"status": "ok",
+                "references": {name: {"file": ref.file, "n_rows": ref.index.n_rows, "loaded": ref.loaded,
+                                      "reload_error": self.reload_errors.get(name)}
+                               for name, ref in self.references.items()}}
+
+    def start(self):
+        """ Serve requests in a background thread."""
+
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+            self._thread.start()
+
+    def serve_forever(self):
+        """ Serve requests in the calling thread, until `stop` is called from another thread."""
+
+        self._server.serve_forever()
+
+    def stop(self):
+        """ Stop serving and close the socket."""
+
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _handler(self):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                if self.path.rstrip("/") != "/health":
+                    return self._answer(404, {"error": f"No such endpoint: {self.path}"})
+                self._answer(200, service.health())
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if self.path.rstrip("/") != "/match":
+                    return self._answer(404, {"error": f"No such endpoint: {self.path}"})
+                try:
+                    request = json.loads(body)
+                    result = service.match(request["reference"], request["ra"], request["dec"],
+                                           request.get("match_radius"), request.get("find", "best"),
+                                           request.get("columns"))
+                except UnknownReference as e:
+                    return self._answer(404, {"error": str(e).strip("'\"")})
+                except KeyError as e:
+                    return self._answer(400, {"error": str(e).strip("'\"")})
+                except (ValueError, TypeError) as e:
+                    return self._answer(400, {"error": str(e)})
+                self._answer(200, result)
+
+            def _answer(self, status, content):
+                data = json.dumps(content).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def query_match_service(url: str, reference: str, ra, dec, match_radius: float = None, find: str = "best",
+                        columns: list = None, timeout: float = 60):
+    """
+    Send a match request to a `MatchService`.
+
+    Args:
+        url (str): Base URL of the service.
+        reference (str): Name of the reference catalog.
+        ra (list): Right ascension of the query positions in degrees.
+        dec (list): Declination of the query positions in degrees.
+        match_radius (float, optional): Match radius in arcseconds. Defaults to the radius of the service.
+        find (str, optional): "best" or "all". (Default: "best")
+        columns (list, optional): Reference columns to return. All columns if None.
+        timeout (float, optional): Seconds to wait for the answer. (Default: 60)
+
+    Returns:
+        pd.DataFrame: One row per match, with "query_row", "reference_row", "separation" and the reference columns.
+
+    Raises:
+        RuntimeError: If the service rejects the request.
+    """
+
+    request = {"reference": reference, "ra": np.asarray(ra, dtype=np.float64).tolist(),
+               "dec": np.asarray(dec, dtype=np.float64).tolist(), "find": find}
+    if match_radius is not None:
+        request["match_radius"] = float(match_radius)
+    if columns is not None:
+        request["columns"] = list(columns)
+
+    post = urllib.request.Request(url.rstrip("/") + "/match", data=json.dumps(request).encode(),
+                                  headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(post, timeout=timeout) as response:
+            result = json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        raise RuntimeError(f"Match service error {e.code}: {json.loads(e.read()).get('error')}") from None
+
+    table = pd.DataFrame({"query_row": result["query_row"], "reference_row": result["reference_row"],
+                          "separation": result["separation"]})
+    return pd.concat([table, pd.DataFrame(result["columns"], index=table.index)], axis=1)
@@ -1,8 +1,50 @@
 import os
+import re
 import stat
+import time
+import shutil
+import tempfile
+import uuid
+import numpy as np
+import pandas as pd
 
 from CatMatcher.match_configurator import MatchConfigurator
 from CatMatcher.shell_helper import execute_shell_script
+from CatMatcher.catalog_io import read_match_columns, read_column_names, count_rows, fetch_rows, write_table, \
+    read_fits_table, fits_to_dataframe, read_key_columns, read_table
+from CatMatcher.native_matcher import radec_to_xyz, find_sky_pairs, find_skyerr_pairs, \
+    reference_pairs, group_members, pair_members, select_joined_rows, output_column_names, join_tables
+from CatMatcher.exact_matcher import key_codes, exact_group_members, exact_pair_members
+from CatMatcher.sharding import find_sky_pairs_sharded
+from CatMatcher.checkpointing import find_sky_pairs_checkpointed
+from CatMatcher.sky_index import SkyIndex
+from CatMatcher.caching import IndexCache, ResultCache, file_digest, canonical_config
+from CatMatcher.incremental import row_hashes_and_positions, declination_order, changed_rows, pairs_to_rows, \
+    rows_to_pairs, update_pairs, merge_groups, add_singletons, load_match_state, save_match_state
+from CatMatcher.stilts_server import StiltsServer
+from CatMatcher.stilts_runner import StiltsRunError, build_argv, run_stilts, stream_stilts
+from CatMatcher.match_log import match_statistics, row_separations, write_match_log
+from CatMatcher.planner import plan_resources
+from CatMatcher.batch_runner import heap_to_mb
+
+
+def _remove_if_exists(file: str):
+    """ Remove a file, unless a concurrent job removed it already."""
+
+    try:
+        os.remove(file)
+    except FileNotFoundError:
+        pass
+
+
+def _file_signature(file: str):
+    """ Modification time, size and inode of a file, None if it does not exist."""
+
+    try:
+        stat_result = os.stat(file)
+    except FileNotFoundError:
+        return None
+    return stat_result.st_mtime_ns, stat_result.st_size, stat_result.st_ino
 
 
 class StiltsMatcher(MatchConfigurator):
@@ -45,113 +87,60 @@ class StiltsMatcher(MatchConfigurator):
             - Makes the command file executable via `chmod`.
         """
 
+        if self.auto_plan:
+            self.plan_resources()
+
         # define relative paths
         rel_data_in = f"../../"
         rel_data_out = "../matches/"
 
         # Start the command
         command = (
-            f"stilts tmatchn multimode={self.multimode} nin={self.n_in} matcher={self.matcher} params={self.match_radius} \\\n"
+            f"{self._stilts_call()} tmatchn multimode={self.multimode} nin={self.n_in} matcher={self.matcher} params={self.match_radius}"
+            f"{'' if self.tuning is None else f' tuning={self.tuning}'}"
+            f"{f' iref={self.iref}' if self.multimode == 'pairs' and self.iref is not None else ''} \\\n"
         )
 
-        # Command including the suffix information
-        if self.suffix_list is not None:
-
-            # Command if n match columns and n formats are given
-            if len(self.match_values) == self.n_in and len(self.ifmt) == self.n_in:
-
-                # Iteratively add in{x}, ifmt{x}, suffix{x}, values{x} for each file
-                for idx, file in enumerate(self.file_list, start=1):
-                    suffix = self.suffix_list[idx - 1]
-                    command += (
-                        f"\tin{idx}={rel_data_in + file} ifmt{idx}={self.ifmt[idx - 1]} "
-                        f"suffix{idx}='_{suffix}' "
-                        f"values{idx}='{self.match_values[idx - 1]}' \\\n"
-                    )
-
-            # Command if 1 match column(=same name in all files) and n formats are given
-            elif len(self.match_values) == 1 and len(self.ifmt) == self.n_in:
-
-                for idx, file in enumerate(self.file_list, start=1):
-                    suffix = self.suffix_list[idx - 1]
-                    command += (
-                        f"\tin{idx}={rel_data_in + file} ifmt{idx}={self.ifmt[idx - 1]} "
-                        f"suffix{idx}='_{suffix}' "
-                        f"values{idx}='{self.match_values[0]}' \\\n"
-                    )
-
-            # Command if n match columns and 1 format (same for all files) are given
-            elif len(self.match_values) == self.n_in and len(self.ifmt) == 1:
-
-                for idx, file in enumerate(self.file_list, start=1):
-                    suffix = self.suffix_list[idx - 1]
-                    command += (
-                        f"\tin{idx}={rel_data_in + file} ifmt{idx}={self.ifmt[0]} "
-                        f"suffix{idx}='_{suffix}' "
-                        f"values{idx}='{self.match_values[idx - 1]}' \\\n"
-                    )
-
-            elif len(self.match_values) == 1 and len(self.ifmt) == 1:
-
-                for idx, file in enumerate(self.file_list, start=1):
-                    suffix = self.suffix_list[idx - 1]
-                    command += (
-                        f"\tin{idx}={rel_data_in + file} ifmt{idx}={self.ifmt[0]} "
-                        f"suffix{idx}='_{suffix}' "
-                        f"values{idx}='{self.match_values[0]}' \\\n"
-                    )
-
-        # Same as above but without specifying the suffix line
-        elif self.suffix_list is None:
-
-            if len(self.match_values) == self.n_in and len(self.ifmt) == self.n_in:
-
-                for idx, file in enumerate(self.file_list, start=1):
-                    command += (
-                        f"\tin{idx}={rel_data_in + file} ifmt{idx}={self.ifmt[idx - 1]} "
-                        f"values{idx}='{self.match_values[idx - 1]}' \\\n"
-                    )
-
-            elif len(self.match_values) == 1 and len(self.ifmt) == self.n_in:
-
-                for idx, file in enumerate(self.file_list, start=1):
-                    command += (
-                        f"\tin{idx}={rel_data_in + file} ifmt{idx}={self.ifmt[idx - 1]} "
-                        f"values{idx}='{self.match_values[0]}' \\\n"
-                    )
-
-            elif len(self.match_values) == self.n_in and len(self.ifmt) == 1:
-
-                for idx, file in enumerate(self.file_list, start=1):
-                    command += (
-                        f"\tin{idx}={rel_data_in + file} ifmt{idx}={self.ifmt[0]} "
-                        f"values{idx}='{self.match_values[idx - 1]}' \\\n"
-                    )
-
-            elif len(self.match_values) == 1 and len(self.ifmt) == 1:
-
-                for idx, file in enumerate(self.file_list, start=1):
-                    command += (
-                        f"\tin{idx}={rel_data_in + file} ifmt{idx}={self.ifmt[0]} "
-                        f"values{idx}='{self.match_values[0]}' \\\n"
-                    )
+        # Stage text inputs as binary colfits files, if requested. The conversion writes to a temporary name first, so
+        # an interrupted run never leaves a truncated file behind
+        input_files, input_formats, conversions = self._stage_inputs(rel_data_in)
+        staging_commands = "".join(
+            f"{self._stilts_call()} tcopy in={c['in']} ifmt={c['ifmt']} out={c['part']} ofmt=colfits-plus && "
+            f"mv {c['part']} {c['out']}\n"
+            for c in conversions
+        )
+
+        # Iteratively add in{x}, ifmt{x}, suffix{x}, values{x} (and icmd{x}) for each file
+        for idx, (file, fmt, input_command) in enumerate(zip(input_files, input_formats, self._input_commands()),
+                                                          start=1):
+            suffix = self.suffix_list[idx - 1]
+            values = self.match_values[0] if len(self.match_values) == 1 else self.match_values[idx - 1]
+            icmd = "" if input_command is None else f" icmd{idx}='{input_command}'"
+            command += (
+                f"\tin{idx}={file} ifmt{idx}={fmt} "
+                f"suffix{idx}='_{suffix}' "
+                f"values{idx}='{values}'{icmd} \\\n"
+            )
 
         # iteratively add the join statements
-        for idx, file in enumerate(self.file_list, start=1):
+        for idx, join_mode in enumerate(self._table_join_modes(), start=1):
             if (idx == 1) or (idx == int(len(self.file_list) / 2) + 1):
                 command += (
-                    f"\tjoin{idx}={self.join_mode} ")
+                    f"\tjoin{idx}={join_mode} ")
             elif idx == int(len(self.file_list) / 2):
                 command += (
-                    f"join{idx}={self.join_mode} \\\n")
+                    f"join{idx}={join_mode} \\\n")
             else:
                 command += (
-                    f"join{idx}={self.join_mode} ")
+                    f"join{idx}={join_mode} ")
 
         # Add the rest of the fixed part of the command
+        output_command = self._output_command()
+        ocmd = "" if output_command is None else f" ocmd='{output_command}'"
         command += (
             f"\\\n"
-            f"\tfixcols={self.fixcols} out={rel_data_out + self.output_file_name} ofmt={self.ofmt} progress={self.progress}"
+            f"\tfixcols={self.fixcols} out={rel_data_out + self.output_file_name} ofmt={self.ofmt} progress={self.progress} runner={self.runner}"
+            f"{ocmd}"
         )
 
         # Write the command to the file
@@ -161,37 +150,1005 @@ class StiltsMatcher(MatchConfigurator):
             self.command_file_name = "Nmatch_commands.txt"
 
         with open(os.path.join(self._script_path, self.command_file_name), 'w') as file:
-            file.write(command)
+            file.write(staging_commands + command)
             print(f"Command written to {self._script_path + self.command_file_name}")
         os.chmod(self._script_path + self.command_file_name, stat.S_IRWXU | stat.S_IRWXG | stat.S_IRWXO)
 
         if print_command:
             print(command)
 
-    def perform_Nmatch(self, return_output: bool = True, log_file: bool = True):
+    def _input_commands(self):
+        """
+        Builds the STILTS input filter of every input table: the `input_command`, followed by the `keep_columns`
+        pruning.
+
+        Returns:
+            list: One `icmdN` value (or None if the table is not filtered) per input file.
+        """
+
+        commands = []
+        for keep in self._table_keep_columns():
+            steps = [self.input_command] if self.input_command else []
+            if keep is not None:
+                steps.append(f'keepcols "{" ".join(keep)}"')
+            commands.append("; ".join(steps) if steps else None)
+        return commands
+
+    def _output_command(self):
+        """
+        Builds the STILTS output filter: the `output_command`, followed by the `output_columns` pruning.
+
+        Returns:
+            str: The `ocmd` value, or None if the output is not filtered.
+        """
+
+        steps = [self.output_command] if self.output_command else []
+        if self.output_columns is not None:
+            steps.append(f'keepcols "{" ".join(self.output_columns)}"')
+        return "; ".join(steps) if steps else None
+
+    def _stilts_call(self):
+        """
+        Builds the STILTS invocation including the JVM options, e.g. "stilts -Xmx4G".
+
+        Returns:
+            str: Start of every STILTS command line.
+        """
+
+        return " ".join(["stilts"] + self._jvm_options())
+
+    def _jvm_options(self):
+        """
+        Collects the options placed between `stilts` and the task name.
+
+        Returns:
+            list: Options such as "-Xmx4G" and "-disk".
+        """
+
+        options = []
+        if self.jvm_heap:
+            options.append(f"-Xmx{self.jvm_heap}")
+        if self.disk:
+            options.append("-disk")
+        return options
+
+    def plan_resources(self, write_plan: bool = True):
+        """
+        Estimates the size of the inputs and chooses the STILTS resources for the match (see `CatMatcher.planner`).
+
+        The planned jvm_heap, tuning and disk settings are applied unless they were set explicitly; the planned runner
+        is always applied. Settings chosen by an earlier plan are updated by a new one.
+
+        Args:
+            write_plan (bool): If True, writes the plan to `<command_file_name>_plan.json` in the `scripts/` directory,
+                so the run can be reproduced with the same settings.
+
+        Returns:
+            ResourcePlan: The chosen settings and the size estimates they are based on.
+        """
+
+        files = [os.path.join(self.normalized_path, file) for file in self.file_list]
+        plan = plan_resources(files, self._table_formats(), self.match_radius, self.matcher,
+                              memory_mb=heap_to_mb(self.max_memory) if self.max_memory else None)
+
+        planned = getattr(self, "_planned_fields", set())
+        for name, unset in (("jvm_heap", None), ("tuning", None), ("disk", False)):
+            if getattr(self, name) == unset or name in planned:
+                setattr(self, name, getattr(plan, name))
+                planned.add(name)
+        self.runner = plan.runner
+        self._planned_fields = planned
+
+        if write_plan:
+            plan_file = self._script_path + os.path.splitext(self.command_file_name or "Nmatch_commands")[0] + "_plan.json"
+            plan.to_json(plan_file)
+            print(f"Resource plan written to {plan_file}")
+
+        return plan
+
+    def _stage_inputs(self, data_dir: str, staged_dir: str = "../staged/"):
+        """
+        Plans the conversion of text inputs (csv, ecsv, tst) into binary colfits files, which STILTS can memory-map
+        instead of re-parsing the text on every run.
+
+        Staged files are stored in the `staged/` directory and named after the content hash of their source, so they
+        are reused until the source file changes. For every input that has no up-to-date staged copy yet, a conversion
+        is returned, which has to be run (with STILTS `tcopy`) right before the match.
+
+        Inputs with `transforms` are always staged: their match columns are transformed here (see
+        `CatMatcher.transforms`) and written as FITS file named after the content hash and the transform fingerprint,
+        so STILTS matches the transformed positions without per-row expressions, and the transform runs once per
+        input version.
+
+        Args:
+            data_dir (str): Path of the data directory, as it should appear in the match command (e.g. relative to the
+                `scripts/` directory).
+            staged_dir (str, optional): Path of the `staged/` directory, as it should appear in the match command.
+
+        Returns:
+            tuple: The input file paths and formats to use in the match command, and the list of pending conversions
+            (dictionaries with the tcopy parameters "in", "ifmt" and "out", and the unique temporary name "part" that
+            the conversion writes to before it is renamed to "out", so that concurrent jobs never share it).
+        """
+
+        input_files = [data_dir + file for file in self.file_list]
+        input_formats = self._table_formats()
+        conversions = []
+
+        transforms = self._table_transforms()
+        if not self.stage_inputs and all(transform is None for transform in transforms):
+            return input_files, input_formats, conversions
+
+        for idx, (file, fmt, transform) in enumerate(zip(self.file_list, self._table_formats(), transforms)):
+            if transform is None and (not self.stage_inputs or fmt not in ("csv", "ecsv", "tst")):
+                continue
+
+            stem = os.path.splitext(os.path.basename(file))[0]
+            digest = file_digest(os.path.join(self.normalized_path, file),
+                                 memo_file=os.path.join(self._staged_path, ".digests.json"))
+
+            if transform is not None:
+                input_files[idx] = staged_dir + self._stage_transformed(idx, stem, digest)
+                input_formats[idx] = "fits"
+                continue
+
+            staged_name = f"{stem}_{digest[:16]}.colfits"
+
+            if not os.path.exists(self._staged_path + staged_name):
+                # drop staged copies of earlier versions of the same file
+                for old in os.listdir(self._staged_path):
+                    if re.fullmatch(re.escape(stem) + r"_[0-9a-f]{16}\.colfits", old):
+                        _remove_if_exists(self._staged_path + old)
+
+                part = f"{staged_name}.{uuid.uuid4().hex[:12]}.part"
+                conversions.append({"in": data_dir + file, "ifmt": fmt, "out": staged_dir + staged_name,
+                                    "part": staged_dir + part})
+
+            input_files[idx] = staged_dir + staged_name
+            input_formats[idx] = "colfits"
+
+        return input_files, input_formats, conversions
+
+    def _stage_transformed(self, idx: int, stem: str, digest: str):
+        """
+        Writes a copy of an input table with transformed match columns to the `staged/` directory, unless an
+        up-to-date copy exists.
+
+        Args:
+            idx (int): Zero-based index of the table in the file list.
+            stem (str): File name of the table without extension.
+            digest (str): Content hash of the table.
+
+        Returns:
+            str: Name of the staged FITS file.
+        """
+
+        transform = self._table_transforms()[idx]
+        columns = self._table_match_values()[idx]
+        staged_name = f"{stem}_{digest[:16]}_{transform.fingerprint()[:8]}.fits"
+
+        if not os.path.exists(self._staged_path + staged_name):
+            # drop transformed copies of earlier versions of the same file
+            for old in os.listdir(self._staged_path):
+                if re.fullmatch(re.escape(stem) + r"_[0-9a-f]{16}_[0-9a-f]{8}\.fits", old):
+                    _remove_if_exists(self._staged_path + old)
+
+            table = read_table(os.path.join(self.normalized_path, self.file_list[idx]), self._table_formats()[idx])
+            table = transform.apply_table(table, columns[:3] if self.matcher == "skyerr" else columns[:2])
+            # written to a unique temporary name first, so an interrupted run never leaves a truncated file behind
+            part = f"{self._staged_path}{staged_name}.{uuid.uuid4().hex[:12]}.part"
+            write_table(table, part, "fits")
+            os.replace(part, self._staged_path + staged_name)
+
+        return staged_name
+
+    def _N_match_params(self, data_dir: str, staged_dir: str, out_dir: str):
+        """
+        Collects the parameters of the STILTS tmatchn task (the same ones `build_N_match` writes to the command file)
+        as a dictionary, for execution modes that do not go through a shell script.
+
+        Args:
+            data_dir (str): Path of the data directory, as it should appear in the parameters.
+            staged_dir (str): Path of the `staged/` directory, as it should appear in the parameters.
+            out_dir (str): Path of the `matches/` directory, as it should appear in the parameters.
+
+        Returns:
+            tuple: The ordered parameter dictionary of tmatchn, and the list of pending input conversions (see
+            `_stage_inputs`).
+        """
+
+        if self.auto_plan:
+            self.plan_resources()
+
+        input_files, input_formats, conversions = self._stage_inputs(data_dir, staged_dir)
+
+        params = {"multimode": self.multimode, "nin": self.n_in, "matcher": self.matcher, "params": self.match_radius}
+        if self.tuning is not None:
+            params["tuning"] = self.tuning
+        if self.multimode == "pairs" and self.iref is not None:
+            params["iref"] = self.iref
+        for idx, (file, fmt, input_command) in enumerate(zip(input_files, input_formats, self._input_commands()),
+                                                          start=1):
+            params[f"in{idx}"] = file
+            params[f"ifmt{idx}"] = fmt
+            params[f"suffix{idx}"] = f"_{self.suffix_list[idx - 1]}"
+            params[f"values{idx}"] = self.match_values[0] if len(self.match_values) == 1 else self.match_values[idx - 1]
+            if input_command is not None:
+                params[f"icmd{idx}"] = input_command
+        for idx, join_mode in enumerate(self._table_join_modes(), start=1):
+            params[f"join{idx}"] = join_mode
+        params.update(fixcols=self.fixcols, out=out_dir + self.output_file_name, ofmt=self.ofmt,
+                      progress=self.progress, runner=self.runner)
+        if self._output_command() is not None:
+            params["ocmd"] = self._output_command()
+
+        return params, conversions
+
+    def perform_Nmatch(self, return_output: bool = True, log_file: bool = True, server: StiltsServer = None,
+                       return_table: str = None, write_output: bool = True):
         """
          Executes the STILTS match command constructed by `build_N_match`.
 
          This method calls `build_N_match()` to prepare the matching script, then executes it using a shell call.
-         Optionally returns output logs and is intended to support future logging of match parameters and statistics.
+         Optionally returns output logs and writes a log of the match parameters and statistics.
+         If `engine="native"`, no script is written and the match is computed in-process instead (see
+         `_perform_native_Nmatch`). If a running `StiltsServer` is given, the match is sent to that warm STILTS process
+         instead of starting a new JVM. With `executor="direct"`, STILTS is started without a shell and the outcome of
+         the run is returned. With `use_result_cache`, an earlier result of the same inputs and settings is reused
+         (see `_cached_Nmatch`).
 
          Args:
              return_output (bool): If True, prints shell execution output and error to stdout.
-             log_file (bool): Placeholder for future implementation of a match log generation function.
+             log_file (bool): If True, writes `<output name>_log.json` to the `matches/` directory, holding the match
+                parameters, matched/unmatched counts per table, group sizes, a separation histogram and the time spent
+                per phase (see `CatMatcher.match_log`).
+             server (StiltsServer, optional): STILTS server that executes the match (ignored by the native engine).
+             return_table (str, optional): If "pandas" or "numpy", the joined table is returned as DataFrame or
+                structured array. STILTS then writes the match as FITS to its standard output (`out=-`), which is
+                decoded while it is streamed; without a server STILTS is started directly, whatever the `executor`.
+             write_output (bool): If False (only with `return_table`), the table is not written to the `matches/`
+                directory. Otherwise it is written in `ofmt`.
 
          Returns:
-            No direct output, but:
+            pd.DataFrame or np.ndarray: The joined table, if `return_table` is set.
+            StiltsRunResult: Otherwise, for `executor="direct"`, the return code, timings, peak memory and output of
+            the run (None if the result was taken from the result cache).
+            Otherwise no direct output, but:
              - Writes the constructed command string to a `.txt` file (and prints it if required).
              - Executes a shell script to perform the match.
-             - (Planned) Generates a log file with match parameters and statistics.
+             - Generates a log file with match parameters and statistics.
+
+         Raises:
+            ValueError: If `return_table` is not supported, `write_output=False` is given without it, or
+                `checkpoint_tiles` is set for the STILTS engine.
+            StiltsRunError: If the STILTS run fails (non-zero return code) or does not write the output file. No run
+                log is written then. For `executor="direct"`, the error holds the StiltsRunResult of the run.
          """
 
-        # create the command
-        self.build_N_match()
+        if return_table not in (None, "pandas", "numpy"):
+            raise ValueError(f"return_table must be None, 'pandas' or 'numpy', got '{return_table}'.")
+        if not write_output and return_table is None:
+            raise ValueError("write_output=False requires return_table, otherwise the match would be lost.")
+        if self.checkpoint_tiles and self.engine != "native":
+            raise ValueError("checkpoint_tiles requires engine='native'.")
+
+        if self.use_result_cache:
+            return self._cached_Nmatch(return_output, log_file, server, return_table, write_output)
+        return self._run_Nmatch(return_output, log_file, server, return_table, write_output)
+
+    def _run_Nmatch(self, return_output: bool, log_file: bool, server: StiltsServer, return_table: str,
+                    write_output: bool):
+        """ Performs the match with the configured engine, see `perform_Nmatch` for the arguments."""
+
+        if self.engine == "native":
+            table = self._perform_native_Nmatch(log_file, write_output)
+            if return_table == "numpy":
+                return table.to_records(index=False)
+            return table if return_table == "pandas" else None
 
-        # run the stilts script
-        execute_shell_script(destination_path=self._script_path, return_output=return_output)
+        start = time.perf_counter()
+        result = None
+        phase_times = []
+
+        if return_table is not None:
+            (array, meta), result = self._perform_streamed_Nmatch(server, return_output)
+            table = fits_to_dataframe(array, meta) if (return_table == "pandas" or write_output) else None
+            if write_output:
+                write_table(table, self._match_path + self.output_file_name, self.ofmt)
+            if log_file:
+                phase_times = [] if result is None else list(result.phase_times)
+                phase_times.append(("match", time.perf_counter() - start))
+                self._write_match_log(self._stilts_output_statistics(array), phase_times)
+            return table if return_table == "pandas" else array
+
+        output = self._match_path + self.output_file_name
+        previous_output = _file_signature(output)
+        if server is not None:
+            self._perform_server_Nmatch(server, return_output)
+        elif self.executor == "direct":
+            result = self._perform_direct_Nmatch(return_output)
+            phase_times = list(result.phase_times)
+            if result.returncode != 0:
+                raise StiltsRunError(f"STILTS match failed with return code {result.returncode}: "
+                                     f"{' '.join(result.stderr_lines[-5:])}", result)
+        else:
+            # create the command
+            self.build_N_match()
+
+            # run the stilts script
+            process = execute_shell_script(destination_path=self._script_path, return_output=return_output)
+            if process.returncode != 0:
+                raise StiltsRunError(f"STILTS match failed with return code {process.returncode}: "
+                                     f"{' '.join(process.stderr.splitlines()[-5:])}")
+
+        # an output left over from an earlier run must never be logged as the result of this one
+        if _file_signature(output) in (None, previous_output):
+            raise StiltsRunError(f"The STILTS match did not write {output}.", result)
 
         # log
-        # if log_file:
-        # TODO: Function for creating log with match-params and match statistic
+        if log_file:
+            phase_times.append(("match", time.perf_counter() - start))
+            self._write_match_log(self._stilts_output_statistics(), phase_times)
+
+        return result
+
+    def _result_cache_config(self):
+        """
+        Collects the settings that determine the match output, which identify a result in the result cache together
+        with the content of the inputs. Settings that only affect how the match runs (e.g. `n_workers`, `chunk_size`,
+        `executor`, `timeout`, `runner`, `jvm_heap` or `disk`) and the locations of inputs and outputs are left out, so
+        runs that differ only in these share their entry.
+
+        Returns:
+            dict: The settings by name, with the per-table settings resolved for every table.
+        """
+
+        return {"engine": self.engine, "matcher": self.matcher, "multimode": self.multimode,
+                "match_radius": float(self.match_radius), "iref": self.iref, "input_formats": self._table_formats(),
+                "match_values": self._table_match_values(), "transforms": self._table_transforms(),
+                "keep_columns": self._table_keep_columns(), "join_modes": self._table_join_modes(),
+                "suffix_list": self.suffix_list, "fixcols": self.fixcols, "input_command": self.input_command,
+                "output_command": self.output_command, "output_columns": self.output_columns, "ofmt": self.ofmt}
+
+    def _result_cache(self):
+        """ Opens the result cache and gets the key of the current inputs and settings."""
+
+        cache = ResultCache(self._result_path, self.result_cache_size)
+        files = [os.path.join(self.normalized_path, file) for file in self.file_list]
+        return cache, cache.key(files, self._result_cache_config())
+
+    def invalidate_result_cache(self, all_entries: bool = False):
+        """
+        Removes the cached result of the current inputs and settings (see `use_result_cache`), so the next run matches
+        again.
+
+        Args:
+            all_entries (bool): If True, removes all entries of the result cache instead.
+
+        Returns:
+            int: Number of removed entries.
+        """
+
+        cache, key = self._result_cache()
+        return cache.invalidate(None if all_entries else key)
+
+    def _cached_Nmatch(self, return_output: bool, log_file: bool, server: StiltsServer, return_table: str,
+                       write_output: bool):
+        """
+        Performs the match through the result cache, see `perform_Nmatch` for the arguments.
+
+        On a hit (an entry holding everything this call asks for: output file, log and/or table) the stored output and
+        log are hard-linked into the `matches/` directory and the stored table is returned, without matching. Otherwise
+        the match runs and its results are stored. Only files written by this run are stored, and nothing is stored if
+        the run fails. Returned tables are stored as FITS and read back, so hits and misses return the same table.
+
+        Returns:
+            The return value of `perform_Nmatch` (None instead of a StiltsRunResult on a hit).
+
+        Raises:
+            RuntimeError: If the match fails or does not write the requested output file.
+        """
+
+        cache, key = self._result_cache()
+        output = self._match_path + self.output_file_name
+        log = self._match_path + os.path.splitext(self.output_file_name)[0] + "_log.json"
+        needed = [name for name, flag in (("output", write_output), ("log", log_file), ("table", return_table)) if flag]
+
+        entry = cache.load(key)
+        if entry is not None and all(name in entry["files"] for name in needed):
+            if write_output:
+                cache.restore(entry, "output", output)
+                print(f"Match restored from the result cache to {output}")
+            if log_file:
+                cache.restore(entry, "log", log)
+            return self._cached_table(entry, return_table) if return_table else None
+
+        # never write a new result into a file that is still linked to a cache entry
+        for file in (output, log):
+            if os.path.exists(file) and os.stat(file).st_nlink > 1:
+                os.remove(file)
+
+        previous = {"output": _file_signature(output), "log": _file_signature(log)}
+        result = self._run_Nmatch(return_output, log_file, server, return_table and "pandas", write_output)
+
+        # a file left over from an earlier run (e.g. with another radius) must never be stored under this key
+        files = {}
+        if write_output:
+            if _file_signature(output) in (None, previous["output"]):
+                raise RuntimeError(f"The match did not write {output}, so no result is cached.")
+            files["output"] = output
+        if log_file and _file_signature(log) not in (None, previous["log"]):
+            files["log"] = log
+        table_file = None
+        if return_table:
+            fd, table_file = tempfile.mkstemp(prefix=f".{key}.", suffix=".fits", dir=self._result_path)
+            os.close(fd)
+            write_table(result, table_file, "fits")
+            files["table"] = table_file
+        if files:
+            entry = cache.store(key, files, config=canonical_config(self._result_cache_config()))
+        if table_file is not None:
+            os.remove(table_file)
+
+        if return_table and entry is None:  # stored concurrently by another process or thread
+            return result if return_table == "pandas" else result.to_records(index=False)
+        return self._cached_table(entry, return_table) if return_table else result
+
+    def _cached_table(self, entry: dict, return_table: str):
+        """ Reads the table of a result cache entry, as `perform_Nmatch` returns it for `return_table`."""
+
+        with open(entry["files"]["table"], "rb") as f:
+            array, meta = read_fits_table(f)
+        if return_table == "pandas":
+            return fits_to_dataframe(array, meta)
+        # the native engine returns records of the DataFrame, STILTS the decoded FITS table
+        return fits_to_dataframe(array, meta).to_records(index=False) if self.engine == "native" else array
+
+    def _perform_server_Nmatch(self, server: StiltsServer, return_output: bool = True):
+        """
+        Sends the tmatchn job (and pending input conversions, see `stage_inputs`) to a warm STILTS server.
+
+        All paths are passed as absolute paths, as the server does not run inside the `scripts/` directory.
+
+        Args:
+            server (StiltsServer): Server that executes the tasks.
+            return_output (bool): If True, prints the task output to stdout.
+
+        Returns:
+            No direct output, but the server writes the match to the `matches/` directory.
+        """
+
+        data_dir = os.path.abspath(self.normalized_path) + "/"
+        params, conversions = self._N_match_params(data_dir, os.path.abspath(self._staged_path) + "/",
+                                                   os.path.abspath(self._match_path) + "/")
+
+        for conversion in conversions:
+            server.submit("tcopy", {"in": conversion["in"], "ifmt": conversion["ifmt"],
+                                    "out": conversion["part"], "ofmt": "colfits-plus"})
+            os.replace(conversion["part"], conversion["out"])
+
+        output = server.submit("tmatchn", params)
+        if return_output:
+            print('Output:', output)
+
+    def _perform_streamed_Nmatch(self, server: StiltsServer = None, return_output: bool = True):
+        """
+        Runs the tmatchn job with the output written as FITS to standard output, and decodes it while it is streamed.
+
+        Args:
+            server (StiltsServer, optional): STILTS server that executes the match. If None, STILTS is started directly.
+            return_output (bool): If True, prints the output of STILTS.
+
+        Returns:
+            tuple: The decoded table and its column metadata (see `read_fits_table`), and the StiltsRunResult of a
+            direct run (None for a server).
+
+        Raises:
+            RuntimeError: If the match (or an input conversion) fails.
+        """
+
+        data_dir = os.path.abspath(self.normalized_path) + "/"
+        params, conversions = self._N_match_params(data_dir, os.path.abspath(self._staged_path) + "/",
+                                                   os.path.abspath(self._match_path) + "/")
+        params.update({"out": "-", "ofmt": "fits"})
+
+        if server is not None:
+            for conversion in conversions:
+                server.submit("tcopy", {"in": conversion["in"], "ifmt": conversion["ifmt"],
+                                        "out": conversion["part"], "ofmt": "colfits-plus"})
+                os.replace(conversion["part"], conversion["out"])
+            return server.stream("tmatchn", params, read_fits_table), None
+
+        jvm_options = self._jvm_options()
+        on_line = print if return_output else None
+        self._run_direct_conversions(conversions, jvm_options, on_line)
+
+        decoded, result = stream_stilts(build_argv("tmatchn", params, jvm_options=jvm_options), read_fits_table,
+                                        timeout=self.timeout, on_line=on_line)
+        if return_output:
+            print('Return code:', result.returncode)
+        if decoded is None:
+            raise StiltsRunError(f"STILTS match failed with return code {result.returncode}: "
+                                 f"{' '.join(result.stderr_lines[-5:])}", result)
+
+        return decoded, result
+
+    def _run_direct_conversions(self, conversions: list, jvm_options: list, on_line=None):
+        """
+        Runs the pending input conversions (see `stage_inputs`) directly from argv lists.
+
+        Raises:
+            RuntimeError: If an input conversion fails.
+        """
+
+        for conversion in conversions:
+            argv = build_argv("tcopy", {"in": conversion["in"], "ifmt": conversion["ifmt"],
+                                        "out": conversion["part"], "ofmt": "colfits-plus"},
+                              jvm_options=jvm_options)
+            result = run_stilts(argv, timeout=self.timeout, on_line=on_line)
+            if result.returncode != 0:
+                raise RuntimeError(f"Staging of {conversion['in']} failed: {' '.join(result.stderr_lines)}")
+            os.replace(conversion["part"], conversion["out"])
+
+    def _perform_direct_Nmatch(self, return_output: bool = True):
+        """
+        Runs the tmatchn job (and pending input conversions, see `stage_inputs`) directly from an argv list.
+
+        Args:
+            return_output (bool): If True, every output line is printed as soon as STILTS writes it.
+
+        Returns:
+            StiltsRunResult: Outcome of the match run.
+
+        Raises:
+            RuntimeError: If an input conversion fails.
+        """
+
+        data_dir = os.path.abspath(self.normalized_path) + "/"
+        params, conversions = self._N_match_params(data_dir, os.path.abspath(self._staged_path) + "/",
+                                                   os.path.abspath(self._match_path) + "/")
+        jvm_options = self._jvm_options()
+        on_line = print if return_output else None
+        self._run_direct_conversions(conversions, jvm_options, on_line)
+
+        result = run_stilts(build_argv("tmatchn", params, jvm_options=jvm_options), timeout=self.timeout,
+                            on_line=on_line)
+        if return_output:
+            print('Return code:', result.returncode)
+
+        return result
+
+    def _perform_native_Nmatch(self, log_file: bool = True, write_output: bool = True):
+        """
+        Performs the N-way match in-process, without a STILTS/JVM call.
+
+        The positions of all tables are converted to unit vectors, neighbour pairs within `match_radius` are found with
+        a KD-tree per table, and the pairs are merged into groups by a connected-components pass. If `n_shards` is set,
+        the pair search is split into declination zones that are processed by a pool of worker processes. The output is
+        joined according to `join_mode` and `fixcols` like the STILTS `tmatchn` group mode and written to
+        `output_file_name` inside the `matches/` directory.
+
+        With `matcher="exact"`, rows match if all their match values (the key columns, e.g. a catalog id) are equal,
+        see `CatMatcher.exact_matcher`. With `matcher="skyerr"`, the third match column of every table holds a per-row error radius in arcseconds, and
+        two rows match if their separation is at most the sum of their error radii (`match_radius` is then only the
+        STILTS tuning scale). With `multimode="pairs"`, every other table is queried against the index of the
+        reference table `iref`, and every reference row is joined with its best match (smallest separation, or
+        smallest separation relative to the summed error radii for skyerr) in each other table. `n_shards` only
+        applies to the group mode.
+
+        Args:
+            log_file (bool): If True, writes the run log (see `_write_match_log`) with statistics taken directly from the
+                match arrays.
+            write_output (bool): If True, writes the joined table to the `matches/` directory.
+
+        Returns:
+            pd.DataFrame: The joined table.
+
+        Raises:
+            ValueError: If the matcher or multimode is not (yet) supported by the native engine.
+        """
+
+        if self.matcher not in ("sky", "skyerr", "exact"):
+            raise ValueError("The native engine currently only supports matcher='sky', 'skyerr' and 'exact'.")
+        if self.incremental and (self.matcher != "sky" or self.multimode != "group"):
+            raise ValueError("Incremental matching is only supported for matcher='sky' with multimode='group'.")
+        if self.checkpoint_tiles and (self.matcher != "sky" or self.multimode != "group" or self.incremental):
+            raise ValueError("Checkpointed matching is only supported for matcher='sky' with multimode='group', "
+                             "without incremental matching.")
+
+        phase_times = []
+        clock = time.perf_counter()
+
+        def phase(name):
+            nonlocal clock
+            phase_times.append((name, time.perf_counter() - clock))
+            clock = time.perf_counter()
+
+        # match and group
+        if self.incremental:
+            members, n_rows, xyz_list = self._incremental_native_groups(phase)
+        elif self.matcher == "exact":
+            codes = key_codes(self._load_native_keys())
+            n_rows = [len(c) for c in codes]
+            phase("load and hash keys")
+            if self.multimode == "pairs":
+                always = [t for t, mode in enumerate(self._table_join_modes()) if mode == "always"]
+                members = exact_pair_members(codes, self._reference_table(), always)
+            else:
+                members = exact_group_members(codes)
+            xyz_list = None  # exact matches have no separations
+            phase("form groups")
+        else:
+            xyz_list, indexes = self._load_native_positions()
+            n_rows = [len(xyz) for xyz in xyz_list]
+            phase("load positions and indexes")
+
+            err_list = None
+            if self.matcher == "skyerr":
+                err_list = self._load_native_errors()
+                phase("load error radii")
+
+            if self.multimode == "pairs":
+                # every other table against the index of the reference table, keeping only the best pairs
+                iref = self._reference_table()
+                first, second, sep = reference_pairs(xyz_list, iref, self.match_radius, err_list, indexes)
+                phase("find best pairs")
+                always = [t for t, mode in enumerate(self._table_join_modes()) if mode == "always"]
+                members = pair_members(n_rows, first, second, sep, iref, always)  # pairs are unique per table already
+            else:
+                if err_list is not None:
+                    first, second, sep = find_skyerr_pairs(xyz_list, err_list)
+                elif self.checkpoint_tiles:
+                    first, second, sep = self._find_checkpointed_pairs(xyz_list)
+                else:
+                    first, second, sep = self._find_native_pairs(xyz_list, self.match_radius, indexes)
+                phase("find pairs")
+                members = group_members(n_rows, first, second, xyz_list)
+            phase("form groups")
+        members = select_joined_rows(members, self._table_join_modes())
+
+        # join and write, with the kept columns read only for the rows that end up in the output
+        keep_columns = self._table_keep_columns()
+        transforms = self._table_transforms() if self.matcher != "exact" else [None] * self.n_in
+        tables = [fetch_rows(os.path.join(self.normalized_path, file), fmt, members[:, t], n_rows[t], self.chunk_size,
+                             None if keep is None else list(dict.fromkeys(keep + (transform.columns if transform else []))))
+                  for t, (file, fmt, keep, transform) in enumerate(zip(self.file_list, self._table_formats(),
+                                                                       keep_columns, transforms))]
+        if self.matcher != "exact":
+            # the output holds the transformed match columns, as the staged inputs of STILTS do
+            n_values = 3 if self.matcher == "skyerr" else 2
+            tables = [table if transform is None else transform.apply_table(table, columns[:n_values])
+                      for table, transform, columns in zip(tables, transforms, self._table_match_values())]
+        tables = [table if keep is None else table[keep] for table, keep in zip(tables, keep_columns)]
+        result = join_tables(members, tables, self.suffix_list, self.fixcols)
+        if self.output_columns is not None:
+            result = result[self.output_columns]
+        phase("join tables")
+        if write_output:
+            write_table(result, self._match_path + self.output_file_name, self.ofmt)
+            phase("write output")
+            print(f"Match written to {self._match_path + self.output_file_name}")
+        if self.checkpoint_tiles:
+            shutil.rmtree(self._tile_path, ignore_errors=True)
+
+        if log_file:
+            separations = np.empty(0)
+            if xyz_list is not None:
+                # positions of the entries of every output row (NaN where a table has none), as in the STILTS output
+                positions = [np.full((len(members), 3), np.nan) for _ in xyz_list]
+                for t, xyz in enumerate(xyz_list):
+                    valid = members[:, t] >= 0
+                    positions[t][valid] = np.asarray(xyz)[members[valid, t]]
+                separations = row_separations(positions)
+            statistics = match_statistics(members >= 0, n_rows, separations, self.match_radius, self.suffix_list)
+            phase("statistics")
+            self._write_match_log(statistics, phase_times)
+
+        return result
+
+    def _incremental_native_groups(self, phase):
+        """
+        Forms the match groups from the stored match state, updating only what changed since the last run (see
+        `CatMatcher.incremental`). Without a usable state (first run, or other files, columns or radius), a full
+        match is performed and its state is stored.
+
+        Args:
+            phase (callable): Called with the name of every finished phase, for the run log.
+
+        Returns:
+            tuple: The group membership array (as `group_members`, single-row groups only if needed for the join),
+            the number of rows of every table and the unit vectors of every table.
+        """
+
+        state_dir = self._match_path + os.path.splitext(self.output_file_name)[0] + "_state/"
+        os.makedirs(state_dir, exist_ok=True)
+        fingerprint = {"file_list": list(self.file_list), "match_values": self._table_match_values(),
+                       "match_radius": float(self.match_radius),
+                       "transforms": [t.fingerprint() if t is not None else None for t in self._table_transforms()]}
+
+        state = load_match_state(state_dir)
+        if state is not None and (state["fingerprint"] != fingerprint or len(state["tables"]) != self.n_in):
+            state = None
+
+        # only inputs whose content changed are read
+        tables, changed = [], []
+        for t, (file, fmt, columns, transform) in enumerate(zip(self.file_list, self._table_formats(),
+                                                                self._table_match_values(), self._table_transforms())):
+            file = os.path.join(self.normalized_path, file)
+            digest = file_digest(file, memo_file=state_dir + ".digests.json")
+            if state is not None and state["tables"][t]["digest"] == digest:
+                tables.append(state["tables"][t])
+                changed.append(np.empty(0, dtype=np.int64))
+                continue
+
+            hashes, xyz = row_hashes_and_positions(file, fmt, columns[:2], self.chunk_size, transform)
+            order, z_sorted = declination_order(xyz)
+            tables.append({"digest": digest, "n_rows": len(xyz), "hashes": hashes, "xyz": xyz, "order": order,
+                           "z_sorted": z_sorted})
+            if state is not None:
+                changed.append(changed_rows(state["tables"][t]["hashes"], hashes))
+
+        n_rows = [int(table["n_rows"]) for table in tables]
+        xyz_list = [table["xyz"] for table in tables]
+        phase("read changed inputs")
+
+        if state is None:
+            first, second, sep = self._find_native_pairs([np.asarray(xyz) for xyz in xyz_list], self.match_radius)
+            pairs = pairs_to_rows(first, second, n_rows)
+            phase("find pairs")
+            members = group_members(n_rows, first, second, xyz_list)
+            groups = members[(members >= 0).sum(axis=1) >= 2]
+            phase("form groups")
+        else:
+            pairs, sep = update_pairs(state["pairs"], state["separations"], changed, tables, self.match_radius)
+            first, second = rows_to_pairs(pairs, n_rows)
+            phase("update pairs")
+            groups, n_regrouped = merge_groups(np.asarray(state["groups"]), n_rows, changed, state["pairs"], pairs,
+                                               xyz_list)
+            phase("update groups")
+            print(f"Incremental match: {sum(map(len, changed))} changed rows, {n_regrouped} rows grouped again")
+
+        save_match_state(state_dir, fingerprint, tables, groups, pairs, sep)
+        phase("store match state")
+
+        # single-row groups only reach the output through join_mode="always"
+        members = add_singletons(groups, n_rows) if "always" in self._table_join_modes() else groups
+        return members, n_rows, xyz_list
+
+    def _stilts_output_statistics(self, table=None):
+        """
+        Computes the match statistics of a STILTS output file.
+
+        Only the (renamed) match columns of the output are parsed, and the input row counts are taken from a newline
+        scan, so the output is never fully re-read.
+
+        Args:
+            table (optional): Output already held in memory (structured array or DataFrame), read instead of the file.
+
+        Returns:
+            dict: Match statistics (see `match_statistics`), or None if the output could not be read.
+        """
+
+        output = self._match_path + self.output_file_name
+        if table is None and not os.path.exists(output):
+            return None
+
+        files = [os.path.join(self.normalized_path, file) for file in self.file_list]
+        try:
+            names = [read_column_names(file, fmt) if keep is None else keep
+                     for file, fmt, keep in zip(files, self._table_formats(), self._table_keep_columns())]
+            renamed = output_column_names(names, self.suffix_list, self.fixcols)
+            if self.matcher == "exact":
+                # keys can be strings, and exact matches have no separations: only the presence of every table counts
+                columns = [renamed[t][names[t].index(values[0])] for t, values in enumerate(self._table_match_values())]
+                keys = read_key_columns(output, self.ofmt, columns, self.chunk_size) if table is None else \
+                    pd.DataFrame({column: table[column] for column in columns})
+                n_rows = [count_rows(file, fmt) for file, fmt in zip(files, self._table_formats())]
+                return match_statistics(keys.notna().to_numpy(), n_rows, np.empty(0), self.match_radius,
+                                        self.suffix_list)
+
+            columns = [renamed[t][names[t].index(name)]
+                       for t, values in enumerate(self._table_match_values()) for name in values[:2]]
+            if table is None:
+                positions = read_match_columns(output, self.ofmt, columns, self.chunk_size)
+            else:
+                positions = np.column_stack([np.asarray(table[column], dtype=np.float64) for column in columns])
+            n_rows = [count_rows(file, fmt) for file, fmt in zip(files, self._table_formats())]
+        except (OSError, ValueError, KeyError):  # missing inputs, or formats that can not be read without STILTS
+            return None
+
+        xyz = [radec_to_xyz(positions[:, 2 * t], positions[:, 2 * t + 1]) for t in range(self.n_in)]
+        present = np.column_stack([np.isfinite(v).all(axis=1) for v in xyz])
+
+        return match_statistics(present, n_rows, row_separations(xyz), self.match_radius, self.suffix_list)
+
+    def _write_match_log(self, statistics: dict, phase_times: list):
+        """
+        Writes the run log next to the output file, named `<output name>_log.json`.
+
+        Both engines log the same separations (see `row_separations`): those between every two entries of an output
+        row, taken from the positions the match used. For groups linked through a chain of pairs, these include
+        separations above the match radius.
+
+        Args:
+            statistics (dict): Match statistics, see `match_statistics`.
+            phase_times (list): Tuples of (phase, seconds).
+        """
+
+        log_file = self._match_path + os.path.splitext(self.output_file_name)[0] + "_log.json"
+        write_match_log(log_file, self, statistics, phase_times)
+        print(f"Log written to {log_file}")
+
+    def _load_native_positions(self):
+        """
+        Loads the match positions of all input tables as unit vectors, together with their spatial index.
+
+        If `use_index_cache` is True, the declination-sorted positions are taken from the on-disk index cache
+        (memory-mapped) and only computed from the catalog file on the first use of a file/column/transform
+        combination. The `transforms` of every table are applied before the positions are indexed.
+
+        Returns:
+            tuple: List of the unit vectors of every table (in row order, NaN for missing positions) and list of the
+            spatial indexes, as expected by `find_sky_pairs`.
+        """
+
+        cache = IndexCache(self._index_path, self.index_cache_size) if self.use_index_cache else None
+
+        xyz_list, indexes = [], []
+        for file, fmt, columns, transform in zip(self.file_list, self._table_formats(), self._table_match_values(),
+                                                 self._table_transforms()):
+            # transformed positions are cached under their own key, next to the untransformed ones
+            index = SkyIndex.from_catalog(os.path.join(self.normalized_path, file), fmt, columns[:2], transform,
+                                          self.chunk_size, cache)
+            xyz_list.append(index.xyz)
+            indexes.append(index.index)
+
+        return xyz_list, indexes
+
+    def _load_native_errors(self):
+        """
+        Loads the error radii (third match column, in arcseconds after the `transforms`) of all input tables for
+        `matcher="skyerr"`.
+
+        Returns:
+            list: Error radius of every row of every table, in row order.
+
+        Raises:
+            ValueError: If a table has no error column among its match values.
+        """
+
+        err_list = []
+        for file, fmt, columns, transform in zip(self.file_list, self._table_formats(), self._table_match_values(),
+                                                 self._table_transforms()):
+            if len(columns) < 3:
+                raise ValueError(f"matcher='skyerr' needs three match values (RA, Dec, error) per table, got {columns} "
+                                 f"for {file}.")
+            file = os.path.join(self.normalized_path, file)
+            err = read_match_columns(file, fmt, columns[2:3], self.chunk_size)[:, 0]
+            err_list.append(transform.scale_error(err) if transform is not None else err)
+
+        return err_list
+
+    def _load_native_keys(self):
+        """
+        Loads the key columns (all match values) of all input tables for `matcher="exact"`.
+
+        Returns:
+            list: DataFrame with the key columns of every table.
+        """
+
+        return [read_key_columns(os.path.join(self.normalized_path, file), fmt, columns, self.chunk_size)
+                for file, fmt, columns in zip(self.file_list, self._table_formats(), self._table_match_values())]
+
+    @property
+    def _tile_path(self):
+        """ Directory of the checkpointed tiles of this output, see `checkpoint_tiles`."""
+
+        return self._match_path + os.path.splitext(self.output_file_name)[0] + "_tiles/"
+
+    def _find_checkpointed_pairs(self, xyz_list: list):
+        """
+        Finds all pairs within the match radius tile by tile, reusing the tiles an interrupted run with the same
+        inputs and settings has finished (see `CatMatcher.checkpointing`).
+
+        Args:
+            xyz_list (list): Unit vectors of every input table.
+
+        Returns:
+            tuple: Global node ids of the first and second pair member, and the pair separations in arcseconds.
+        """
+
+        os.makedirs(self._tile_path, exist_ok=True)
+        fingerprint = {"digests": [file_digest(os.path.join(self.normalized_path, file),
+                                               memo_file=self._tile_path + ".digests.json") for file in self.file_list],
+                       "match_values": self._table_match_values(), "match_radius": float(self.match_radius),
+                       "transforms": [t.fingerprint() if t is not None else None for t in self._table_transforms()],
+                       "n_tiles": int(self.checkpoint_tiles)}
+
+        n_done = []
+        first, second, sep = find_sky_pairs_checkpointed(xyz_list, self.match_radius, self.checkpoint_tiles,
+                                                         self._tile_path, fingerprint, self.n_workers, n_done.append)
+        print(f"Checkpointed match: {len(n_done)} tiles searched, the others resumed from {self._tile_path}")
+        return first, second, sep
+
+    def _reference_table(self):
+        """
+        Gets the position of the reference table of the pairs mode in the file list.
+
+        Returns:
+            int: Zero-based index of the table given by the (one-based, as in STILTS) `iref`, the first table if unset.
+        """
+
+        return int(self.iref) - 1 if self.iref is not None else 0
+
+    def _find_native_pairs(self, xyz_list: list, match_radius: float, indexes: list = None):
+        """
+        Finds all pairs within the match radius, using the sharded pair search if `n_shards` is set.
+
+        Args:
+            xyz_list (list): Unit vectors of every input table.
+            match_radius (float): Match radius in arcseconds.
+            indexes (list, optional): Pre-built spatial indexes of the unsharded pair search, see `find_sky_pairs`.
+
+        Returns:
+            tuple: Global node ids of the first and second pair member, and the pair separations in arcseconds.
+        """
+
+        if self.n_shards:
+            return find_sky_pairs_sharded(xyz_list, match_radius, self.n_shards, self.n_workers)
+        return find_sky_pairs(xyz_list, match_radius, indexes)
+
+    def sweep_radius(self, radii: list):
+        """
+        Evaluates the match statistics for several candidate match radii in a single pass.
+
+        The input catalogs are read and indexed once, and the pair search is run once at the largest radius. The
+        results for all smaller radii follow from filtering the pair separations, so that comparing e.g. the number of
+        matches for a set of plausible radii costs about as much as a single match. Groups and joins follow the same
+        rules as the native engine (`multimode="group"` with the configured `join_mode`).
+
+        Args:
+            radii (list): Candidate match radii in arcseconds.
+
+        Returns:
+            dict: For every radius, a dictionary with:
+
+            - "n_matches": Number of output rows the match would produce.
+            - "group_sizes": Number of output rows per number of contributing tables.
+            - "pair_counts": Number of matched pairs per combination of two tables, keyed by their suffixes.
+
+        Raises:
+            ValueError: If the matcher is not "sky" or the multimode is not "group", as the sweep only covers fixed-radius
+                sky matching in group mode.
+        """
+
+        if self.matcher != "sky" or self.multimode != "group":
+            raise ValueError("The radius sweep currently only supports matcher='sky' with multimode='group'.")
+
+        xyz_list, indexes = self._load_native_positions()
+        n_rows = [len(xyz) for xyz in xyz_list]
+        table_of_node = np.repeat(np.arange(self.n_in), n_rows)
+
+        # one pair search at the largest radius, sorted by separation so that every radius is a prefix
+        first, second, sep = self._find_native_pairs(xyz_list, max(radii), indexes)
+        order = np.argsort(sep, kind="stable")
+        first, second, sep = first[order], second[order], sep[order]
+        pair_code = table_of_node[first] * self.n_in + table_of_node[second]
+
+        sweep = {}
+        for radius in radii:
+            n_pairs = np.searchsorted(sep, radius, side="right")
+            members = group_members(n_rows, first[:n_pairs], second[:n_pairs], xyz_list)
+            members = select_joined_rows(members, self._table_join_modes())
+
+            sizes, size_counts = np.unique((members >= 0).sum(axis=1), return_counts=True)
+            codes, code_counts = np.unique(pair_code[:n_pairs], return_counts=True)
+
+            sweep[radius] = {
+                "n_matches": len(members),
+                "group_sizes": {int(size): int(count) for size, count in zip(sizes, size_counts)},
+                "pair_counts": {(self.suffix_list[code // self.n_in], self.suffix_list[code % self.n_in]): int(count)
+                                for code, count in zip(codes, code_counts)},
+            }
+
+        return sweep
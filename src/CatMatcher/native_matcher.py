@@ -0,0 +1,562 @@
+"""
+In-process replacement for the STILTS `tmatchn` sky matcher.
+
+Positions are converted to unit vectors, so that an angular match radius becomes a fixed chord length and a
+standard KD-tree can be used for the neighbour search without special handling of the RA wrap or the poles.
+Matches are represented as "nodes" (one per input row, numbered consecutively over all tables) and "pairs" of
+nodes, from which the output groups are built with a vectorized connected-components pass (group mode) or by picking
+the best match of every reference row (pairs mode). Besides the fixed-radius `sky` matcher, the per-row error radii
+of the `skyerr` matcher are supported.
+"""
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+ARCSEC_PER_RADIAN = 180 * 3600 / np.pi
+
+
+def radec_to_xyz(ra, dec):
+    """
+    Convert equatorial coordinates to unit vectors.
+
+    Args:
+        ra (np.ndarray): Right ascension in degrees.
+        dec (np.ndarray): Declination in degrees.
+
+    Returns:
+        np.ndarray: Array of shape (n, 3) with the cartesian unit vectors.
+    """
+
+    ra_rad = np.radians(np.asarray(ra, dtype=np.float64))
+    dec_rad = np.radians(np.asarray(dec, dtype=np.float64))
+    cos_dec = np.cos(dec_rad)
+
+    return np.column_stack((cos_dec * np.cos(ra_rad), cos_dec * np.sin(ra_rad), np.sin(dec_rad)))
+
+
+def arcsec_to_chord(radius):
+    """
+    Convert an angular distance in arcseconds to the chord length between two unit vectors.
+
+    Args:
+        radius (Union[float, np.ndarray]): Angular distance in arcseconds.
+
+    Returns:
+        Union[float, np.ndarray]: Corresponding chord length.
+    """
+
+    return 2 * np.sin(np.asarray(radius, dtype=np.float64) / ARCSEC_PER_RADIAN / 2)
+
+
+def chord_to_arcsec(chord):
+    """
+    Convert a chord length between two unit vectors to an angular distance in arcseconds.
+
+    Args:
+        chord (Union[float, np.ndarray]): Chord length.
+
+    Returns:
+        Union[float, np.ndarray]: Corresponding angular distance in arcseconds.
+    """
+
+    return 2 * np.arcsin(np.clip(np.asarray(chord, dtype=np.float64) / 2, 0, 1)) * ARCSEC_PER_RADIAN
+
+
+def table_offsets(n_rows: list):
+    """
+    Compute the first global node id of every table.
+
+    Args:
+        n_rows (list): Number of rows of each input table.
+
+    Returns:
+        np.ndarray: Array of length len(n_rows) + 1, where entry t is the node id of the first row of table t and the
+        last entry is the total number of nodes.
+    """
+
+    return np.concatenate(([0], np.cumsum(n_rows))).astype(np.int64)
+
+
+def build_sky_index(xyz):
+    """
+    Build a KD-tree over the valid (finite) unit vectors of a table.
+
+    Args:
+        xyz (np.ndarray): Unit vectors of shape (n, 3), as returned by `radec_to_xyz`.
+
+    Returns:
+        tuple: The `cKDTree` and the array of row indices that went into the tree (rows with missing coordinates
+        can never match and are left out).
+    """
+
+    valid = np.flatnonzero(np.isfinite(xyz).all(axis=1))
+    return cKDTree(xyz[valid]), valid
+
+
+def find_sky_pairs(xyz_list: list, match_radius: float, indexes: list = None):
+    """
+    Find all pairs of rows from different tables that are separated by at most the match radius.
+
+    Args:
+        xyz_list (list): Unit vectors of every input table.
+        match_radius (float): Match radius in arcseconds.
+        indexes (list, optional): Pre-built indexes (see `build_sky_index`), one per table. Built on the fly if None.
+
+    Returns:
+        tuple: Global node ids of the first and second pair member, and the separation of each pair in arcseconds.
+    """
+
+    if indexes is None:
+        indexes = [build_sky_index(xyz) for xyz in xyz_list]
+
+    offsets = table_offsets([len(xyz) for xyz in xyz_list])
+    chord = float(arcsec_to_chord(match_radius))
+
+    first, second, sep = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)], [np.empty(0)]
+    for a in range(len(xyz_list)):
+        tree_a, rows_a = indexes[a]
+        for b in range(a + 1, len(xyz_list)):
+            tree_b, rows_b = indexes[b]
+            pairs = tree_a.sparse_distance_matrix(tree_b, chord, output_type="ndarray")
+            first.append(rows_a[pairs["i"]] + offsets[a])
+            second.append(rows_b[pairs["j"]] + offsets[b])
+            sep.append(chord_to_arcsec(pairs["v"]))
+
+    return np.concatenate(first), np.concatenate(second), np.concatenate(sep)
+
+
+def build_error_index(xyz, err):
+    """
+    Build KD-trees over the valid unit vectors of a table, with the rows bucketed by their error radius.
+
+    Rows are put into buckets of error radii between consecutive powers of two, so that a variable-radius search can
+    query every pair of buckets at the sum of their upper error bounds, which overestimates the largest match radius
+    within the buckets by at most a factor of two.
+
+    Args:
+        xyz (np.ndarray): Unit vectors of shape (n, 3), as returned by `radec_to_xyz`.
+        err (np.ndarray): Error radius of every row in arcseconds. Rows with a missing or negative error never match.
+
+    Returns:
+        list: Tuples of (upper error bound, `cKDTree`, row indices) per non-empty bucket.
+    """
+
+    err = np.asarray(err, dtype=np.float64)
+    valid = np.flatnonzero(np.isfinite(xyz).all(axis=1) & np.isfinite(err) & (err >= 0))
+    # errors below a milliarcsecond share the lowest bucket
+    level = np.ceil(np.log2(np.maximum(err[valid], 1e-3))).astype(np.int64)
+
+    buckets = []
+    for k in np.unique(level):
+        rows = valid[level == k]
+        buckets.append((2.0 ** k, cKDTree(xyz[rows]), rows))
+    return buckets
+
+
+def find_skyerr_pairs(xyz_list: list, err_list: list, indexes: list = None):
+    """
+    Find all pairs of rows from different tables whose separation is at most the sum of their error radii, like the
+    STILTS `skyerr` matcher.
+
+    Args:
+        xyz_list (list): Unit vectors of every input table.
+        err_list (list): Error radius (in arcseconds) of every row of every input table.
+        indexes (list, optional): Pre-built indexes (see `build_error_index`), one per table. Built on the fly if None.
+
+    Returns:
+        tuple: Global node ids of the first and second pair member, and the separation of each pair in arcseconds.
+    """
+
+    if indexes is None:
+        indexes = [build_error_index(xyz, err) for xyz, err in zip(xyz_list, err_list)]
+
+    offsets = table_offsets([len(xyz) for xyz in xyz_list])
+    err_list = [np.asarray(err, dtype=np.float64) for err in err_list]
+
+    first, second, sep = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)], [np.empty(0)]
+    for a in range(len(xyz_list)):
+        for b in range(a + 1, len(xyz_list)):
+            for bound_a, tree_a, rows_a in indexes[a]:
+                for bound_b, tree_b, rows_b in indexes[b]:
+                    pairs = tree_a.sparse_distance_matrix(tree_b, float(arcsec_to_chord(bound_a + bound_b)),
+                                                          output_type="ndarray")
+                    i, j = rows_a[pairs["i"]], rows_b[pairs["j"]]
+                    separation = chord_to_arcsec(pairs["v"])
+                    within = separation <= err_list[a][i] + err_list[b][j]
+                    first.append(i[within] + offsets[a])
+                    second.append(j[within] + offsets[b])
+                    sep.append(separation[within])
+
+    return np.concatenate(first), np.concatenate(second), np.concatenate(sep)
+
+
+def group_members(n_rows: list, first, second, xyz_list: list):
+    """
+    Form match groups from node pairs and reduce them to at most one row per table.
+
+    Groups are the connected components of the pair graph. As in the STILTS group mode, every output row holds at
+    most one entry per table: if a group contains several rows of the same table, the row closest to the group
+    centre is kept and the others are split off as unmatched rows.
+
+    Args:
+        n_rows (list): Number of rows of each input table.
+        first (np.ndarray): Global node ids of the first pair member.
+        second (np.ndarray): Global node ids of the second pair member.
+        xyz_list (list): Unit vectors of every input table.
+
+    Returns:
+        np.ndarray: Integer array of shape (n_groups, n_tables) holding the row index of each table in each group,
+        or -1 if the table has no entry. Groups are sorted by their lowest node id.
+    """
+
+    n_nodes = int(np.sum(n_rows))
+    xyz = np.concatenate(xyz_list) if n_nodes else np.empty((0, 3))
+
+    graph = coo_matrix((np.ones(len(first), dtype=bool), (first, second)), shape=(n_nodes, n_nodes))
+    n_groups, labels = connected_components(graph, directed=False)
+
+    # rank rows within their group by the distance to the group centre (largest dot product first)
+    centre = np.column_stack([np.bincount(labels, weights=np.nan_to_num(xyz[:, k]), minlength=n_groups)
+                              for k in range(3)])
+    score = -(xyz * centre[labels]).sum(axis=1)
+
+    return split_groups(n_rows, labels, score)
+
+
+def split_groups(n_rows: list, labels, score=None):
+    """
+    Turn group labels of the nodes into a group membership array with at most one row per table and group.
+
+    If a group contains several rows of the same table, the row with the lowest score (the lowest row index if no score
+    is given, or on ties) is kept and the others are split off as groups of their own.
+
+    Args:
+        n_rows (list): Number of rows of each input table.
+        labels (np.ndarray): Non-negative group label of every node.
+        score (np.ndarray, optional): Rank of every node within its group, lower is better.
+
+    Returns:
+        np.ndarray: Group membership array, see `group_members`. Groups are sorted by their lowest node id.
+    """
+
+    offsets = table_offsets(n_rows)
+    n_nodes = int(offsets[-1])
+    n_groups = int(labels.max()) + 1 if n_nodes else 0
+    table_of_node = np.repeat(np.arange(len(n_rows)), n_rows)
+    order = np.lexsort((table_of_node, labels) if score is None else (score, table_of_node, labels))
+
+    # the first row per (group, table) stays, every further one becomes a group of its own
+    sorted_labels, sorted_tables = labels[order], table_of_node[order]
+    kept = np.ones(n_nodes, dtype=bool)
+    kept[1:] = (sorted_labels[1:] != sorted_labels[:-1]) | (sorted_tables[1:] != sorted_tables[:-1])
+    extra = order[~kept]
+    labels = labels.copy()
+    labels[extra] = n_groups + np.arange(len(extra))
+
+    # renumber the groups in order of their lowest node id (= input table order)
+    first_node = np.full(labels.max() + 1 if n_nodes else 0, n_nodes, dtype=np.int64)
+    np.minimum.at(first_node, labels, np.arange(n_nodes))
+    used = np.flatnonzero(first_node < n_nodes)
+    rank = np.empty_like(first_node)
+    rank[used[np.argsort(first_node[used])]] = np.arange(len(used))
+
+    members = np.full((len(used), len(n_rows)), -1, dtype=np.int64)
+    members[rank[labels], table_of_node] = np.arange(n_nodes) - offsets[table_of_node]
+
+    return members
+
+
+def query_index(index: tuple, xyz, match_radius: float, k: int = 4):
+    """
+    Find all indexed rows within the match radius of every query position, in bulk.
+
+    Every position is queried for its `k` nearest neighbours within the radius, which is a single vectorized call.
+    Only positions whose k-th neighbour still lies within the radius can have further neighbours, and only these are
+    searched again, with a dual-tree search for all their neighbours. For a large index and a smaller query table this
+    is considerably faster than a dual-tree search of all query positions, which has to traverse the whole index.
+
+    Args:
+        index (tuple): Index of the searched table, see `build_sky_index`.
+        xyz (np.ndarray): Unit vectors of the query positions.
+        match_radius (float): Match radius in arcseconds.
+        k (int, optional): Number of neighbours of the first query. (Default: 4)
+
+    Returns:
+        tuple: Row of the indexed table and row of the query positions of every pair, and the pair separations in
+        arcseconds.
+    """
+
+    tree, rows = index
+    chord = float(arcsec_to_chord(match_radius))
+    query = np.flatnonzero(np.isfinite(xyz).all(axis=1))
+    if len(query) == 0 or tree.n == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+
+    # the bound is widened marginally, the exact (inclusive) radius cut follows below
+    k = min(k, tree.n)
+    dist, idx = tree.query(xyz[query], k=k, distance_upper_bound=chord * (1 + 1e-9))
+    dist, idx = dist.reshape(len(query), k), idx.reshape(len(query), k)
+    full = np.isfinite(dist[:, -1]) & (k < tree.n)
+
+    hit = np.isfinite(dist) & ~full[:, None]
+    found, other, chords = [idx[hit]], [np.broadcast_to(query[:, None], hit.shape)[hit]], [dist[hit]]
+    if full.any():
+        # positions in dense regions: all their neighbours from a dual-tree search
+        crowded = query[full]
+        pairs = cKDTree(xyz[crowded]).sparse_distance_matrix(tree, chord * (1 + 1e-9), output_type="ndarray")
+        found.append(pairs["j"])
+        other.append(crowded[pairs["i"]])
+        chords.append(pairs["v"])
+
+    found, other, chords = np.concatenate(found), np.concatenate(other), np.concatenate(chords)
+    within = chords <= chord
+    return rows[found[within]].astype(np.int64), other[within].astype(np.int64), chord_to_arcsec(chords[within])
+
+
+def best_matches(ref_rows, other_rows, score):
+    """
+    Select the best match of every reference row among candidate pairs.
+
+    The lowest score per reference row is found with a vectorized scatter-minimum, and ties between pairs with the same
+    score are broken towards the lower row index by a second scatter-minimum over the tied pairs only, which avoids a
+    full sort of the (possibly many) candidate pairs.
+
+    Args:
+        ref_rows (np.ndarray): Row of the reference table of every pair.
+        other_rows (np.ndarray): Row of the other table of every pair.
+        score (np.ndarray): Score of every pair, lower is better.
+
+    Returns:
+        np.ndarray: Indices of the selected pairs, ordered by reference row.
+    """
+
+    ref_rows, other_rows = np.asarray(ref_rows, dtype=np.int64), np.asarray(other_rows, dtype=np.int64)
+    score = np.asarray(score, dtype=np.float64)
+    if len(ref_rows) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    # compact the reference rows, so the scatter arrays only cover rows with candidates
+    unique_refs, ref_ids = np.unique(ref_rows, return_inverse=True)
+    best_score = np.full(len(unique_refs), np.inf)
+    np.minimum.at(best_score, ref_ids, score)
+    candidate = np.flatnonzero(score <= best_score[ref_ids])
+
+    best_other = np.full(len(unique_refs), np.iinfo(np.int64).max)
+    np.minimum.at(best_other, ref_ids[candidate], other_rows[candidate])
+    selected = candidate[other_rows[candidate] == best_other[ref_ids[candidate]]]
+
+    return selected[np.argsort(ref_ids[selected], kind="stable")]
+
+
+def reference_pairs(xyz_list: list, iref: int, match_radius: float = None, err_list: list = None,
+                    indexes: list = None):
+    """
+    Find the best match of every reference row in each other table, for the STILTS pairs mode.
+
+    The index of the reference table is built once, and the positions of every other table are queried against it in
+    bulk (see `query_index`), one table at a time, so that only the best pairs of the tables matched so far are held in
+    memory. The score of a pair is its separation, or for the skyerr matcher (if `err_list` is given) its separation
+    relative to the summed error radii.
+
+    Args:
+        xyz_list (list): Unit vectors of every input table.
+        iref (int): Zero-based index of the reference table.
+        match_radius (float, optional): Match radius in arcseconds (sky matcher).
+        err_list (list, optional): Error radii of every row of every table in arcseconds (skyerr matcher).
+        indexes (list, optional): Pre-built indexes (see `build_sky_index`) of the sky matcher, one per table. Only
+            the one of the reference table is used.
+
+    Returns:
+        tuple: Global node ids of the first and second member of the best pairs, and their separations in arcseconds.
+    """
+
+    offsets = table_offsets([len(xyz) for xyz in xyz_list])
+    if err_list is None:
+        ref_index = indexes[iref] if indexes is not None else build_sky_index(xyz_list[iref])
+    else:
+        ref_index = build_error_index(xyz_list[iref], err_list[iref])
+
+    first, second, sep = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)], [np.empty(0)]
+    for t in range(len(xyz_list)):
+        if t == iref:
+            continue
+
+        if err_list is None:
+            ref, other, separation = query_index(ref_index, xyz_list[t], match_radius)
+            score = separation
+        else:
+            err = [np.asarray(err_list[iref], dtype=np.float64), np.asarray(err_list[t], dtype=np.float64)]
+            ref, other, separation = find_skyerr_pairs([xyz_list[iref], xyz_list[t]], err,
+                                                       [ref_index, build_error_index(xyz_list[t], err[1])])
+            other = other - len(xyz_list[iref])  # node ids of the two-table search start with the reference rows
+            score = separation / np.maximum(err[0][ref] + err[1][other], np.finfo(float).tiny)
+
+        best = best_matches(ref, other, score)
+        ref, other = ref[best] + offsets[iref], other[best] + offsets[t]
+        first.append(np.minimum(ref, other))
+        second.append(np.maximum(ref, other))
+        sep.append(separation[best])
+
+    return np.concatenate(first), np.concatenate(second), np.concatenate(sep)
+
+
+def pair_members(n_rows: list, first, second, score, iref: int, unmatched_tables: list = ()):
+    """
+    Form the output rows of the STILTS pairs mode: every row of the reference table with its best match in each of
+    the other tables.
+
+    The best match is resolved for all reference rows at once (see `best_matches`). A row of another table may be the
+    best match of several reference rows.
+
+    Args:
+        n_rows (list): Number of rows of each input table.
+        first (np.ndarray): Global node ids of the first pair member.
+        second (np.ndarray): Global node ids of the second pair member.
+        score (np.ndarray): Score of every pair, lower is better (e.g. the separation).
+        iref (int): Index of the reference table.
+        unmatched_tables (list, optional): Tables whose rows that are no best match of any reference row are appended
+            as rows of their own (those with join mode "always").
+
+    Returns:
+        np.ndarray: Group membership array (as `group_members`) with one row per reference row, in row order,
+        followed by the unused rows of the `unmatched_tables`.
+    """
+
+    offsets = table_offsets(n_rows)
+    first, second = np.asarray(first, dtype=np.int64), np.asarray(second, dtype=np.int64)
+    table_of_first = np.searchsorted(offsets, first, side="right") - 1
+    table_of_second = np.searchsorted(offsets, second, side="right") - 1
+
+    # orient the pairs from the reference row to the other row, dropping pairs without the reference table
+    swap = table_of_second == iref
+    ref, other = np.where(swap, second, first), np.where(swap, first, second)
+    other_table = np.where(swap, table_of_first, table_of_second)
+    keep = np.where(swap, True, table_of_first == iref)
+    ref, other, other_table = ref[keep] - offsets[iref], other[keep], other_table[keep]
+    score = np.asarray(score)[keep]
+
+    # one reference "row" per (reference row, table) combination, so that every table gets its own best match
+    best = best_matches(ref * len(n_rows) + other_table, other, score)
+    ref, other, other_table = ref[best], other[best], other_table[best]
+
+    members = np.full((n_rows[iref], len(n_rows)), -1, dtype=np.int64)
+    members[:, iref] = np.arange(n_rows[iref])
+    members[ref, other_table] = other - offsets[other_table]
+
+    return append_unmatched_rows(members, n_rows, unmatched_tables, iref)
+
+
+def append_unmatched_rows(members, n_rows: list, tables: list, iref: int = None):
+    """
+    Append the rows of the given tables that do not appear in the membership array, as rows of their own.
+
+    Args:
+        members (np.ndarray): Group membership array.
+        n_rows (list): Number of rows of each input table.
+        tables (list): Indices of the tables whose missing rows are appended.
+        iref (int, optional): Reference table, which is skipped (all its rows are present already).
+
+    Returns:
+        np.ndarray: The membership array with the additional rows.
+    """
+
+    extras = [members]
+    for t in tables:
+        if t == iref:
+            continue
+        used = np.zeros(n_rows[t], dtype=bool)
+        used[members[:, t][members[:, t] >= 0]] = True
+        unused = np.flatnonzero(~used)
+        extra = np.full((len(unused), len(n_rows)), -1, dtype=np.int64)
+        extra[:, t] = unused
+        extras.append(extra)
+
+    return np.concatenate(extras)
+
+
+def select_joined_rows(members, join_modes: list):
+    """
+    Apply the STILTS `joinN` semantics to the match groups.
+
+    By default, only groups with entries from at least two tables are written. Tables with join mode "always"
+    additionally contribute their unmatched rows; "match" requires and "nomatch" forbids an entry from that table.
+
+    Args:
+        members (np.ndarray): Group membership array, as returned by `group_members`.
+        join_modes (list): One of "default", "match", "nomatch" or "always" per input table.
+
+    Returns:
+        np.ndarray: The rows of `members` that appear in the output.
+    """
+
+    present = members >= 0
+    keep = present.sum(axis=1) >= 2
+
+    for t, mode in enumerate(join_modes):
+        if mode == "always":
+            keep |= present[:, t]
+
+    for t, mode in enumerate(join_modes):
+        if mode == "match":
+            keep &= present[:, t]
+        elif mode == "nomatch":
+            keep &= ~present[:, t]
+
+    return members[keep]
+
+
+def output_column_names(column_lists: list, suffix_list: list, fixcols: str):
+    """
+    Rename the input columns for the joined output table, following the STILTS `fixcols` parameter.
+
+    Args:
+        column_lists (list): Column names of every input table.
+        suffix_list (list): Suffix of every input table (without the leading underscore).
+        fixcols (str): One of "none", "dups" or "all".
+
+    Returns:
+        list: Renamed column names of every input table.
+    """
+
+    counts = pd.Series([name for columns in column_lists for name in columns]).value_counts()
+
+    renamed = []
+    for columns, suffix in zip(column_lists, suffix_list):
+        if fixcols == "all":
+            renamed.append([f"{name}_{suffix}" for name in columns])
+        elif fixcols == "dups":
+            renamed.append([f"{name}_{suffix}" if counts[name] > 1 else name for name in columns])
+        else:
+            renamed.append(list(columns))
+
+    return renamed
+
+
+def join_tables(members, tables: list, suffix_list: list, fixcols: str):
+    """
+    Build the joined output table from the selected match groups.
+
+    Args:
+        members (np.ndarray): Selected group membership array, see `select_joined_rows`.
+        tables (list): Input tables as pandas DataFrames indexed by row id. Only the rows referenced in `members` are
+            needed.
+        suffix_list (list): Suffix of every input table (without the leading underscore).
+        fixcols (str): One of "none", "dups" or "all".
+
+    Returns:
+        pd.DataFrame: One row per group, with the columns of all input tables side by side. Tables without an entry
+        in a group are filled with missing values.
+    """
+
+    names = output_column_names([table.columns for table in tables], suffix_list, fixcols)
+
+    parts = []
+    for t, table in enumerate(tables):
+        part = table.reindex(members[:, t])  # -1 is not in the index, so missing entries become NaN rows
+        part.index = pd.RangeIndex(len(members))
+        part.columns = names[t]
+        parts.append(part)
+
+    return pd.concat(parts, axis=1)
@@ -0,0 +1,238 @@
+"""
+Resource planning for STILTS matches.
+
+Before a match is run, the size of every input is estimated from its file size and a quick look at its first rows
+(text formats) or its header (FITS formats). From these estimates the planner chooses the JVM heap, whether STILTS keeps
+the tables in memory or on disk (`-disk`), the `tuning` parameter of the match engine and the `runner`. The plan is
+returned as a `ResourcePlan`, which can be written to JSON so a run can be reproduced with the same settings.
+"""
+import os
+import json
+import math
+from dataclasses import dataclass, field, asdict
+
+from CatMatcher.catalog_io import _fits_layout, _fits_columns
+
+# rough in-memory size of a STILTS table cell (boxed values and column overhead) and of the match bookkeeping per row
+_BYTES_PER_CELL = 16
+_MATCH_BYTES_PER_ROW = 200
+# HEALPix pixel size at level 0, in arcseconds
+_HEALPIX_PIXEL_0 = math.degrees(math.sqrt(4 * math.pi / 12)) * 3600
+
+
+@dataclass
+class TableEstimate:
+    """
+    Estimated size of one input table.
+
+    Attributes:
+        file (str): Path of the file.
+        fmt (str): Format of the file.
+        size_bytes (int): File size in bytes.
+        n_rows (int): Estimated number of rows.
+        n_columns (int): Number of columns (None if unknown).
+        bytes_per_row (float): Bytes per row in the file.
+        method (str): How the estimate was obtained: "sample", "header" or "file size".
+    """
+
+    file: str
+    fmt: str
+    size_bytes: int
+    n_rows: int
+    n_columns: int
+    bytes_per_row: float
+    method: str
+
+
+@dataclass
+class ResourcePlan:
+    """
+    Resource settings chosen for a match.
+
+    Attributes:
+        jvm_heap (str): Maximum JVM heap, e.g. "4G".
+        disk (bool): If True, STILTS stores the tables on disk instead of in memory (`-disk`).
+        tuning (int): Tuning parameter of the match engine (HEALPix level of the sky bins). None keeps the STILTS
+            default.
+        runner (str): STILTS runner.
+        total_rows (int): Estimated number of rows over all inputs.
+        required_memory_mb (float): Estimated memory needed to hold all tables and the match state.
+        available_memory_mb (float): Memory assumed to be available on the machine.
+        tables (list): The `TableEstimate` of every input.
+        reasons (list): Short explanations of the choices.
+    """
+
+    jvm_heap: str
+    disk: bool
+    tuning: int
+    runner: str
+    total_rows: int
+    required_memory_mb: float
+    available_memory_mb: float
+    tables: list = field(default_factory=list)
+    reasons: list = field(default_factory=list)
+
+    def to_json(self, file: str):
+        """
+        Write the plan to a JSON file.
+
+        Args:
+            file (str): Path of the file.
+        """
+
+        with open(file, "w") as f:
+            json.dump(asdict(self), f, indent=2)
+
+
+def available_memory_mb():
+    """
+    Get the memory available for new processes.
+
+    Returns:
+        float: Available memory in megabytes, taken from /proc/meminfo or the physical memory size. None if the
+        operating system does not report it.
+    """
+
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+
+    try:
+        return os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def estimate_table(file: str, fmt: str, sample_rows: int = 1000):
+    """
+    Estimate the number of rows and columns of a catalog without reading it completely.
+
+    Text formats are estimated from the mean line length of the first `sample_rows` rows, FITS tables from their
+    header. Other formats fall back to an assumed 100 bytes per row.
+
+    Args:
+        file (str): Path of the file.
+        fmt (str): Format of the file.
+        sample_rows (int, optional): Number of rows sampled for text formats. (Default: 1000)
+
+    Returns:
+        TableEstimate: Estimated size of the table.
+    """
+
+    size = os.path.getsize(file)
+
+    if fmt in ("csv", "tst", "ecsv"):
+        with open(file, "rb") as f:
+            lines = [f.readline() for _ in range(sample_rows + 1)]
+        lines = [line for line in lines if line]
+        # skip comment/metadata lines and the header
+        data = [line for line in lines if not line.startswith(b"#")][1:]
+        if data:
+            header = next(line for line in lines if not line.startswith(b"#"))
+            separator = b"," if fmt == "csv" else (b"\t" if fmt == "tst" else b" ")
+            bytes_per_row = sum(map(len, data)) / len(data)
+            n_rows = int(round(max(size - sum(map(len, lines)) + sum(map(len, data)), 0) / bytes_per_row))
+            return TableEstimate(file, fmt, size, n_rows, header.count(separator) + 1, bytes_per_row, "sample")
+        return TableEstimate(file, fmt, size, 0, None, 0.0, "sample")
+
+    if fmt in ("fits", "colfits"):
+        try:
+            header, _ = _fits_layout(file)
+            columns = _fits_columns(header, colfits=fmt == "colfits")
+        except (ValueError, KeyError):
+            columns = None  # no readable binary table, estimate from the file size
+        if columns is not None:
+            n_rows, row_bytes = header["NAXIS2"], header["NAXIS1"]
+            if fmt == "colfits":
+                # column-oriented FITS: one row holding every column as an array of length n_rows
+                n_rows = columns[0]["n_rows"] if columns else 0
+                row_bytes = row_bytes / max(n_rows, 1)
+            return TableEstimate(file, fmt, size, n_rows, len(columns) or None, float(row_bytes), "header")
+
+    return TableEstimate(file, fmt, size, int(size / 100), None, 100.0, "file size")
+
+
+def healpix_tuning(match_radius: float):
+    """
+    Choose the HEALPix level of the sky bins, such that a pixel is about twice as large as the match radius.
+
+    Args:
+        match_radius (float): Match radius in arcseconds.
+
+    Returns:
+        int: HEALPix level between 0 and 20.
+    """
+
+    return int(min(max(math.floor(math.log2(_HEALPIX_PIXEL_0 / (2 * float(match_radius)))), 0), 20))
+
+
+def _heap_string(mb: float):
+    """ Round a memory size up to a multiple of 256 MB and format it as JVM heap size."""
+
+    mb = int(math.ceil(mb / 256) * 256)
+    return f"{mb // 1024}G" if mb % 1024 == 0 else f"{mb}M"
+
+
+def plan_resources(files: list, formats: list, match_radius: float, matcher: str = "sky",
+                   memory_mb: float = None, n_cpus: int = None, sample_rows: int = 1000):
+    """
+    Choose heap, table storage, tuning and runner for a STILTS match.
+
+    Args:
+        files (list): Paths of the input files.
+        formats (list): Format of every input file.
+        match_radius (float): Match radius in arcseconds.
+        matcher (str, optional): STILTS match engine. Tuning is only chosen for the sky matchers. (Default: "sky")
+        memory_mb (float, optional): Memory the match may use. Defaults to the memory available on this machine.
+        n_cpus (int, optional): Number of CPUs. Defaults to the number of CPUs of this machine.
+        sample_rows (int, optional): Number of rows sampled per text file. (Default: 1000)
+
+    Returns:
+        ResourcePlan: The chosen settings, with the estimates they are based on.
+    """
+
+    tables = [estimate_table(file, fmt, sample_rows) for file, fmt in zip(files, formats)]
+    memory_mb = memory_mb or available_memory_mb() or 4096
+    n_cpus = n_cpus or os.cpu_count() or 1
+    reasons = []
+
+    total_rows = sum(t.n_rows for t in tables)
+    table_mb = sum(t.n_rows * max(t.bytes_per_row, _BYTES_PER_CELL * (t.n_columns or 1)) for t in tables) / 1024 ** 2
+    match_mb = total_rows * _MATCH_BYTES_PER_ROW / 1024 ** 2
+    required_mb = 1.25 * (table_mb + match_mb) + 256
+
+    # keep the tables in memory if they fit comfortably, otherwise only the match state
+    budget_mb = 0.6 * memory_mb
+    disk = required_mb > budget_mb
+    if disk:
+        heap_mb = min(max(1.25 * match_mb + 256, 512), budget_mb)
+        reasons.append(f"tables need ~{required_mb:.0f} MB, more than 60% of {memory_mb:.0f} MB: stored on disk")
+    else:
+        heap_mb = max(required_mb, 512)
+        reasons.append(f"tables need ~{required_mb:.0f} MB: kept in memory")
+
+    tuning = None
+    if matcher.startswith("sky"):
+        tuning = healpix_tuning(match_radius)
+        reasons.append(f"HEALPix level {tuning} gives sky bins of about twice the match radius")
+
+    if total_rows < 100_000 or n_cpus == 1:
+        runner = "sequential"
+        reasons.append("small input (or a single CPU): sequential runner avoids thread overhead")
+    elif disk:
+        runner = "parallel"
+        reasons.append("disk-backed tables: default parallel runner limits concurrent random reads")
+    elif total_rows >= 10_000_000 and n_cpus >= 8:
+        runner = "parallel-all"
+        reasons.append(f"large in-memory input on {n_cpus} CPUs: parallel runner on all cores")
+    else:
+        runner = "parallel"
+        reasons.append("parallel runner")
+
+    return ResourcePlan(jvm_heap=_heap_string(heap_mb), disk=disk, tuning=tuning, runner=runner,
+                        total_rows=total_rows, required_memory_mb=round(required_mb, 1),
+                        available_memory_mb=round(memory_mb, 1), tables=tables, reasons=reasons)
@@ -0,0 +1,132 @@
+"""
+Declination-zone sharding of the native sky matcher across a process pool.
+
+The sky is cut into declination zones holding roughly equal numbers of rows. Every zone is extended upwards by the
+match radius and matched in its own worker process. A pair is only kept by the zone that contains its lower-declination
+member, so pairs crossing a zone boundary are reported exactly once and the merged pair list (and therefore the
+resulting groups) is identical to the one of an unsharded run.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from CatMatcher.native_matcher import find_sky_pairs, table_offsets
+
+
+def xyz_to_dec(xyz):
+    """
+    Get the declination of unit vectors.
+
+    Args:
+        xyz (np.ndarray): Unit vectors of shape (n, 3).
+
+    Returns:
+        np.ndarray: Declination in degrees.
+    """
+
+    return np.degrees(np.arcsin(np.clip(xyz[:, 2], -1, 1)))
+
+
+def declination_zones(dec_list: list, n_zones: int):
+    """
+    Define declination zone edges that distribute the rows of all tables evenly over the zones.
+
+    Args:
+        dec_list (list): Declinations (in degrees) of every input table.
+        n_zones (int): Requested number of zones. Fewer zones are returned if the declinations do not allow it.
+
+    Returns:
+        np.ndarray: Increasing zone edges, starting at -90 and ending at +90 degrees.
+    """
+
+    dec = np.concatenate(dec_list)
+    dec = dec[np.isfinite(dec)]
+
+    if len(dec) == 0:
+        return np.array([-90.0, 90.0])
+
+    inner = np.quantile(dec, np.linspace(0, 1, n_zones + 1)[1:-1])
+    return np.unique(np.concatenate(([-90.0], inner, [90.0])))
+
+
+def zone_of(dec, edges):
+    """
+    Get the zone index of each declination.
+
+    Args:
+        dec (np.ndarray): Declinations in degrees.
+        edges (np.ndarray): Zone edges, as returned by `declination_zones`.
+
+    Returns:
+        np.ndarray: Zone index of every declination, -1 for missing values.
+    """
+
+    zone = np.clip(np.searchsorted(edges, dec, side="right") - 1, 0, len(edges) - 2)
+    return np.where(np.isfinite(dec), zone, -1)
+
+
+def _match_zone(zone: int, edges, xyz_list: list, row_list: list, match_radius: float):
+    """
+    Worker function: find the pairs owned by one zone.
+
+    Args:
+        zone (int): Index of the zone.
+        edges (np.ndarray): Zone edges in degrees.
+        xyz_list (list): Unit vectors of the rows of every table that fall into the extended zone.
+        row_list (list): Global node ids of these rows.
+        match_radius (float): Match radius in arcseconds.
+
+    Returns:
+        tuple: Global node ids of the first and second pair member, and the pair separations in arcseconds.
+    """
+
+    first, second, sep = find_sky_pairs(xyz_list, match_radius)
+
+    # keep the pairs whose lower-declination member lies in the core of this zone
+    dec = np.concatenate([xyz_to_dec(xyz) for xyz in xyz_list])
+    owned = zone_of(np.minimum(dec[first], dec[second]), edges) == zone
+
+    # map the zone-local node ids back to the global ones
+    local_rows = np.concatenate(row_list)
+    first, second = local_rows[first], local_rows[second]
+
+    return first[owned], second[owned], sep[owned]
+
+
+def find_sky_pairs_sharded(xyz_list: list, match_radius: float, n_shards: int, n_workers: int = None):
+    """
+    Find all pairs of rows from different tables within the match radius, split over declination zones.
+
+    Args:
+        xyz_list (list): Unit vectors of every input table.
+        match_radius (float): Match radius in arcseconds.
+        n_shards (int): Number of declination zones.
+        n_workers (int, optional): Number of worker processes. Defaults to the number of CPUs.
+
+    Returns:
+        tuple: Global node ids of the first and second pair member, and the separation of each pair in arcseconds,
+        sorted by node ids. The pairs are identical to the ones of `find_sky_pairs`.
+    """
+
+    offsets = table_offsets([len(xyz) for xyz in xyz_list])
+    dec_list = [xyz_to_dec(xyz) for xyz in xyz_list]
+    edges = declination_zones(dec_list, n_shards)
+    margin = match_radius / 3600 + 1e-9  # angular separation is never smaller than the declination difference
+
+    jobs = []
+    for zone in range(len(edges) - 1):
+        lo, hi = edges[zone], edges[zone + 1] + margin
+        rows = [np.flatnonzero((dec >= lo) & (dec < hi)) for dec in dec_list]
+        jobs.append((zone, edges, [xyz[r] for xyz, r in zip(xyz_list, rows)],
+                     [r + offsets[t] for t, r in enumerate(rows)], match_radius))
+
+    with ProcessPoolExecutor(max_workers=n_workers or os.cpu_count()) as pool:
+        results = list(pool.map(_match_zone, *zip(*jobs)))
+
+    first = np.concatenate([r[0] for r in results])
+    second = np.concatenate([r[1] for r in results])
+    sep = np.concatenate([r[2] for r in results])
+
+    order = np.lexsort((second, first))
+    return first[order], second[order], sep[order]
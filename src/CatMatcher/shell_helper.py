@@ -71,7 +71,7 @@ def execute_shell_script(destination_path: str, name: str = "stilts_execute.sh",
         return_output (bool, optional): Whether to print stdout, stderr, and return code. Defaults to False.
 
     Returns:
-        None
+        subprocess.CompletedProcess: The finished process, including its return code and captured stdout/stderr.
     """
     spawn_shell_script(destination_path, name, content)
     result = subprocess.run([shell, name], cwd=destination_path, capture_output=True, text=True)
@@ -81,4 +81,4 @@ def execute_shell_script(destination_path: str, name: str = "stilts_execute.sh",
         print('Error:', result.stderr)
         print('Return code:', result.returncode)
 
-
+    return result
@@ -0,0 +1,286 @@
+"""
+Direct execution of STILTS without an intermediate shell script.
+
+The command is built as an argv list from the same parameters `StiltsMatcher.build_N_match` writes to the command
+file, so no shell (and no `~/.zshrc`) is started. Output is streamed line by line while the process runs, the timing
+lines written with `progress=time` or `progress=profile` are collected as per-phase timings, and the peak resident
+memory of the child process is recorded where the operating system reports it.
+"""
+import io
+import os
+import re
+import sys
+import time
+import signal
+import threading
+import subprocess
+from dataclasses import dataclass, field
+
+_TIME_PATTERN = re.compile(r"(\d+(?:\.\d+)?)\s*(ms|msec|s|sec|secs|seconds?)\b", re.IGNORECASE)
+
+
+@dataclass
+class StiltsRunResult:
+    """
+    Outcome of a direct STILTS run.
+
+    Attributes:
+        argv (list): The executed command.
+        returncode (int): Return code of the process (negative if it was killed by a signal).
+        wall_time (float): Wall-clock run time in seconds.
+        peak_rss_mb (Optional[float]): Peak resident memory of the process in megabytes, None if not available.
+        phase_times (list): Tuples of (phase description, seconds) parsed from the progress output, in output order.
+        stdout_lines (list): Lines written to standard output.
+        stderr_lines (list): Lines written to standard error (where STILTS writes its progress).
+        timed_out (bool): True if the process was stopped because the timeout expired.
+        cancelled (bool): True if the process was stopped through the cancel event.
+    """
+
+    argv: list
+    returncode: int
+    wall_time: float
+    peak_rss_mb: float = None
+    phase_times: list = field(default_factory=list)
+    stdout_lines: list = field(default_factory=list)
+    stderr_lines: list = field(default_factory=list)
+    timed_out: bool = False
+    cancelled: bool = False
+
+
+class StiltsRunError(RuntimeError):
+    """
+    Raised if a STILTS match fails.
+
+    Attributes:
+        result (Optional[StiltsRunResult]): Outcome of the failed run, if STILTS was run directly.
+    """
+
+    def __init__(self, message: str, result: StiltsRunResult = None):
+        super().__init__(message)
+        self.result = result
+
+
+def build_argv(task: str, params: dict, stilts: str = "stilts", jvm_options: list = ()):
+    """
+    Build the argv list of a STILTS call.
+
+    Args:
+        task (str): Name of the STILTS task, e.g. "tmatchn".
+        params (dict): Task parameters. Values are passed verbatim, no shell quoting is needed.
+        stilts (str, optional): STILTS executable. (Default: "stilts")
+        jvm_options (list, optional): Options placed before the task name, e.g. ["-Xmx4G"].
+
+    Returns:
+        list: The argv list.
+    """
+
+    return [stilts, *jvm_options, task] + [f"{key}={value}" for key, value in params.items()]
+
+
+def parse_progress_line(line: str):
+    """
+    Extract a phase timing from a line of STILTS progress output.
+
+    Lines are expected to end with a duration, such as "Binning rows for table 1......... (1.23s)" or
+    "Elapsed time: 120ms". Profile output that adds memory figures after the duration is supported as well.
+
+    Args:
+        line (str): One line of output.
+
+    Returns:
+        tuple: (phase description, seconds), or None if the line holds no duration.
+    """
+
+    match = _TIME_PATTERN.search(line)
+    if not match:
+        return None
+
+    phase = line[:match.start()].rstrip(" .:(=\t")
+    if not phase:
+        return None
+
+    seconds = float(match.group(1))
+    if match.group(2).lower().startswith("ms"):
+        seconds /= 1000
+
+    return phase.strip(), seconds
+
+
+def _stream(pipe, lines: list, all_lines: list, on_line):
+    """
+    Reader thread: collect the lines of one output stream and forward them to the callback.
+    """
+
+    for line in iter(pipe.readline, ""):
+        line = line.rstrip("\n")
+        lines.append(line)
+        all_lines.append(line)
+        if on_line is not None:
+            on_line(line)
+    pipe.close()
+
+
+def _signal(process: subprocess.Popen, sig):
+    """
+    Send a signal to a process and its process group, if it still exists.
+    """
+
+    try:
+        if os.name == "posix":
+            os.killpg(process.pid, sig)
+        else:
+            process.send_signal(sig)
+    except ProcessLookupError:
+        pass
+
+
+def _stop(process: subprocess.Popen):
+    """
+    Terminate a process and its process group, and kill it if it does not exit within a few seconds.
+    """
+
+    _signal(process, signal.SIGTERM)
+    try:
+        process.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        _signal(process, signal.SIGKILL if os.name == "posix" else signal.SIGTERM)
+        process.wait()
+
+
+def run_stilts(argv: list, cwd: str = None, timeout: float = None, cancel_event: threading.Event = None,
+               on_line=None, poll_interval: float = 0.05):
+    """
+    Run STILTS directly (without a shell) and stream its output.
+
+    Args:
+        argv (list): Command to execute, see `build_argv`.
+        cwd (str, optional): Working directory of the process.
+        timeout (float, optional): Seconds after which the process is stopped. None waits indefinitely.
+        cancel_event (threading.Event, optional): Event that stops the process when set (e.g. from another thread).
+        on_line (callable, optional): Called with every output line (stdout and stderr) as soon as it is written.
+        poll_interval (float, optional): Seconds between checks for completion, timeout and cancellation.
+
+    Returns:
+        StiltsRunResult: Return code, timings, peak memory and the collected output of the run.
+    """
+
+    start = time.perf_counter()
+    # run in an own process group, so that a stop also reaches the JVM started by the `stilts` launcher script
+    process = subprocess.Popen(argv, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, bufsize=1,
+                               start_new_session=(os.name == "posix"))
+
+    result = StiltsRunResult(argv=list(argv), returncode=0, wall_time=0.0)
+    all_lines = []
+    readers = [threading.Thread(target=_stream, args=(pipe, lines, all_lines, on_line), daemon=True)
+               for pipe, lines in ((process.stdout, result.stdout_lines), (process.stderr, result.stderr_lines))]
+    for reader in readers:
+        reader.start()
+
+    rusage = None
+    while True:
+        if hasattr(os, "wait4"):
+            pid, status, rusage = os.wait4(process.pid, os.WNOHANG)
+            if pid != 0:
+                process.returncode = os.waitstatus_to_exitcode(status)
+                break
+        elif process.poll() is not None:
+            break
+
+        if timeout is not None and time.perf_counter() - start > timeout:
+            result.timed_out = True
+        if cancel_event is not None and cancel_event.is_set():
+            result.cancelled = True
+        if result.timed_out or result.cancelled:
+            _stop(process)
+            break
+
+        time.sleep(poll_interval)
+
+    for reader in readers:
+        reader.join()
+
+    result.returncode = process.returncode
+    result.wall_time = time.perf_counter() - start
+    if rusage is not None and process.returncode is not None and not (result.timed_out or result.cancelled):
+        # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+        result.peak_rss_mb = rusage.ru_maxrss / (1024 ** 2 if sys.platform == "darwin" else 1024)
+
+    result.phase_times = [timing for timing in map(parse_progress_line, all_lines) if timing is not None]
+    return result
+
+
+def stream_stilts(argv: list, decode, cwd: str = None, timeout: float = None, on_line=None):
+    """
+    Run STILTS directly and decode its binary standard output while it is written (e.g. for `out=- ofmt=fits`).
+
+    Args:
+        argv (list): Command to execute, see `build_argv`.
+        decode (callable): Called with the binary standard output stream of the process, returns the decoded result.
+        cwd (str, optional): Working directory of the process.
+        timeout (float, optional): Seconds after which the process is stopped. None waits indefinitely.
+        on_line (callable, optional): Called with every line written to standard error.
+
+    Returns:
+        tuple: The decoded result (None if decoding failed) and the `StiltsRunResult` of the run.
+    """
+
+    start = time.perf_counter()
+    process = subprocess.Popen(argv, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               start_new_session=(os.name == "posix"))
+
+    result = StiltsRunResult(argv=list(argv), returncode=0, wall_time=0.0)
+    all_lines = []
+    stderr = io.TextIOWrapper(process.stderr, errors="replace")
+    reader = threading.Thread(target=_stream, args=(stderr, result.stderr_lines, all_lines, on_line), daemon=True)
+    reader.start()
+
+    # the timer only signals the process, reaping it is left to this thread (a second waiter would find no child)
+    exited, lock, timer = threading.Event(), threading.Lock(), None
+    if timeout is not None:
+        def expire():
+            with lock:
+                if exited.is_set():
+                    return
+                result.timed_out = True
+                _signal(process, signal.SIGTERM)
+            if not exited.wait(5):
+                with lock:
+                    if not exited.is_set():
+                        _signal(process, signal.SIGKILL if os.name == "posix" else signal.SIGTERM)
+        timer = threading.Timer(timeout, expire)
+        timer.start()
+
+    decoded = None
+    try:
+        decoded = decode(process.stdout)
+    except ValueError as e:
+        # a failing STILTS run leaves an empty or truncated stream; its return code and stderr tell why
+        result.stderr_lines.append(f"Decoding of the output failed: {e}")
+    finally:
+        process.stdout.read()  # drain, so that the process never blocks on a full pipe
+        process.stdout.close()
+
+    if hasattr(os, "waitid"):
+        # wait for the exit without reaping, so that the timer never signals a reused process id
+        os.waitid(os.P_PID, process.pid, os.WEXITED | os.WNOWAIT)
+    with lock:
+        exited.set()
+
+    rusage = None
+    if hasattr(os, "wait4"):
+        _, status, rusage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+    else:
+        process.wait()
+    if timer is not None:
+        timer.cancel()
+        timer.join()
+    reader.join()
+
+    result.returncode = process.returncode
+    result.wall_time = time.perf_counter() - start
+    if rusage is not None and not result.timed_out:
+        result.peak_rss_mb = rusage.ru_maxrss / (1024 ** 2 if sys.platform == "darwin" else 1024)
+    result.phase_times = [timing for timing in map(parse_progress_line, all_lines) if timing is not None]
+
+    return (decoded if result.returncode == 0 else None), result
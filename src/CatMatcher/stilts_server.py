@@ -0,0 +1,201 @@
+"""
+Long-lived STILTS process that accepts match jobs over HTTP.
+
+STILTS can run as an HTTP server (`stilts server`), which executes tasks like `tmatchn` inside one warm JVM. Posting a
+job to `http://<host>:<port>/<basepath>/task/<task>` then costs neither JVM startup nor class loading, which dominate
+the run time of small matches.
+"""
+import time
+import subprocess
+import urllib.error
+import urllib.parse
+import urllib.request
+
+
+class StiltsServer:
+    """
+    Manages a STILTS server process and submits tasks to it.
+
+    The process is started lazily on the first submission, checked with a cheap `calc` task, and restarted (followed
+    by one retry of the job) if it died or stopped answering.
+
+    Args:
+        port (int, optional): Port of the server. (Default: 2112, the STILTS default)
+        host (str, optional): Host name of the server. (Default: "localhost")
+        basepath (str, optional): Base path of the STILTS services. (Default: "/stilts")
+        jvm_heap (str, optional): Maximum JVM heap of the server process, e.g. "4G".
+        command (list, optional): Full argv to start the server with. Defaults to the `stilts server` call built from
+            the other arguments; mainly useful to run a stand-in process.
+        manage_process (bool, optional): If False, an already running server at host/port is used and never started
+            or stopped. (Default: True)
+        startup_timeout (float, optional): Seconds to wait for a starting server to become healthy. (Default: 60)
+        request_timeout (float, optional): Seconds to wait for a task result, None waits indefinitely.
+
+    Example:
+        >>> with StiltsServer(jvm_heap="4G") as server:
+        ...     for matcher in matchers:
+        ...         matcher.perform_Nmatch(server=server)
+    """
+
+    def __init__(self, port: int = 2112, host: str = "localhost", basepath: str = "/stilts", jvm_heap: str = None,
+                 command: list = None, manage_process: bool = True, startup_timeout: float = 60,
+                 request_timeout: float = None):
+        self.port = port
+        self.host = host
+        self.basepath = "/" + basepath.strip("/")
+        self.manage_process = manage_process
+        self.startup_timeout = startup_timeout
+        self.request_timeout = request_timeout
+
+        if command is None:
+            command = ["stilts"] + ([f"-Xmx{jvm_heap}"] if jvm_heap else []) + \
+                      ["server", f"port={port}", f"basepath={self.basepath}"]
+        self.command = command
+        self._process = None
+
+    @property
+    def url(self):
+        """ Base URL of the STILTS services."""
+        return f"http://{self.host}:{self.port}{self.basepath}"
+
+    def start(self):
+        """
+        Start the server process (if managed and not running yet) and wait until it is healthy.
+
+        Raises:
+            RuntimeError: If the server does not become healthy within `startup_timeout`.
+        """
+
+        if self.manage_process and (self._process is None or self._process.poll() is not None):
+            self._process = subprocess.Popen(self.command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        deadline = time.monotonic() + self.startup_timeout
+        while not self.health_check():
+            if self._process is not None and self._process.poll() is not None:
+                raise RuntimeError(f"STILTS server exited during startup with return code {self._process.returncode}.")
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"STILTS server at {self.url} did not become healthy within "
+                                   f"{self.startup_timeout} s.")
+            time.sleep(0.1)
+
+    def stop(self):
+        """ Terminate the managed server process."""
+
+        if self._process is not None and self._process.poll() is None:
+            self._process.terminate()
+            try:
+                self._process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+        self._process = None
+
+    def restart(self):
+        """ Stop and start the server process."""
+
+        self.stop()
+        self.start()
+
+    def health_check(self, timeout: float = 2):
+        """
+        Check whether the server answers tasks, using a trivial `calc` task.
+
+        Args:
+            timeout (float, optional): Seconds to wait for the answer. (Default: 2)
+
+        Returns:
+            bool: True if the server is healthy.
+        """
+
+        try:
+            return self._post("calc", {"expression": "1+1"}, timeout=timeout).strip() == "2"
+        except (OSError, RuntimeError):
+            return False
+
+    def submit(self, task: str, params: dict):
+        """
+        Run a STILTS task on the server.
+
+        Args:
+            task (str): Name of the STILTS task, e.g. "tmatchn".
+            params (dict): Task parameters, as they would be given on the command line.
+
+        Returns:
+            str: Text output of the task.
+
+        Raises:
+            RuntimeError: If the task fails, or the server can not be (re)started.
+        """
+
+        if self._process is None and self.manage_process:
+            self.start()
+
+        try:
+            return self._post(task, params, timeout=self.request_timeout)
+        except (urllib.error.URLError, ConnectionError):
+            # the connection broke: make sure the server is alive and try once more
+            if self.health_check() or not self.manage_process:
+                raise
+            self.restart()
+            return self._post(task, params, timeout=self.request_timeout)
+
+    def stream(self, task: str, params: dict, decode):
+        """
+        Run a STILTS task on the server and decode its output while it is received (e.g. for `out=- ofmt=fits`).
+
+        Args:
+            task (str): Name of the STILTS task.
+            params (dict): Task parameters.
+            decode (callable): Called with the binary response stream, returns the decoded result.
+
+        Returns:
+            The decoded result.
+
+        Raises:
+            RuntimeError: If the task fails, or the server can not be started.
+        """
+
+        if self._process is None and self.manage_process:
+            self.start()
+
+        try:
+            with self._open(task, params, timeout=self.request_timeout) as response:
+                return decode(response)
+        except urllib.error.HTTPError as e:
+            raise RuntimeError(f"STILTS task '{task}' failed with status {e.code}: {e.read().decode()}") from e
+
+    def _open(self, task: str, params: dict, timeout: float = None):
+        """ Post one task request to the server and return the open response."""
+
+        data = urllib.parse.urlencode({key: str(value) for key, value in params.items()}).encode()
+        request = urllib.request.Request(f"{self.url}/task/{task}", data=data, method="POST")
+        return urllib.request.urlopen(request, timeout=timeout)
+
+    def _post(self, task: str, params: dict, timeout: float = None):
+        """
+        Post one task request to the server.
+
+        Args:
+            task (str): Name of the STILTS task.
+            params (dict): Task parameters.
+            timeout (float, optional): Seconds to wait for the answer.
+
+        Returns:
+            str: Text output of the task.
+
+        Raises:
+            RuntimeError: If the server answers with an error status.
+        """
+
+        try:
+            with self._open(task, params, timeout=timeout) as response:
+                return response.read().decode()
+        except urllib.error.HTTPError as e:
+            raise RuntimeError(f"STILTS task '{task}' failed with status {e.code}: {e.read().decode()}") from e
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.manage_process:
+            self.stop()
@@ -0,0 +1,132 @@
+"""
+Seeded synthetic catalogs for tests and benchmarks.
+
+The generated catalogs mimic a star-forming region like Orion: a population of sources concentrated in a few clusters
+on top of a uniform field population. Every catalog observes a common subset of the sources (the overlap) plus sources
+only it contains, and adds its own positional scatter, so the true matches are known.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from CatMatcher.catalog_io import write_table
+
+
+def clustered_positions(rng: np.random.Generator, n: int, center: tuple, field_radius: float, n_clusters: int = 5,
+                        cluster_fraction: float = 0.7):
+    """
+    Draw source positions from a mixture of Gaussian clusters and a uniform field population.
+
+    Args:
+        rng (np.random.Generator): Random number generator.
+        n (int): Number of positions.
+        center (tuple): (RA, Dec) of the field center in degrees.
+        field_radius (float): Radius of the field in degrees.
+        n_clusters (int, optional): Number of clusters. (Default: 5)
+        cluster_fraction (float, optional): Fraction of the sources that belong to a cluster. (Default: 0.7)
+
+    Returns:
+        tuple: Arrays of RA and Dec in degrees.
+    """
+
+    def uniform_disc(size):
+        r = field_radius * np.sqrt(rng.random(size))
+        phi = rng.random(size) * 2 * np.pi
+        return r * np.cos(phi), r * np.sin(phi)
+
+    # offsets on the tangent plane, in degrees
+    x, y = uniform_disc(n)
+    in_cluster = rng.random(n) < cluster_fraction
+    if n_clusters > 0 and in_cluster.any():
+        cx, cy = uniform_disc(n_clusters)
+        sizes = field_radius * rng.uniform(0.02, 0.1, n_clusters)
+        which = rng.integers(0, n_clusters, in_cluster.sum())
+        x[in_cluster] = cx[which] + rng.normal(0, sizes[which])
+        y[in_cluster] = cy[which] + rng.normal(0, sizes[which])
+
+    dec = np.clip(center[1] + y, -90, 90)
+    ra = (center[0] + x / np.maximum(np.cos(np.radians(dec)), 1e-6)) % 360
+    return ra, dec
+
+
+def generate_catalogs(n_rows: int, n_tables: int, overlap: float = 0.5, scatter: float = 0.2,
+                      density: float = 5000, center: tuple = (85.4, -1.9), n_clusters: int = 5,
+                      cluster_fraction: float = 0.7, seed: int = 0):
+    """
+    Generate clustered synthetic catalogs with known true matches.
+
+    Args:
+        n_rows (int): Number of rows of every catalog.
+        n_tables (int): Number of catalogs.
+        overlap (float, optional): Fraction of the rows of every catalog that belong to sources observed by all
+            catalogs. The remaining rows are sources only this catalog contains. (Default: 0.5)
+        scatter (float, optional): Standard deviation of the positional scatter per coordinate, in arcseconds.
+            (Default: 0.2)
+        density (float, optional): Mean number of sources per square degree, which sets the size of the field.
+            (Default: 5000)
+        center (tuple, optional): (RA, Dec) of the field center in degrees. (Default: NGC 2024 in Orion B)
+        n_clusters (int, optional): Number of clusters. (Default: 5)
+        cluster_fraction (float, optional): Fraction of the sources that belong to a cluster. (Default: 0.7)
+        seed (int, optional): Seed of the random number generator. (Default: 0)
+
+    Returns:
+        list: One DataFrame per catalog, with the columns "ID" (row id), "source_id" (id of the true source), "RA",
+        "DE" (degrees) and "mag".
+
+    Raises:
+        ValueError: If `overlap` is not between 0 and 1.
+    """
+
+    if not 0 <= overlap <= 1:
+        raise ValueError(f"overlap must be between 0 and 1, got {overlap}.")
+
+    rng = np.random.default_rng(seed)
+    n_shared = int(round(overlap * n_rows))
+    n_own = n_rows - n_shared
+    n_sources = n_shared + n_tables * n_own
+
+    field_radius = np.sqrt(n_sources / (np.pi * density))
+    ra, dec = clustered_positions(rng, n_sources, center, field_radius, n_clusters, cluster_fraction)
+    mag = rng.normal(14, 2, n_sources)
+
+    catalogs = []
+    for t in range(n_tables):
+        source_id = np.concatenate([np.arange(n_shared), n_shared + t * n_own + np.arange(n_own)])
+        rng.shuffle(source_id)
+
+        cos_dec = np.maximum(np.cos(np.radians(dec[source_id])), 1e-6)
+        catalogs.append(pd.DataFrame({
+            "ID": np.arange(n_rows),
+            "source_id": source_id,
+            "RA": (ra[source_id] + rng.normal(0, scatter / 3600, n_rows) / cos_dec) % 360,
+            "DE": np.clip(dec[source_id] + rng.normal(0, scatter / 3600, n_rows), -90, 90),
+            "mag": mag[source_id] + rng.normal(0, 0.05, n_rows),
+        }))
+
+    return catalogs
+
+
+def write_catalogs(catalogs: list, path: str, prefix: str = "synthetic", fmt: str = "csv"):
+    """
+    Write synthetic catalogs to files named `<prefix>_<index>.<fmt>`.
+
+    Args:
+        catalogs (list): Catalogs, see `generate_catalogs`.
+        path (str): Directory of the files. It is created if necessary.
+        prefix (str, optional): Start of the file names. (Default: "synthetic")
+        fmt (str, optional): Output format. (Default: "csv")
+
+    Returns:
+        list: The file names (relative to `path`).
+    """
+
+    os.makedirs(path, exist_ok=True)
+
+    file_list = []
+    for idx, catalog in enumerate(catalogs, start=1):
+        file_name = f"{prefix}_{idx}.{fmt}"
+        write_table(catalog, os.path.join(path, file_name), fmt)
+        file_list.append(file_name)
+
+    return file_list
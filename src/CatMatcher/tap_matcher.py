@@ -0,0 +1,386 @@
+"""
+Crossmatch of a local table with a remote catalog through a TAP service (e.g. Gaia DR3).
+
+Uploading a large table in one request is slow and fragile: a single failure loses the whole match, and the service
+has to join the complete upload at once. The local table is therefore split into sky-coherent chunks (declination zones
+ordered by right ascension), which keep the region the service has to search for every upload compact. Only the row
+id and the position of every row are uploaded. The chunks are sent concurrently from a thread pool, every thread reusing
+its own persistent HTTP connection. Failed chunks are retried with exponential back-off, and the results are written to
+the output file in chunk order while the remaining chunks are still running.
+
+The remote columns are joined to the local table in the layout of the `StiltsMatcher` output: the columns of both
+tables side by side (renamed according to `fixcols` and the suffixes), followed by the separation in arcseconds.
+"""
+import io
+import math
+import time
+import uuid
+import threading
+import http.client
+import urllib.parse
+from dataclasses import dataclass
+from typing import Literal, Optional
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from CatMatcher.match_configurator import MatchConfigurator
+from CatMatcher.catalog_io import read_table, write_table
+from CatMatcher.native_matcher import output_column_names
+from CatMatcher.sharding import declination_zones
+
+
+class TapError(RuntimeError):
+    """ Raised if a TAP request fails for good (after all retries, or with a status that is not worth retrying)."""
+
+
+def sky_chunks(ra, dec, chunk_size: int):
+    """
+    Split positions into chunks of neighbouring sources.
+
+    The rows are sorted into declination zones of about equal size, and by right ascension within every zone, and the
+    sorted rows are cut into chunks of `chunk_size`. The number of zones is chosen such that the chunks are roughly as
+    tall as they are wide.
+
+    Args:
+        ra (np.ndarray): Right ascension in degrees.
+        dec (np.ndarray): Declination in degrees.
+        chunk_size (int): Maximum number of rows per chunk.
+
+    Returns:
+        list: Arrays with the row indices of every chunk. Rows with missing positions are left out.
+
+    Raises:
+        ValueError: If `chunk_size` is not positive.
+    """
+
+    if chunk_size < 1:
+        raise ValueError(f"chunk_size must be positive, got {chunk_size}.")
+
+    ra, dec = np.asarray(ra, dtype=np.float64), np.asarray(dec, dtype=np.float64)
+    valid = np.flatnonzero(np.isfinite(ra) & np.isfinite(dec))
+    if len(valid) == 0:
+        return []
+
+    n_zones = max(1, int(math.sqrt(math.ceil(len(valid) / chunk_size))))
+    edges = declination_zones([dec[valid]], n_zones)
+    zone = np.clip(np.searchsorted(edges, dec[valid], side="right") - 1, 0, len(edges) - 2)
+
+    order = valid[np.lexsort((ra[valid], zone))]
+    return [order[start:start + chunk_size] for start in range(0, len(order), chunk_size)]
+
+
+def upload_votable(row_ids, ra, dec):
+    """
+    Encode the positions of a chunk as VOTable, the upload format required by TAP.
+
+    Args:
+        row_ids (np.ndarray): Row ids of the local table.
+        ra (np.ndarray): Right ascension in degrees.
+        dec (np.ndarray): Declination in degrees.
+
+    Returns:
+        bytes: The VOTable document.
+    """
+
+    rows = "".join(f"<TR><TD>{i}</TD><TD>{r!r}</TD><TD>{d!r}</TD></TR>"
+                   for i, r, d in zip(np.asarray(row_ids).tolist(), np.asarray(ra, dtype=np.float64).tolist(),
+                                      np.asarray(dec, dtype=np.float64).tolist()))
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<VOTABLE version="1.4" xmlns="http://www.ivoa.net/xml/VOTable/v1.3"><RESOURCE><TABLE name="chunk">'
+            '<FIELD name="row_id" datatype="long"/>'
+            '<FIELD name="ra" datatype="double" unit="deg" ucd="pos.eq.ra;meta.main"/>'
+            '<FIELD name="dec" datatype="double" unit="deg" ucd="pos.eq.dec;meta.main"/>'
+            f'<DATA><TABLEDATA>{rows}</TABLEDATA></DATA></TABLE></RESOURCE></VOTABLE>').encode()
+
+
+def crossmatch_query(remote_table: str, remote_values: list, match_radius: float, remote_columns: list = None):
+    """
+    Build the ADQL query that joins an uploaded chunk (`TAP_UPLOAD.chunk`) with the remote table.
+
+    Args:
+        remote_table (str): Name of the remote table, e.g. "gaiadr3.gaia_source".
+        remote_values (list): Names of the remote RA and Dec columns (degrees).
+        match_radius (float): Match radius in arcseconds.
+        remote_columns (list, optional): Remote columns to return. All columns if None.
+
+    Returns:
+        str: The ADQL query.
+    """
+
+    ra, dec = remote_values[:2]
+    columns = "r.*" if not remote_columns else ", ".join(f"r.{column}" for column in remote_columns)
+    return (f"SELECT u.row_id, {columns}, "
+            f"DISTANCE(POINT('ICRS', u.ra, u.dec), POINT('ICRS', r.{ra}, r.{dec})) * 3600 AS tap_separation "
+            f"FROM TAP_UPLOAD.chunk AS u JOIN {remote_table} AS r "
+            f"ON 1 = CONTAINS(POINT('ICRS', r.{ra}, r.{dec}), CIRCLE('ICRS', u.ra, u.dec, {match_radius / 3600!r}))")
+
+
+class TapClient:
+    """
+    Minimal client for synchronous TAP queries with table uploads.
+
+    Every thread keeps one persistent (keep-alive) connection to the service, so that concurrent chunks do not pay
+    for a new connection (and TLS handshake) per request.
+
+    Args:
+        url (str): Base URL of the TAP service, e.g. "https://gea.esac.esa.int/tap-server/tap".
+        timeout (float, optional): Seconds to wait for a response. (Default: 300)
+        retries (int, optional): Number of retries of a failed request. (Default: 3)
+        backoff (float, optional): Seconds to wait before the first retry, doubled for every further one. (Default: 1)
+    """
+
+    _RETRY_STATUS = {429, 500, 502, 503, 504}
+
+    def __init__(self, url: str, timeout: float = 300, retries: int = 3, backoff: float = 1.0):
+        parsed = urllib.parse.urlsplit(url)
+        if parsed.scheme not in ("http", "https"):
+            raise ValueError(f"TAP service URL must start with http:// or https://, got '{url}'.")
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self._local = threading.local()
+
+    def _connection(self, url: str):
+        """ Get the persistent connection of this thread to the host of `url`."""
+
+        parsed = urllib.parse.urlsplit(url)
+        key = (parsed.scheme, parsed.netloc)
+        connections = self._local.__dict__.setdefault("connections", {})
+        if key not in connections:
+            cls = http.client.HTTPSConnection if parsed.scheme == "https" else http.client.HTTPConnection
+            connections[key] = cls(parsed.netloc, timeout=self.timeout)
+        return connections[key]
+
+    def _drop_connection(self, url: str):
+        """ Close and forget the connection of this thread to the host of `url` (after an error)."""
+
+        parsed = urllib.parse.urlsplit(url)
+        connection = self._local.__dict__.get("connections", {}).pop((parsed.scheme, parsed.netloc), None)
+        if connection is not None:
+            connection.close()
+
+    def _request(self, method: str, url: str, body: bytes = None, headers: dict = None):
+        """ Send one request on the pooled connection and return (status, body), following redirects."""
+
+        for _ in range(5):
+            parsed = urllib.parse.urlsplit(url)
+            path = parsed.path + (f"?{parsed.query}" if parsed.query else "")
+            connection = self._connection(url)
+            try:
+                connection.request(method, path, body=body, headers=headers or {})
+                response = connection.getresponse()
+                data = response.read()
+            except (OSError, http.client.HTTPException):
+                self._drop_connection(url)
+                raise
+            if response.status in (301, 302, 303, 307) and response.getheader("Location"):
+                # the result of an asynchronous-style sync endpoint is fetched from the redirect target
+                url = urllib.parse.urljoin(url, response.getheader("Location"))
+                if response.status == 303:
+                    method, body, headers = "GET", None, None
+                continue
+            return response.status, data
+        raise TapError(f"Too many redirects for {url}")
+
+    def query(self, adql: str, uploads: dict = None, fmt: str = "csv"):
+        """
+        Run a synchronous ADQL query, with retries.
+
+        Args:
+            adql (str): The query.
+            uploads (dict, optional): Tables to upload, as {name: VOTable bytes}. They are referenced as
+                `TAP_UPLOAD.<name>` in the query.
+            fmt (str, optional): Result format requested from the service. (Default: "csv")
+
+        Returns:
+            bytes: The query result.
+
+        Raises:
+            TapError: If the query fails after all retries, or with a status that is not worth retrying.
+        """
+
+        fields = {"REQUEST": "doQuery", "LANG": "ADQL", "FORMAT": fmt, "QUERY": adql}
+        if uploads:
+            fields["UPLOAD"] = ";".join(f"{name},param:{name}" for name in uploads)
+        body, content_type = _multipart(fields, uploads or {})
+
+        for attempt in range(self.retries + 1):
+            try:
+                status, data = self._request("POST", f"{self.url}/sync", body, {"Content-Type": content_type})
+                if status == 200:
+                    return data
+                error = TapError(f"TAP query failed with status {status}: {data[:500].decode(errors='replace')}")
+                if status not in self._RETRY_STATUS:
+                    raise error
+            except (OSError, http.client.HTTPException) as e:
+                error = TapError(f"TAP request failed: {e}")
+            if attempt < self.retries:
+                time.sleep(self.backoff * 2 ** attempt)
+        raise error
+
+
+def _multipart(fields: dict, files: dict):
+    """ Encode form fields and files as multipart/form-data."""
+
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, data in files.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{name}.xml"\r\n'
+                     f'Content-Type: application/x-votable+xml\r\n\r\n'.encode() + data + b"\r\n")
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+@dataclass
+class TapMatcher(MatchConfigurator):
+    """
+    Crossmatch of a local table with a remote catalog through a TAP service, the `TAPmatch` of the README.
+
+    The local table is the only entry of `file_list`; `match_values`, `transforms`, `suffix_list`, `fixcols`, `ofmt`,
+    `timeout`, `n_workers` and the working directory are used as for `StiltsMatcher`. The output is written to
+    `output_file_name` inside the `matches/` directory.
+
+    Attributes:
+        tap_url (str): Base URL of the TAP service, e.g. "https://gea.esac.esa.int/tap-server/tap".
+        remote_table (str, optional): Remote table to match. (Default: "gaiadr3.gaia_source")
+        remote_values (str, optional): Remote RA and Dec columns in degrees. (Default: "ra dec")
+        remote_columns (Optional[list], optional): Remote columns to return. All columns if None.
+        remote_suffix (str, optional): Suffix of the remote columns in the output. (Default: "remote")
+        find (Literal, ["best", "all"]): "best" keeps the closest remote source of every local row, "all" every remote
+            source within the match radius. (Default: "best")
+        tap_chunk_size (int, optional): Number of local rows uploaded per request. (Default: 5000)
+        retries (int, optional): Number of retries of a failed chunk. (Default: 3)
+        backoff (float, optional): Seconds before the first retry, doubled for every further one. (Default: 1)
+    """
+
+    tap_url: Optional[str] = None
+    remote_table: str = "gaiadr3.gaia_source"
+    remote_values: str = "ra dec"
+    remote_columns: Optional[list] = None
+    remote_suffix: str = "remote"
+    find: Literal["best", "all"] = "best"
+    tap_chunk_size: int = 5000
+    retries: int = 3
+    backoff: float = 1.0
+
+    def __post_init__(self):
+        if isinstance(self.file_list, str):
+            self.file_list = [self.file_list]
+        super().__post_init__()
+
+        if not self.tap_url:
+            raise ValueError("tap_url is required for a TAP crossmatch.")
+        if self.n_in != 1:
+            raise ValueError(f"A TAP crossmatch takes exactly one local table, got {self.n_in}.")
+        if self.find not in ("best", "all"):
+            raise ValueError(f"find must be 'best' or 'all', got '{self.find}'.")
+        if self.join_mode not in ("match", "always", "default"):
+            raise ValueError(f"A TAP crossmatch supports join_mode 'match', 'default' or 'always', "
+                             f"got '{self.join_mode}'.")
+
+    def perform_TAPmatch(self, return_table: str = None, write_output: bool = True, return_output: bool = True):
+        """
+        Matches the local table with the remote table, chunk by chunk.
+
+        Args:
+            return_table (str, optional): If "pandas", the joined table is also returned as DataFrame.
+            write_output (bool): If True, writes the joined table to the `matches/` directory. CSV output is written
+                while the chunks are running, in chunk order.
+            return_output (bool): If True, prints the progress of the chunks.
+
+        Returns:
+            pd.DataFrame: The joined table, if `return_table="pandas"`.
+
+        Raises:
+            TapError: If a chunk fails after all retries.
+            ValueError: If `return_table` is not supported.
+        """
+
+        if return_table not in (None, "pandas"):
+            raise ValueError(f"return_table must be None or 'pandas', got '{return_table}'.")
+
+        fmt = self._table_formats()[0]
+        local = read_table(f"{self.normalized_path}/{self.file_list[0]}", fmt)
+        ra_column, dec_column = self._table_match_values()[0][:2]
+        if self._table_transforms()[0] is not None:
+            local = self._table_transforms()[0].apply_table(local, [ra_column, dec_column])
+        chunks = sky_chunks(local[ra_column].to_numpy(np.float64), local[dec_column].to_numpy(np.float64),
+                            self.tap_chunk_size)
+
+        client = TapClient(self.tap_url, timeout=self.timeout or 300, retries=self.retries, backoff=self.backoff)
+        query = crossmatch_query(self.remote_table, self.remote_values.split(), self.match_radius, self.remote_columns)
+
+        def run_chunk(rows):
+            upload = upload_votable(rows, local[ra_column].to_numpy()[rows], local[dec_column].to_numpy()[rows])
+            return pd.read_csv(io.BytesIO(client.query(query, {"chunk": upload})))
+
+        output = self._match_path + self.output_file_name
+        stream_csv = write_output and self.ofmt == "csv"
+        keep_parts = return_table is not None or (write_output and not stream_csv)
+        parts, matched, remote_columns = [], np.zeros(len(local), dtype=bool), None
+
+        def emit(part):
+            if stream_csv:
+                part.to_csv(output, mode="a" if emit.written else "w", header=not emit.written, index=False)
+                emit.written = True
+            if keep_parts:
+                parts.append(part)
+        emit.written = False
+
+        with ThreadPoolExecutor(max_workers=self.n_workers or 4) as pool:
+            futures = [pool.submit(run_chunk, rows) for rows in chunks]
+            for idx, future in enumerate(futures, start=1):
+                result = future.result()
+                remote_columns = [c for c in result.columns if c not in ("row_id", "tap_separation")]
+                matched[result["row_id"].to_numpy(np.int64)] = True
+                part = self._join_chunk(local, result)
+                emit(part)
+                if return_output:
+                    print(f"TAP chunk {idx}/{len(futures)}: {len(part)} rows")
+
+        # local rows without a match (or without a position) for join_mode="always", or an empty result
+        if self.join_mode == "always" or not (emit.written or parts):
+            rows = np.flatnonzero(~matched) if self.join_mode == "always" else np.empty(0, dtype=np.int64)
+            result = pd.DataFrame({"row_id": rows, **{column: np.nan for column in remote_columns or []},
+                                   "tap_separation": np.nan})
+            emit(self._join_chunk(local, result))
+
+        table = pd.concat(parts, ignore_index=True) if keep_parts else None
+        if write_output and not stream_csv:
+            write_table(table, output, self.ofmt)
+        if write_output:
+            print(f"Match written to {output}")
+
+        return table if return_table == "pandas" else None
+
+    def _join_chunk(self, local: pd.DataFrame, result: pd.DataFrame):
+        """
+        Joins the remote rows of one chunk result to the local rows, in the layout of the `StiltsMatcher` output.
+
+        Args:
+            local (pd.DataFrame): The local table.
+            result (pd.DataFrame): Result of the chunk query, with the local `row_id`, the remote columns and
+                `tap_separation` (arcseconds).
+
+        Returns:
+            pd.DataFrame: The joined rows.
+        """
+
+        if self.find == "best" and len(result):
+            result = result.sort_values(["row_id", "tap_separation"], kind="stable")
+            result = result.drop_duplicates("row_id", keep="first")
+
+        remote = result.drop(columns=["row_id", "tap_separation"]).reset_index(drop=True)
+        names = output_column_names([list(local.columns), list(remote.columns)],
+                                    [self.suffix_list[0], self.remote_suffix], self.fixcols)
+        part = local.iloc[result["row_id"].to_numpy(np.int64)].reset_index(drop=True)
+        part.columns = names[0]
+        remote.columns = names[1]
+        part = pd.concat([part, remote], axis=1)
+        part["Separation"] = result["tap_separation"].to_numpy(np.float64)
+        return part
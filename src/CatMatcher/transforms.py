@@ -0,0 +1,267 @@
+"""
+Vectorized transforms of the match columns, applied before the match.
+
+Frame conversions, epoch propagation with proper motions and unit fixes are often written as STILTS `input_command`
+expressions, which the JVM evaluates row by row on every run. A `TransformPipeline` performs the same steps as NumPy
+array operations on the projected match columns (and the few columns the steps need, e.g. proper motions). Its
+`fingerprint` identifies the steps and their parameters, so the transformed positions are cached together with the
+spatial index of the native engine (see `CatMatcher.caching.IndexCache`), and transformed copies of the inputs for
+STILTS are staged once per input version (see `StiltsMatcher._stage_inputs`).
+
+After a pipeline, positions are in degrees in the target frame and epoch, and error radii are in arcseconds.
+"""
+import json
+import hashlib
+from dataclasses import dataclass, asdict, field
+from typing import Union
+
+import numpy as np
+import pandas as pd
+
+from CatMatcher.native_matcher import radec_to_xyz
+
+# size of the supported angle units in degrees
+_UNIT_DEGREES = {"deg": 1.0, "rad": 180 / np.pi, "arcmin": 1 / 60, "arcsec": 1 / 3600, "mas": 1 / 3.6e6,
+                 "hourangle": 15.0}
+_MAS_TO_RAD = np.pi / (180 * 3.6e6)
+
+
+def xyz_to_radec(xyz):
+    """
+    Convert unit vectors to equatorial coordinates.
+
+    Args:
+        xyz (np.ndarray): Array of shape (n, 3) with cartesian vectors (not necessarily normalized).
+
+    Returns:
+        tuple: Right ascension in [0, 360) and declination, in degrees.
+    """
+
+    xyz = np.asarray(xyz, dtype=np.float64)
+    ra = np.degrees(np.arctan2(xyz[:, 1], xyz[:, 0])) % 360
+    dec = np.degrees(np.arctan2(xyz[:, 2], np.hypot(xyz[:, 0], xyz[:, 1])))
+    return ra, dec
+
+
+def _axes_matrix(pole, origin):
+    """ Rotation matrix into a frame given by the (lon, lat) of its pole and of its origin, in degrees."""
+
+    z = radec_to_xyz(*pole)[0]
+    x = radec_to_xyz(*origin)[0]
+    x = x - z * (x @ z)
+    x /= np.linalg.norm(x)
+    return np.array([x, np.cross(z, x), z])
+
+
+# rotation matrices from ICRS into every frame
+_GALACTIC = np.array([[-0.0548755604162154, -0.8734370902348850, -0.4838350155487132],
+                      [+0.4941094278755837, -0.4448296299600112, +0.7469822444972189],
+                      [-0.8676661490190047, -0.1980763734312015, +0.4559837761750669]])  # Hipparcos, ESA 1997
+_OBLIQUITY = np.radians(84381.406 / 3600)  # mean obliquity of the ecliptic at J2000 (IAU 2006)
+_BIAS = np.array([-14.6, -16.617, -6.8192]) * _MAS_TO_RAD  # ICRS to FK5 J2000 frame bias (dalpha0, xi0, eta0)
+
+FRAMES = {
+    "icrs": np.eye(3),
+    "fk5": np.array([[1, _BIAS[0], -_BIAS[1]], [-_BIAS[0], 1, -_BIAS[2]], [_BIAS[1], _BIAS[2], 1]]),
+    "galactic": _GALACTIC,
+    "ecliptic": np.array([[1, 0, 0],
+                          [0, np.cos(_OBLIQUITY), np.sin(_OBLIQUITY)],
+                          [0, -np.sin(_OBLIQUITY), np.cos(_OBLIQUITY)]]),
+    "supergalactic": _axes_matrix((47.37, 6.32), (137.37, 0.0)) @ _GALACTIC,
+}
+
+
+@dataclass(frozen=True)
+class ScaleUnits:
+    """
+    Convert positions (and error radii) given in other units to degrees (and arcseconds).
+
+    Attributes:
+        ra_unit (str, optional): Unit of the RA column: "deg", "rad", "arcmin", "arcsec", "mas" or "hourangle".
+            (Default: "deg")
+        dec_unit (str, optional): Unit of the Dec column. Same as `ra_unit` if None, or "deg" if `ra_unit` is
+            "hourangle".
+        error_unit (str, optional): Unit of the error radius column (`matcher="skyerr"`). (Default: "arcsec")
+    """
+
+    ra_unit: str = "deg"
+    dec_unit: str = None
+    error_unit: str = "arcsec"
+
+    def __post_init__(self):
+        for unit in (self.ra_unit, self.dec_unit, self.error_unit):
+            if unit is not None and unit not in _UNIT_DEGREES:
+                raise ValueError(f"Unsupported unit '{unit}'. Allowed units are: {sorted(_UNIT_DEGREES)}")
+
+    @property
+    def columns(self):
+        return []
+
+    def apply(self, ra, dec, error, values):
+        dec_unit = self.dec_unit or ("deg" if self.ra_unit == "hourangle" else self.ra_unit)
+        if error is not None:
+            error = error * (_UNIT_DEGREES[self.error_unit] * 3600)
+        return ra * _UNIT_DEGREES[self.ra_unit], dec * _UNIT_DEGREES[dec_unit], error
+
+
+@dataclass(frozen=True)
+class RotateFrame:
+    """
+    Rotate positions from one celestial frame into another.
+
+    Attributes:
+        frame (str): Frame of the input positions: "icrs", "fk5" (J2000), "galactic", "ecliptic" (mean J2000) or
+            "supergalactic".
+        to_frame (str, optional): Frame of the output positions. (Default: "icrs")
+    """
+
+    frame: str
+    to_frame: str = "icrs"
+
+    def __post_init__(self):
+        for frame in (self.frame, self.to_frame):
+            if frame not in FRAMES:
+                raise ValueError(f"Unsupported frame '{frame}'. Allowed frames are: {sorted(FRAMES)}")
+
+    @property
+    def columns(self):
+        return []
+
+    def apply(self, ra, dec, error, values):
+        matrix = FRAMES[self.to_frame] @ FRAMES[self.frame].T
+        return (*xyz_to_radec(radec_to_xyz(ra, dec) @ matrix.T), error)
+
+
+@dataclass(frozen=True)
+class PropagateEpoch:
+    """
+    Move positions to another epoch along their proper motions (linear motion on the sky, without parallax and radial
+    velocity). Rows without proper motions keep their position.
+
+    The proper motions must be given in the frame of the positions at this step of the pipeline, usually ICRS.
+
+    Attributes:
+        pmra (str, optional): Column of the proper motion in RA, times cos(Dec), in mas/yr. (Default: "pmra")
+        pmdec (str, optional): Column of the proper motion in Dec, in mas/yr. (Default: "pmdec")
+        epoch (Union[float, str], optional): Epoch of the positions as Julian year, or the column holding it per row.
+            (Default: 2016.0, Gaia DR3)
+        to_epoch (float, optional): Target epoch as Julian year. (Default: 2000.0)
+    """
+
+    pmra: str = "pmra"
+    pmdec: str = "pmdec"
+    epoch: Union[float, str] = 2016.0
+    to_epoch: float = 2000.0
+
+    @property
+    def columns(self):
+        return [self.pmra, self.pmdec] + ([self.epoch] if isinstance(self.epoch, str) else [])
+
+    def apply(self, ra, dec, error, values):
+        epoch = values[self.epoch] if isinstance(self.epoch, str) else self.epoch
+        dt = self.to_epoch - np.asarray(epoch, dtype=np.float64)
+        pmra = np.nan_to_num(np.asarray(values[self.pmra], dtype=np.float64)) * _MAS_TO_RAD
+        pmdec = np.nan_to_num(np.asarray(values[self.pmdec], dtype=np.float64)) * _MAS_TO_RAD
+
+        ra_rad, dec_rad = np.radians(ra), np.radians(dec)
+        sin_ra, cos_ra, sin_dec = np.sin(ra_rad), np.cos(ra_rad), np.sin(dec_rad)
+        # unit vectors towards increasing RA and Dec, scaled by the motion and the elapsed time
+        motion = (np.column_stack((-sin_ra, cos_ra, np.zeros_like(ra_rad))) * (pmra * dt)[:, None] +
+                  np.column_stack((-sin_dec * cos_ra, -sin_dec * sin_ra, np.cos(dec_rad))) * (pmdec * dt)[:, None])
+        return (*xyz_to_radec(radec_to_xyz(ra, dec) + motion), error)
+
+
+@dataclass
+class TransformPipeline:
+    """
+    Sequence of transforms applied to the match columns of a table, in the given order.
+
+    Example::
+
+        TransformPipeline([ScaleUnits(ra_unit="rad"), RotateFrame("galactic"),
+                           PropagateEpoch(epoch=2016.0, to_epoch=2000.0)])
+
+    Attributes:
+        steps (list): The transforms, instances of `ScaleUnits`, `RotateFrame` or `PropagateEpoch`.
+    """
+
+    steps: list = field(default_factory=list)
+
+    def __post_init__(self):
+        if not all(isinstance(step, (ScaleUnits, RotateFrame, PropagateEpoch)) for step in self.steps):
+            raise ValueError("Transform steps must be ScaleUnits, RotateFrame or PropagateEpoch instances.")
+
+    @property
+    def columns(self):
+        """ list: Additional columns the steps read (e.g. proper motions), besides the match columns."""
+
+        return list(dict.fromkeys(column for step in self.steps for column in step.columns))
+
+    def fingerprint(self):
+        """
+        Identify the steps and their parameters, e.g. for cache keys.
+
+        Returns:
+            str: Hexadecimal digest, equal for pipelines with equal steps.
+        """
+
+        spec = json.dumps([[type(step).__name__, asdict(step)] for step in self.steps], sort_keys=True)
+        return hashlib.blake2b(spec.encode(), digest_size=16).hexdigest()
+
+    def scale_error(self, error):
+        """
+        Convert error radii to arcseconds, applying only the unit scaling steps.
+
+        Args:
+            error (np.ndarray): Error radius column.
+
+        Returns:
+            np.ndarray: Error radii in arcseconds.
+        """
+
+        error = np.asarray(error, dtype=np.float64)
+        for step in self.steps:
+            if isinstance(step, ScaleUnits):
+                error = error * (_UNIT_DEGREES[step.error_unit] * 3600)
+        return error
+
+    def apply(self, ra, dec, values: dict = None, error=None):
+        """
+        Transform positions (and error radii).
+
+        Args:
+            ra (np.ndarray): RA column.
+            dec (np.ndarray): Dec column.
+            values (dict, optional): Arrays of the additional columns, see `columns`.
+            error (np.ndarray, optional): Error radius column.
+
+        Returns:
+            tuple: RA and Dec in degrees, and the error radii in arcseconds (None if no errors were given).
+        """
+
+        ra, dec = np.asarray(ra, dtype=np.float64), np.asarray(dec, dtype=np.float64)
+        error = None if error is None else np.asarray(error, dtype=np.float64)
+        for step in self.steps:
+            ra, dec, error = step.apply(ra, dec, error, values or {})
+        return ra, dec, error
+
+    def apply_table(self, table: pd.DataFrame, match_columns: list):
+        """
+        Transform the match columns of a table.
+
+        Args:
+            table (pd.DataFrame): The table, including the columns the steps read.
+            match_columns (list): Names of the RA, Dec and (optional) error radius columns.
+
+        Returns:
+            pd.DataFrame: Copy of the table with the transformed match columns.
+        """
+
+        ra, dec, error = self.apply(table[match_columns[0]], table[match_columns[1]],
+                                    {column: table[column].to_numpy() for column in self.columns},
+                                    table[match_columns[2]] if len(match_columns) > 2 else None)
+        table = table.copy()
+        table[match_columns[0]], table[match_columns[1]] = ra, dec
+        if error is not None:
+            table[match_columns[2]] = error
+        return table
@@ -0,0 +1,46 @@
+"""
+Local stand-in for `stilts server`, used by the tests when no STILTS installation is available.
+
+Usage: python stilts_server_standin.py <port>
+
+It answers POST requests to /stilts/task/<task> like the STILTS server: `calc` evaluates simple sums, `tcopy` copies
+the input file to the output path, and `tmatchn` writes the received parameters to the output path.
+"""
+import sys
+import json
+import shutil
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        task = self.path.rsplit("/", 1)[-1]
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode()
+        params = dict(urllib.parse.parse_qsl(body))
+
+        if task == "calc":
+            self._answer(200, str(sum(int(term) for term in params["expression"].split("+"))))
+        elif task == "tcopy":
+            shutil.copy(params["in"], params["out"])
+            self._answer(200, "")
+        elif task == "tmatchn":
+            with open(params["out"], "w") as f:
+                json.dump(params, f)
+            self._answer(200, "Elapsed time: 0.1s\n")
+        else:
+            self._answer(400, f"No such task: {task}")
+
+    def _answer(self, status, text):
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain")
+        self.end_headers()
+        self.wfile.write(text.encode())
+
+    def log_message(self, *args):
+        pass
+
+
+if __name__ == "__main__":
+    HTTPServer(("localhost", int(sys.argv[1])), StandinHandler).serve_forever()
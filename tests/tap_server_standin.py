@@ -0,0 +1,111 @@
+"""
+Local stand-in for a TAP service, used by the tests of `CatMatcher.tap_matcher`.
+
+It answers synchronous queries of the form built by `crossmatch_query` (an uploaded VOTable joined with a remote
+table by a CONTAINS/CIRCLE condition) against an in-memory remote catalog, and returns the result as csv. Failures can
+be injected to test the retries, and the client ports of all requests are recorded to test the connection reuse.
+"""
+import re
+import threading
+import email.parser
+import email.policy
+import xml.etree.ElementTree as ElementTree
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from CatMatcher.native_matcher import radec_to_xyz, arcsec_to_chord, chord_to_arcsec
+
+
+class TapStandin:
+    """
+    TAP stand-in serving a remote catalog with the position columns "ra" and "dec".
+
+    Args:
+        remote (pd.DataFrame): The remote catalog.
+        fail_first (int, optional): Number of requests answered with status 503 before queries succeed. (Default: 0)
+    """
+
+    def __init__(self, remote: pd.DataFrame, fail_first: int = 0):
+        self.remote = remote
+        self.fail_first = fail_first
+        self.requests = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("localhost", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://localhost:{self._server.server_address[1]}/tap"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def answer(self, fields: dict, upload: bytes):
+        """ Evaluate one crossmatch query and return the result as csv."""
+
+        query = fields["QUERY"]
+        radius = float(re.search(r"CIRCLE\('ICRS', u\.ra, u\.dec, ([^)]+)\)", query).group(1)) * 3600
+        columns = re.search(r"SELECT u\.row_id, (.*?), DISTANCE", query).group(1)
+        columns = list(self.remote.columns) if columns == "r.*" else [c[2:] for c in columns.split(", ")]
+
+        rows = [[cell.text for cell in row] for row in ElementTree.fromstring(upload).iter()
+                if row.tag.endswith("}TR")]
+        chunk = pd.DataFrame(rows, columns=["row_id", "ra", "dec"]).astype({"row_id": int, "ra": float, "dec": float})
+
+        local = radec_to_xyz(chunk["ra"], chunk["dec"])
+        remote = radec_to_xyz(self.remote["ra"], self.remote["dec"])
+        chord = np.linalg.norm(local[:, None] - remote[None], axis=2)
+        i, j = np.nonzero(chord <= arcsec_to_chord(radius))
+
+        result = self.remote.iloc[j][columns].reset_index(drop=True)
+        result.insert(0, "row_id", chunk["row_id"].to_numpy()[i])
+        result["tap_separation"] = chord_to_arcsec(chord[i, j])
+        return result.to_csv(index=False).encode()
+
+    def _handler(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                with standin._lock:
+                    standin.requests.append(self.client_address[1])
+                    fail = len(standin.requests) <= standin.fail_first
+
+                if fail:
+                    return self._answer(503, b"busy")
+                if not self.path.endswith("/sync"):
+                    return self._answer(404, b"no such endpoint")
+
+                message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+                    f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + body)
+                fields, files = {}, {}
+                for part in message.iter_parts():
+                    name = part.get_param("name", header="content-disposition")
+                    if part.get_filename():
+                        files[name] = part.get_payload(decode=True)
+                    else:
+                        fields[name] = part.get_payload(decode=True).decode()
+
+                self._answer(200, standin.answer(fields, files["chunk"]))
+
+            def _answer(self, status, data):
+                self.send_response(status)
+                self.send_header("Content-Type", "text/csv")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
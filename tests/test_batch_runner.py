@@ -0,0 +1,125 @@
+import os
+import re
+import stat
+import shutil
+from pathlib import Path
+
+import pytest
+import pandas as pd
+
+from CatMatcher.matcher import StiltsMatcher
+from CatMatcher.batch_runner import heap_to_mb, run_batch
+
+DATA_DIR = Path(__file__).resolve().parents[1] / "Data" / "example_files"
+
+FAKE_STILTS = """#!/bin/bash
+# stand-in for STILTS: logs start/end times and writes the file given by out=...
+echo "start $(date +%s.%N)" >> "$STILTS_LOG"
+sleep "${FAKE_STILTS_SLEEP:-0.3}"
+for arg in "$@"; do
+    case "$arg" in out=*) echo "matched" > "${arg#out=}" ;; esac
+done
+echo "end $(date +%s.%N)" >> "$STILTS_LOG"
+"""
+
+
+@pytest.fixture
+def fake_stilts(tmp_path, monkeypatch):
+    """ Put a fake `stilts` executable on the PATH and return the path of its log file."""
+
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    (bin_dir / "stilts").write_text(FAKE_STILTS)
+    os.chmod(bin_dir / "stilts", stat.S_IRWXU)
+
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("STILTS_LOG", str(tmp_path / "stilts.log"))
+    (tmp_path / ".bashrc").write_text("")
+    return tmp_path / "stilts.log"
+
+
+def max_overlap(log_file):
+    """ Get the maximum number of fake STILTS processes that ran at the same time."""
+
+    events = sorted((float(t), 1 if kind == "start" else -1)
+                    for kind, t in (line.split() for line in log_file.read_text().splitlines()))
+    running, peak = 0, 0
+    for _, change in events:
+        running += change
+        peak = max(peak, running)
+    return peak
+
+
+def test_heap_to_mb():
+    """ Check the conversion of JVM heap size strings."""
+
+    assert heap_to_mb("512M") == 512
+    assert heap_to_mb("4g") == 4096
+    with pytest.raises(ValueError, match="Invalid JVM heap size"):
+        heap_to_mb("four gigs")
+
+
+def test_run_batch_respects_memory_budget(tmp_path, fake_stilts):
+    """ Check that all jobs succeed with their own output, and that the heap budget limits the concurrency."""
+
+    matchers = [StiltsMatcher(file_list=["a.csv", "b.csv"], file_path=str(tmp_path), match_radius=1,
+                              command_file_name=f"job{i}.txt", output_file_name=f"out{i}.csv", jvm_heap="1G")
+                for i in range(4)]
+
+    results = run_batch(matchers, max_workers=4, max_total_heap="2G", shell="bash")
+
+    assert [r.returncode for r in results] == [0, 0, 0, 0]
+    assert [r.name for r in results] == [f"job{i}.txt" for i in range(4)]
+    assert all(os.path.exists(r.output_path) and r.wall_time > 0 for r in results)
+    assert max_overlap(fake_stilts) == 2
+    assert all(re.match(r"stilts -Xmx1G tmatchn", open(m._script_path + m.command_file_name).read())
+               for m in matchers)
+
+
+def test_run_batch_direct_jobs_report_run_outcome(tmp_path, fake_stilts, monkeypatch):
+    """ Check that jobs with executor='direct' run without a shell script, within their timeout, and report the
+    outcome of the STILTS run."""
+
+    monkeypatch.setenv("FAKE_STILTS_SLEEP", "1")
+    matchers = [StiltsMatcher(file_list=["a.csv", "b.csv"], file_path=str(tmp_path), match_radius=1,
+                              command_file_name=f"job{i}.txt", output_file_name=f"out{i}.csv", jvm_heap="1G",
+                              executor="direct", timeout=0.3 if i == 2 else 30)
+                for i in range(3)]
+
+    results = run_batch(matchers, max_workers=3)
+
+    assert [r.returncode for r in results[:2]] == [0, 0]
+    assert all(os.path.exists(r.output_path) and r.run_result.argv[0] == "stilts" for r in results[:2])
+    assert results[2].returncode != 0 and results[2].run_result.timed_out
+    assert not os.path.exists(results[2].output_path)
+    assert not any(name.endswith(".sh") for name in os.listdir(matchers[0]._script_path))
+
+
+def test_run_batch_rejects_shared_output(tmp_path):
+    """ Check that jobs writing to the same output file are refused before anything runs."""
+
+    matchers = [StiltsMatcher(file_list=["a.csv", "b.csv"], file_path=str(tmp_path), match_radius=1,
+                              command_file_name=f"job{i}.txt") for i in range(2)]
+
+    with pytest.raises(ValueError, match="unique output_file_name"):
+        run_batch(matchers)
+
+
+def test_run_batch_native_jobs_share_working_directory(tmp_path):
+    """ Check that concurrent native jobs on the same inputs share the index and result caches without failing."""
+
+    shutil.copytree(DATA_DIR, tmp_path, dirs_exist_ok=True)
+    matchers = [StiltsMatcher(file_list=["Disks_NGC2024.csv", "Megeath_YSOs.csv", "Nemesis_YSOs_OrionB.csv"],
+                              file_path=str(tmp_path), match_radius=1 + i % 2,
+                              match_values=["RAJ2000 DEJ2000", "RAJ2000 DEJ2000", "RA DE"],
+                              suffix_list=["Disks", "Megeath", "Nemesis"], engine="native", use_result_cache=True,
+                              command_file_name=f"job{i}.txt", output_file_name=f"out{i}.csv")
+                for i in range(8)]
+
+    results = run_batch(matchers, max_workers=8)
+
+    assert [r.stderr for r in results] == [""] * 8
+    outputs = [pd.read_csv(r.output_path) for r in results]
+    for i, output in enumerate(outputs[2:], start=2):
+        pd.testing.assert_frame_equal(output, outputs[i % 2])
@@ -0,0 +1,126 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from CatMatcher.caching import file_digest, enforce_size_cap, sorted_position_arrays, IndexCache, ResultCache, \
+    canonical_config
+from CatMatcher.native_matcher import radec_to_xyz
+
+
+def test_file_digest_follows_content(tmp_path):
+    """ Check that the digest only depends on the file content, and that the memo is refreshed on changes."""
+
+    a, b = tmp_path / "a.csv", tmp_path / "b.csv"
+    a.write_text("RA,DEC\n1,2\n")
+    b.write_text("RA,DEC\n1,2\n")
+    memo = str(tmp_path / "memo.json")
+
+    assert file_digest(str(a), memo) == file_digest(str(b), memo)
+
+    a.write_text("RA,DEC\n1,3\n")
+    os.utime(a, ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+    assert file_digest(str(a), memo) != file_digest(str(b), memo)
+
+
+def test_file_digest_shared_memo(tmp_path):
+    """ Check that threads sharing one memo never read it half-written, and that a broken memo is ignored."""
+
+    files = []
+    for i in range(8):
+        files.append(tmp_path / f"cat{i}.csv")
+        files[-1].write_text(f"RA,DEC\n{i},{i}\n")
+    memo = str(tmp_path / "memo.json")
+
+    with ThreadPoolExecutor(8) as pool:
+        digests = list(pool.map(lambda file: file_digest(str(file), memo), files * 50))
+    assert digests == [file_digest(str(file)) for file in files] * 50
+
+    (tmp_path / "memo.json").write_text('{"broken')
+    assert file_digest(str(files[0]), memo) == digests[0]
+    assert [name for name in os.listdir(tmp_path) if name.endswith(".tmp")] == []
+
+
+def test_sorted_position_arrays_sorted_and_complete():
+    """ Check that the cached representation is sorted by declination and skips rows with missing positions."""
+
+    xyz = radec_to_xyz([10, 20, np.nan, 40], [5, -5, 0, 1])
+    arrays = sorted_position_arrays(xyz)
+
+    assert arrays["rows"].tolist() == [1, 3, 0]
+    assert np.array_equal(arrays["xyz"], xyz[[1, 3, 0]])
+
+
+def test_index_cache_roundtrip(tmp_path):
+    """ Check that a stored entry is found again under the same key and opened memory-mapped."""
+
+    catalog = tmp_path / "cat.csv"
+    catalog.write_text("RA,DEC\n1,2\n")
+    cache = IndexCache(str(tmp_path / "cache"))
+
+    key = cache.key(str(catalog), "csv", ["RA", "DEC"])
+    assert cache.load(key) is None
+    assert key != cache.key(str(catalog), "csv", ["ra", "dec"])
+    assert key != cache.key(str(catalog), "tst", ["RA", "DEC"])
+
+    cache.store(key, sorted_position_arrays(radec_to_xyz([1], [2])), n_rows=1)
+    entry = cache.load(key)
+
+    assert isinstance(entry["xyz"], np.memmap)
+    assert entry["meta"]["n_rows"] == 1
+
+    # threads storing the same key each write their own temporary entry, one of them is kept
+    with ThreadPoolExecutor(8) as pool:
+        stored = list(pool.map(lambda _: cache.store(key, sorted_position_arrays(radec_to_xyz([1], [2])), n_rows=1),
+                               range(16)))
+    assert all(entry["meta"]["n_rows"] == 1 for entry in stored)
+    assert sorted(os.listdir(tmp_path / "cache")) == [".digests.json", key]
+
+    # an entry evicted by another process after its meta file was found is a miss
+    os.remove(tmp_path / "cache" / key / "xyz.npy")
+    assert cache.load(key) is None
+
+
+def test_enforce_size_cap_evicts_least_recently_used(tmp_path):
+    """ Check that the oldest entries are evicted first, and that protected entries are kept."""
+
+    for age, name in enumerate(["new", "mid", "old"]):
+        os.makedirs(tmp_path / name)
+        (tmp_path / name / "data.bin").write_bytes(b"x" * 1024 ** 2)
+        (tmp_path / name / "meta.json").write_text("{}")
+        os.utime(tmp_path / name / "meta.json", (time.time() - 100 * age, time.time() - 100 * age))
+
+    evicted = enforce_size_cap(str(tmp_path), max_size_mb=1.5, keep=("old",))
+
+    assert evicted == ["mid", "new"]
+    assert os.path.exists(tmp_path / "old")
+
+
+def test_result_cache_keys_and_links(tmp_path):
+    """ Check that the key follows input content and settings, and that stored files are restored as links, while
+    an entry whose file was overwritten in place is dropped."""
+
+    catalog, output = tmp_path / "cat.csv", tmp_path / "out.csv"
+    catalog.write_text("RA,DEC\n1,2\n")
+    output.write_text("RA_1,DEC_1\n1,2\n")
+    cache = ResultCache(str(tmp_path / "cache"))
+
+    key = cache.key([str(catalog)], {"match_radius": 1.0, "suffix_list": ("a",)})
+    assert key == cache.key([str(catalog)], {"suffix_list": ["a"], "match_radius": np.float64(1.0)})
+    assert key != cache.key([str(catalog)], {"match_radius": 2.0, "suffix_list": ["a"]})
+    assert canonical_config({"b": 1, "a": (2,)}) == '{"a": [2], "b": 1}'
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda _: cache.store(key, {"output": str(output)}), range(16)))
+    assert sorted(os.listdir(tmp_path / "cache")) == [".digests.json", key]
+    restored = tmp_path / "restored.csv"
+    cache.restore(cache.load(key), "output", str(restored))
+    assert restored.read_text() == output.read_text()
+    assert os.path.samefile(restored, cache.load(key)["files"]["output"])
+
+    with open(output, "w") as f:
+        f.write("changed\n")
+    os.utime(output, ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+    assert cache.load(key) is None
+    assert cache.invalidate() == 0
@@ -0,0 +1,156 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from CatMatcher.catalog_io import FORMATS, read_match_columns, line_offsets, fetch_rows, read_fits_table, \
+    fits_to_dataframe, write_fits_table, write_table, read_table, iter_table, count_rows, read_column_names
+
+DATA_DIR = Path(__file__).resolve().parents[1] / "Data"
+
+
+def test_read_match_columns_chunked():
+    """ Check that the chunk-wise projected reader returns the same values as a full pandas read."""
+
+    file = DATA_DIR / "example_files" / "Nemesis_YSOs_OrionB.csv"
+    positions = read_match_columns(str(file), "csv", ["DE", "RA"], chunk_size=50)
+    full = pd.read_csv(file)
+
+    assert positions.dtype == np.float64
+    assert np.array_equal(positions, full[["DE", "RA"]].to_numpy(), equal_nan=True)
+
+
+def test_line_offsets(tmp_path):
+    """ Check the line start detection, with and without a trailing newline."""
+
+    file = tmp_path / "lines.csv"
+    file.write_bytes(b"a,b\n1,2\n3,4")
+    assert line_offsets(str(file), block_size=3).tolist() == [0, 4, 8, 11]
+
+    file.write_bytes(b"a,b\n1,2\n")
+    assert line_offsets(str(file)).tolist() == [0, 4, 8]
+
+
+def test_fetch_rows_fast_path_matches_full_read():
+    """ Check that only the requested rows are returned, indexed by row id, on both read paths."""
+
+    file = DATA_DIR / "example_files" / "Megeath_YSOs.csv"
+    full = pd.read_csv(file)
+    row_ids = np.array([3000, -1, 5, 17, 5])
+
+    fast = fetch_rows(str(file), "csv", row_ids, n_rows=len(full))
+    chunked = fetch_rows(str(file), "csv", row_ids, chunk_size=100)
+
+    assert fast.index.tolist() == [5, 17, 3000]
+    pd.testing.assert_frame_equal(fast, full.loc[[5, 17, 3000]])
+    pd.testing.assert_frame_equal(chunked, full.loc[[5, 17, 3000]])
+
+
+def test_fetch_rows_falls_back_on_quoted_line_breaks(tmp_path):
+    """ Check that a multi-line quoted value disables the line-offset path instead of corrupting the rows."""
+
+    file = tmp_path / "quoted.csv"
+    file.write_text('RA,Name\n1.0,"two\nlines"\n2.0,plain\n')
+
+    rows = fetch_rows(str(file), "csv", [1], n_rows=2)
+
+    assert rows.loc[1, "Name"] == "plain"
+
+
+def test_fits_round_trip(tmp_path):
+    """ Check that a table written as FITS binary table is decoded with its types, missing values and units."""
+
+    table = pd.DataFrame({"id": np.arange(5, dtype=np.int64), "flux": [1.5, np.nan, 3.0, 4.0, 5.0],
+                          "name": ["a", None, "ccc", "d", "e"], "flag": [True, False, True, True, False],
+                          "count": np.arange(5, dtype=np.uint32)})
+    with open(tmp_path / "table.fits", "wb") as f:
+        write_fits_table(table, f, units={"flux": "mJy"})
+
+    with open(tmp_path / "table.fits", "rb") as f:
+        array, meta = read_fits_table(f, chunk_rows=2)
+    result = fits_to_dataframe(array, meta)
+
+    assert len(array) == 5 and meta["flux"]["unit"] == "mJy"
+    assert result["id"].dtype == np.int64 and result["flag"].dtype == bool
+    assert result["count"].tolist() == list(range(5))
+    assert result["name"].tolist()[2] == "ccc" and pd.isna(result["name"][1])
+    assert np.array_equal(result["flux"], table["flux"], equal_nan=True)
+
+
+@pytest.fixture
+def typed_table():
+    """ Table with every supported column type, missing values and units."""
+
+    table = pd.DataFrame({"ra": np.linspace(0, 359.5, 7), "mag": np.arange(7, dtype=np.float32) + 0.25,
+                          "id": np.arange(7, dtype=np.int64) - 3, "flag": [True, False] * 3 + [True],
+                          "big": np.array([0, 1, 2, 3, 4, 5, 2 ** 64 - 1], dtype=np.uint64),
+                          "name": ["a", "b & c", None, "<d>", "e", "f", "g"],
+                          "count": pd.array([1, None, 3, 4, 5, 6, 7], dtype="Int32")})
+    table.attrs["units"] = {"ra": "deg", "mag": "mag"}
+    return table
+
+
+@pytest.mark.parametrize("fmt", FORMATS)
+def test_round_trip_all_formats(tmp_path, typed_table, fmt):
+    """ Check that every format reads back the values, column types and (where the format has them) units."""
+
+    file = str(tmp_path / f"table.{fmt}")
+    write_table(typed_table, file, fmt, chunk_size=3)
+    result = read_table(file, fmt, chunk_size=2)
+
+    assert list(result.columns) == list(typed_table.columns)
+    assert result.index.tolist() == list(range(7))
+    np.testing.assert_allclose(result["ra"], typed_table["ra"])
+    assert result["id"].dtype == np.int64 and result["id"].tolist() == typed_table["id"].tolist()
+    assert result["flag"].dtype == bool and result["flag"].tolist() == typed_table["flag"].tolist()
+    assert result["big"].tolist()[-1] in (2 ** 64 - 1, str(2 ** 64 - 1))
+    assert result["name"].tolist()[3] == "<d>" and result["name"].tolist()[1] == "b & c"
+    assert pd.isna(result["name"][2]) and pd.isna(result["count"][1]) and result["count"][2] == 3
+    if fmt not in ("csv", "tst"):
+        assert result.attrs["units"] == {"ra": "deg", "mag": "mag"}
+        assert result["mag"].dtype == np.float32
+
+    assert count_rows(file, fmt) == 7
+    assert read_column_names(file, fmt) == list(typed_table.columns)
+    np.testing.assert_allclose(read_match_columns(file, fmt, ["mag", "ra"], chunk_size=4),
+                               typed_table[["mag", "ra"]].to_numpy(np.float64))
+
+    rows = fetch_rows(file, fmt, [6, -1, 2], n_rows=7, chunk_size=3, columns=["name", "id"])
+    assert rows.index.tolist() == [2, 6] and list(rows.columns) == ["name", "id"]
+    assert rows["id"].tolist() == [-1, 3] and rows["name"].tolist()[1] == "g"
+
+    write_table(typed_table.iloc[:0], file, fmt)
+    assert len(read_table(file, fmt)) == 0 and count_rows(file, fmt) == 0
+
+
+def test_iter_table_chunks_and_columns(tmp_path, typed_table):
+    """ Check the chunk sizes, row indices and column selection of the chunked readers."""
+
+    for fmt in ("colfits", "ecsv", "votable"):
+        file = str(tmp_path / f"table.{fmt}")
+        write_table(typed_table, file, fmt)
+        chunks = list(iter_table(file, fmt, columns=["mag", "id"], chunk_size=3))
+
+        assert [len(chunk) for chunk in chunks] == [3, 3, 1]
+        assert chunks[2].index.tolist() == [6] and list(chunks[0].columns) == ["mag", "id"]
+        assert chunks[0].attrs["units"] == {"mag": "mag"}
+        with pytest.raises(ValueError):
+            next(iter_table(file, fmt, columns=["missing"]))
+
+    with pytest.raises(ValueError):
+        next(iter_table(str(tmp_path / "table.ecsv"), "ipac"))
+
+
+def test_ecsv_block_style_header(tmp_path):
+    """ Check that ECSV headers in YAML block style and with space delimiter are understood."""
+
+    file = tmp_path / "block.ecsv"
+    file.write_text("# %ECSV 1.0\n# ---\n# datatype:\n# - name: ra\n#   unit: deg\n#   datatype: float64\n"
+                    "#   meta: {ucd: pos.eq.ra}\n# - name: n\n#   datatype: int16\n# - {name: label, datatype: string}\n"
+                    "ra n label\n10.5 1 \"x y\"\n11.5 2 z\n")
+
+    table = read_table(str(file), "ecsv")
+
+    assert table.attrs["units"] == {"ra": "deg"}
+    assert table["n"].dtype == np.int16 and table["label"].tolist() == ["x y", "z"]
@@ -0,0 +1,62 @@
+import os
+import json
+
+import numpy as np
+import pytest
+
+from CatMatcher.native_matcher import find_sky_pairs
+from CatMatcher.checkpointing import find_sky_pairs_checkpointed, load_manifest, completed_tiles
+
+from test_sharding import generate_tables
+
+
+class Interrupt(Exception):
+    pass
+
+
+def test_resume_skips_completed_tiles(tmp_path):
+    """ Check that a run interrupted after some tiles resumes with the remaining ones only, with the pairs of an
+    uninterrupted search."""
+
+    xyz_list = generate_tables()
+    tile_dir = str(tmp_path / "tiles")
+    fingerprint = {"inputs": "abc", "match_radius": 1.0}
+
+    searched = []
+
+    def crash_after_three(zone):
+        searched.append(zone)
+        if len(searched) == 3:
+            raise Interrupt()
+
+    with pytest.raises(Interrupt):
+        find_sky_pairs_checkpointed(xyz_list, 1.0, 8, tile_dir, fingerprint, n_workers=1, on_tile=crash_after_three)
+    manifest = load_manifest(tile_dir, fingerprint)
+    assert len(completed_tiles(tile_dir, manifest)) == 3
+    assert not [name for name in os.listdir(tile_dir) if "tmp" in name]
+
+    resumed = []
+    first, second, sep = find_sky_pairs_checkpointed(xyz_list, 1.0, 8, tile_dir, fingerprint, n_workers=2,
+                                                     on_tile=resumed.append)
+    assert len(resumed) == len(manifest["tiles"]) - 3
+
+    f, s, d = find_sky_pairs(xyz_list, 1.0)
+    order = np.lexsort((s, f))
+    assert np.array_equal(first, f[order]) and np.array_equal(second, s[order])
+    assert np.allclose(sep, d[order])
+
+
+def test_changed_fingerprint_starts_over(tmp_path):
+    """ Check that tiles of other inputs or settings are not reused."""
+
+    xyz_list = generate_tables()
+    tile_dir = str(tmp_path / "tiles")
+    find_sky_pairs_checkpointed(xyz_list, 1.0, 4, tile_dir, {"inputs": "abc"}, n_workers=1)
+
+    searched = []
+    find_sky_pairs_checkpointed(xyz_list, 1.0, 4, tile_dir, {"inputs": "def"}, n_workers=1, on_tile=searched.append)
+    with open(os.path.join(tile_dir, "manifest.json")) as f:
+        manifest = json.load(f)
+
+    assert len(searched) == len(manifest["tiles"])
+    assert manifest["fingerprint"] == {"inputs": "def"}
@@ -0,0 +1,61 @@
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from CatMatcher.matcher import StiltsMatcher
+from CatMatcher.exact_matcher import key_codes, exact_group_members, exact_pair_members
+from CatMatcher.native_matcher import select_joined_rows
+
+DATA_DIR = Path(__file__).resolve().parents[1] / "Data"
+
+
+def test_key_codes_normalization_and_multi_column_keys():
+    """ Check that padded strings match, integer and float keys compare by value, missing keys never match and keys of
+    several columns only match if all columns agree."""
+
+    a = pd.DataFrame({"name": ["IRS2   ", "IRC101 ", None, "X"], "field": [1, 1, 2, 3]})
+    b = pd.DataFrame({"name": ["IRC101", "IRS2", "", "X"], "field": [1.0, 2.0, 2.0, 3.0]})
+
+    codes_a, codes_b = key_codes([a, b])
+    assert codes_a[2] == -1 and codes_b[2] == -1
+    assert codes_a[1] == codes_b[0] and codes_a[3] == codes_b[3]
+    assert codes_a[0] != codes_b[1]  # same name, different field
+
+    name_a, name_b = key_codes([a[["name"]], b[["name"]]])
+    assert name_a[0] == name_b[1]
+
+
+def test_exact_group_and_pair_members():
+    """ Check the groups of equal keys with a duplicate key in one table, and the pairs mode around a reference."""
+
+    codes = [np.array([0, 1, 2, -1]), np.array([1, 1, 3]), np.array([2, 0, 1])]
+
+    members = exact_group_members(codes)
+    assert members.tolist() == [[0, -1, 1], [1, 0, 2], [2, -1, 0], [3, -1, -1], [-1, 1, -1], [-1, 2, -1]]
+    assert select_joined_rows(members, ["default"] * 3).tolist() == [[0, -1, 1], [1, 0, 2], [2, -1, 0]]
+
+    members = exact_pair_members(codes, iref=1, unmatched_tables=[0])
+    assert members.tolist() == [[1, 0, 2], [1, 1, 2], [-1, 2, -1], [0, -1, -1], [2, -1, -1], [3, -1, -1]]
+
+
+def test_native_exact_match_equals_merge(tmp_path):
+    """ Check a native exact match on a padded string id against a pandas merge of the stripped ids."""
+
+    shutil.copy(DATA_DIR / "example_files" / "Disks_NGC2024.csv", tmp_path)
+    disks = pd.read_csv(tmp_path / "Disks_NGC2024.csv")
+    subset = disks.sample(frac=0.5, random_state=1)
+    names = pd.DataFrame({"ID": subset["Name"].str.strip(), "value": np.arange(len(subset))})
+    names.to_csv(tmp_path / "names.csv", index=False)
+
+    matcher = StiltsMatcher(file_list=["Disks_NGC2024.csv", "names.csv"], file_path=str(tmp_path), match_radius=1,
+                            match_values=["Name", "ID"], matcher="exact", engine="native", join_mode="default")
+    table = matcher.perform_Nmatch()
+
+    expected = disks.assign(ID=disks["Name"].str.strip()).merge(names, on="ID")
+    assert table is None
+    matched = pd.read_csv(tmp_path / "CatMatcher_cwd" / "matches" / "matched.csv")
+    assert len(matched) == len(expected) == len(subset)
+    assert (matched["Name"].str.strip() == matched["ID"]).all()
+    assert sorted(matched["value"]) == sorted(expected["value"])
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from CatMatcher.matcher import StiltsMatcher
+from CatMatcher.incremental import changed_rows, band_pairs, declination_order
+from CatMatcher.native_matcher import radec_to_xyz, find_sky_pairs, table_offsets
+from CatMatcher.synthetic import generate_catalogs, write_catalogs
+
+
+def test_changed_rows():
+    """ Check that modified, appended and removed rows are reported."""
+
+    old = np.array([1, 2, 3, 4], dtype=np.uint64)
+    assert changed_rows(old, np.array([1, 9, 3, 4, 5, 6], dtype=np.uint64)).tolist() == [1, 4, 5]
+    assert changed_rows(old, old[:2]).tolist() == [2, 3]
+
+
+def test_band_pairs_agree_with_tree_search():
+    """ Check that the declination-band lookup finds the same pairs as the KD-tree search."""
+
+    first, second = generate_catalogs(3000, 2, scatter=0.5, density=20_000, seed=3)
+    xyz_a, xyz_b = (radec_to_xyz(c["RA"], c["DE"]) for c in (first, second))
+    order, z_sorted = declination_order(xyz_b)
+
+    query, rows, sep = band_pairs(xyz_b, order, z_sorted, xyz_a, 1.5)
+    tree_first, tree_second, tree_sep = find_sky_pairs([xyz_a, xyz_b], 1.5)
+
+    found = sorted(zip(query.tolist(), rows.tolist()))
+    expected = sorted(zip(tree_first.tolist(), (tree_second - table_offsets([3000, 3000])[1]).tolist()))
+    assert found == expected
+    assert np.allclose(np.sort(sep), np.sort(tree_sep))
+
+
+@pytest.mark.parametrize("join_mode", ["default", "match", "always"])
+def test_incremental_match_equals_full_match(tmp_path, join_mode):
+    """ Check that updating a match after appending, modifying and removing rows gives the result of a full match."""
+
+    catalogs = generate_catalogs(2000, 3, overlap=0.6, scatter=0.4, density=50_000, seed=5)
+    extra = generate_catalogs(300, 3, overlap=0.6, scatter=0.4, density=50_000, seed=6)
+    file_list = write_catalogs(catalogs, str(tmp_path))
+    kwargs = dict(file_list=file_list, file_path=str(tmp_path), match_radius=1, match_values="RA DE",
+                  join_mode=join_mode, engine="native", use_index_cache=False)
+
+    incremental = StiltsMatcher(output_file_name="incremental.csv", incremental=True, **kwargs)
+    incremental.perform_Nmatch()
+
+    # a new epoch of table 2, a corrected position in table 1 and a shortened table 3
+    catalogs[1] = pd.concat([catalogs[1], extra[1].assign(ID=extra[1]["ID"] + 2000)], ignore_index=True)
+    catalogs[0].loc[17, "RA"] = catalogs[1].loc[2100, "RA"]
+    catalogs[0].loc[17, "DE"] = catalogs[1].loc[2100, "DE"]
+    catalogs[2] = catalogs[2].iloc[:1900]
+    write_catalogs(catalogs, str(tmp_path))
+
+    incremental.perform_Nmatch()
+    StiltsMatcher(output_file_name="full.csv", **kwargs).perform_Nmatch()
+
+    matches = tmp_path / "CatMatcher_cwd" / "matches"
+    pd.testing.assert_frame_equal(pd.read_csv(matches / "incremental.csv"), pd.read_csv(matches / "full.csv"))
+
+    # nothing changed: the stored state is used as it is
+    incremental.perform_Nmatch()
+    pd.testing.assert_frame_equal(pd.read_csv(matches / "incremental.csv"), pd.read_csv(matches / "full.csv"))
@@ -0,0 +1,100 @@
+import os
+import shutil
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from CatMatcher.match_configurator import MatchConfigurator
+from CatMatcher.match_service import MatchService, UnknownReference, query_match_service
+from CatMatcher.native_matcher import radec_to_xyz, chord_to_arcsec
+
+DATA_DIR = Path(__file__).resolve().parents[1] / "Data"
+
+
+@pytest.fixture
+def service(tmp_path):
+    """ Serve the Megeath and Nemesis example catalogs on a free port."""
+
+    shutil.copytree(DATA_DIR / "example_files", tmp_path, dirs_exist_ok=True)
+    config = MatchConfigurator(file_list=["Megeath_YSOs.csv", "Nemesis_YSOs_OrionB.csv"], file_path=str(tmp_path),
+                               match_radius=1, match_values=["RAJ2000 DEJ2000", "RA DE"],
+                               suffix_list=["megeath", "nemesis"])
+    with MatchService(config, port=0, reload_interval=0) as service:
+        yield service
+
+
+def brute_force_best(query, reference, radius):
+    """ Closest reference row of every query row within the radius, as (query row, reference row) pairs."""
+
+    chord = np.linalg.norm(radec_to_xyz(query["RAJ2000"], query["DEJ2000"])[:, None] -
+                           radec_to_xyz(reference["RAJ2000"], reference["DEJ2000"])[None], axis=2)
+    best = chord.argmin(axis=1)
+    hit = np.flatnonzero(chord_to_arcsec(chord.min(axis=1)) <= radius)
+    return list(zip(hit.tolist(), best[hit].tolist()))
+
+
+def test_service_matches_like_brute_force(service, tmp_path):
+    """ Check that the service finds the closest reference row of every query row, with the reference columns."""
+
+    query = pd.read_csv(tmp_path / "Disks_NGC2024.csv")
+    reference = pd.read_csv(tmp_path / "Megeath_YSOs.csv")
+
+    result = query_match_service(service.url, "megeath", query["RAJ2000"], query["DEJ2000"], match_radius=2,
+                                 columns=["Seq", "Kmag"])
+
+    assert list(zip(result["query_row"], result["reference_row"])) == brute_force_best(query, reference, 2)
+    assert result["Seq"].tolist() == reference["Seq"].to_numpy()[result["reference_row"]].tolist()
+    assert (result["separation"] <= 2).all()
+
+
+def test_concurrent_clients_share_the_index(service, tmp_path):
+    """ Check that parallel requests get the same answers as sequential ones."""
+
+    query = pd.read_csv(tmp_path / "Disks_NGC2024.csv")
+    chunks = np.array_split(np.arange(len(query)), 16)
+
+    def request(rows):
+        return query_match_service(service.url, "nemesis", query["RAJ2000"].to_numpy()[rows],
+                                   query["DEJ2000"].to_numpy()[rows], match_radius=3, find="all")
+
+    with ThreadPoolExecutor(8) as pool:
+        parallel = list(pool.map(request, chunks))
+
+    for rows, result in zip(chunks, parallel):
+        pd.testing.assert_frame_equal(result, request(rows))
+    assert sum(map(len, parallel)) > 0
+
+
+def test_reference_is_reloaded_when_file_changes(service, tmp_path):
+    """ Check that a changed reference file is picked up by the next request, and that errors are reported."""
+
+    reference = pd.read_csv(tmp_path / "Megeath_YSOs.csv")
+    first = query_match_service(service.url, "megeath", reference["RAJ2000"][:5], reference["DEJ2000"][:5])
+    assert first["reference_row"].tolist() == [0, 1, 2, 3, 4]
+
+    reference.iloc[3:].to_csv(tmp_path / "Megeath_YSOs.csv", index=False)
+    os.utime(tmp_path / "Megeath_YSOs.csv", ns=(0, 10 ** 9))
+    second = query_match_service(service.url, "megeath", reference["RAJ2000"][:5], reference["DEJ2000"][:5])
+
+    assert second["query_row"].tolist() == [3, 4]
+    assert service.health()["references"]["megeath"]["n_rows"] == len(reference) - 3
+
+    with pytest.raises(RuntimeError, match="error 404: Unknown reference"):
+        query_match_service(service.url, "gaia", [85.0], [-2.0])
+    with pytest.raises(RuntimeError, match="error 400: Unknown columns"):
+        query_match_service(service.url, "megeath", [85.0], [-2.0], columns=["nope"])
+    # a bad column whose name mentions "reference" is still a bad request, not a missing reference
+    with pytest.raises(RuntimeError, match="error 400: Unknown columns"):
+        query_match_service(service.url, "megeath", [85.0], [-2.0], columns=["reference_id"])
+
+
+def test_unknown_reference_is_a_key_error(service):
+    """ Check that the registry lookup raises the dedicated error, which callers catching KeyError still see."""
+
+    with pytest.raises(UnknownReference, match="Available references"):
+        service.reference("gaia")
+    with pytest.raises(KeyError):
+        service.match("gaia", [85.0], [-2.0])
@@ -0,0 +1,374 @@
+import os
+import json
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from CatMatcher.matcher import StiltsMatcher
+from CatMatcher.catalog_io import read_fits_table, fits_to_dataframe
+from CatMatcher.transforms import TransformPipeline, ScaleUnits, RotateFrame
+
+DATA_DIR = Path(__file__).resolve().parents[1] / "Data"
+
+
+def generate_example_matcher(path, **kwargs):
+    """ Generate a matcher (native engine unless specified otherwise) for a copy of the example files at the given
+    path."""
+
+    shutil.copytree(DATA_DIR / "example_files", path, dirs_exist_ok=True)
+
+    return StiltsMatcher(file_list=["Disks_NGC2024.csv", "Megeath_YSOs.csv", "Nemesis_YSOs_OrionB.csv"],
+                         file_path=str(path), match_radius=1,
+                         match_values=["RAJ2000 DEJ2000", "RAJ2000 DEJ2000", "RA DE"],
+                         suffix_list=["Disks", "Megeath", "Nemesis"], **{"engine": "native", **kwargs})
+
+
+def test_sweep_radius_agrees_with_single_matches(tmp_path):
+    """ Check that the one-pass radius sweep reports the same number of matches as individual runs per radius."""
+
+    matcher = generate_example_matcher(tmp_path, join_mode="default")
+    radii = [0.3, 1.0, 2.5]
+    sweep = matcher.sweep_radius(radii)
+
+    for radius in radii:
+        matcher.match_radius = radius
+        matcher.perform_Nmatch()
+        matched = pd.read_csv(tmp_path / "CatMatcher_cwd" / "matches" / "matched.csv")
+
+        assert sweep[radius]["n_matches"] == len(matched)
+        assert sum(sweep[radius]["group_sizes"].values()) == len(matched)
+
+
+def test_sweep_radius_counts_grow_with_radius(tmp_path):
+    """ Check that the pair counts per table combination never decrease for larger radii."""
+
+    matcher = generate_example_matcher(tmp_path)
+    sweep = matcher.sweep_radius([0.5, 1.0, 2.0])
+
+    for pair, count in sweep[0.5]["pair_counts"].items():
+        assert count <= sweep[1.0]["pair_counts"][pair] <= sweep[2.0]["pair_counts"][pair]
+    assert ("Disks", "Megeath") in sweep[1.0]["pair_counts"]
+
+
+@pytest.mark.parametrize("settings", [{"matcher": "skyerr"}, {"multimode": "pairs"}])
+def test_sweep_radius_rejects_unsupported_settings(tmp_path, settings):
+    """ Check that the sweep refuses matchers and modes it cannot reproduce instead of silently running a sky group
+    match."""
+
+    matcher = generate_example_matcher(tmp_path, **settings)
+
+    with pytest.raises(ValueError, match="radius sweep"):
+        matcher.sweep_radius([0.5, 1.0])
+
+
+def test_native_engine_reuses_index_cache(tmp_path):
+    """ Check that a second run opens the cached indexes instead of writing new ones, with identical results."""
+
+    matcher = generate_example_matcher(tmp_path)
+    matcher.perform_Nmatch()
+    first = pd.read_csv(tmp_path / "CatMatcher_cwd" / "matches" / "matched.csv")
+    entries = sorted(os.listdir(tmp_path / "CatMatcher_cwd" / "index_cache"))
+
+    matcher.perform_Nmatch()
+    second = pd.read_csv(tmp_path / "CatMatcher_cwd" / "matches" / "matched.csv")
+
+    assert len([e for e in entries if not e.startswith(".")]) == 3
+    assert sorted(os.listdir(tmp_path / "CatMatcher_cwd" / "index_cache")) == entries
+    assert first.equals(second)
+
+
+def test_stage_inputs_reused_until_source_changes(tmp_path):
+    """ Check that text inputs are converted only once, and again after the content of the source changed."""
+
+    matcher = generate_example_matcher(tmp_path, engine="stilts", stage_inputs=True)
+    files, formats, conversions = matcher._stage_inputs("../../")
+
+    assert formats == ["colfits"] * 3
+    assert all(file.startswith("../staged/") for file in files)
+    assert [c["out"] for c in conversions] == files
+    # every pending conversion writes to its own temporary file, also for jobs staging the same inputs concurrently
+    other = matcher._stage_inputs("../../")[2]
+    assert all(c["part"].startswith(c["out"] + ".") and c["part"] != o["part"] for c, o in zip(conversions, other))
+
+    # pretend that STILTS ran the conversion
+    for file in files:
+        (tmp_path / "CatMatcher_cwd" / "staged" / os.path.basename(file)).write_bytes(b"")
+    assert matcher._stage_inputs("../../")[2] == []
+
+    with open(tmp_path / "Disks_NGC2024.csv", "a") as f:
+        f.write('*,"NEW    ",85.0,-1.9,1.0,0.1,1.0,0.1,99,detected\n')
+    os.utime(tmp_path / "Disks_NGC2024.csv", (0, 0))
+
+    new_files, _, conversions = matcher._stage_inputs("../../")
+    assert len(conversions) == 1 and new_files[0] != files[0]
+    assert not os.path.exists(tmp_path / "CatMatcher_cwd" / "staged" / os.path.basename(files[0]))
+
+
+def test_match_log_agrees_with_output(tmp_path):
+    """ Check that the native run log is consistent with the written output, and that the statistics computed from a
+    STILTS output file agree with it."""
+
+    matcher = generate_example_matcher(tmp_path)
+    matcher.perform_Nmatch()
+    matched = pd.read_csv(tmp_path / "CatMatcher_cwd" / "matches" / "matched.csv")
+    with open(tmp_path / "CatMatcher_cwd" / "matches" / "matched_log.json") as f:
+        log = json.load(f)
+
+    statistics = log["statistics"]
+    assert log["parameters"]["match_radius"] == 1
+    assert statistics["n_output_rows"] == len(matched)
+    assert sum(statistics["group_sizes"].values()) == len(matched)
+    assert sum(statistics["separation_histogram"]["counts"]) > 0
+    assert statistics["separation_max"] <= 1
+    for suffix, counts in statistics["tables"].items():
+        assert counts["matched"] == matched[f"RAJ2000_{suffix}" if suffix != "Nemesis" else "RA"].notna().sum()
+        assert counts["matched"] + counts["unmatched"] == counts["input_rows"]
+    assert [p["phase"] for p in log["phase_times"]][-1] == "statistics"
+
+    # the reference output of STILTS for the same configuration
+    shutil.copy(DATA_DIR / "matches" / "matched.csv", tmp_path / "CatMatcher_cwd" / "matches" / "matched.csv")
+    stilts_statistics = json.loads(json.dumps(matcher._stilts_output_statistics()))
+    assert stilts_statistics["tables"] == statistics["tables"]
+    assert stilts_statistics["group_sizes"] == statistics["group_sizes"]
+    # both engines log the separations between every two entries of an output row
+    assert stilts_statistics["separation_histogram"]["counts"] == statistics["separation_histogram"]["counts"]
+    for key in ("separation_median", "separation_max"):
+        assert stilts_statistics[key] == pytest.approx(statistics[key], abs=1e-3)
+    assert abs(stilts_statistics["separation_max"] - statistics["separation_max"]) < 1e-6
+
+
+def test_match_log_separations_agree_between_engines(tmp_path):
+    """ Check that a chain group (A-B and B-C within the radius, A-C not) logs the same separations for the native
+    run and for the statistics of a STILTS output, including the A-C separation."""
+
+    for name, ra in (("a.csv", 85.0), ("b.csv", 85.0 + 0.8 / 3600), ("c.csv", 85.0 + 1.6 / 3600)):
+        pd.DataFrame({"RA": [ra], "DEC": [0.0]}).to_csv(tmp_path / name, index=False)
+    matcher = StiltsMatcher(file_list=["a.csv", "b.csv", "c.csv"], file_path=str(tmp_path), match_radius=1,
+                            engine="native")
+    matcher.perform_Nmatch()
+    with open(tmp_path / "CatMatcher_cwd" / "matches" / "matched_log.json") as f:
+        statistics = json.load(f)["statistics"]
+    stilts_statistics = json.loads(json.dumps(matcher._stilts_output_statistics()))
+
+    assert statistics["group_sizes"] == {"3": 1}
+    assert sum(statistics["separation_histogram"]["counts"]) == 3
+    assert statistics["separation_max"] == pytest.approx(1.6, abs=1e-6)
+    assert stilts_statistics["separation_histogram"] == statistics["separation_histogram"]
+    assert stilts_statistics["separation_max"] == pytest.approx(statistics["separation_max"], abs=1e-6)
+
+
+def test_native_match_returns_table_without_writing(tmp_path):
+    """ Check that the joined table is returned in memory, equal to the written output, and that nothing is written
+    with write_output=False."""
+
+    matcher = generate_example_matcher(tmp_path)
+    matcher.perform_Nmatch(log_file=False)
+    written = pd.read_csv(tmp_path / "CatMatcher_cwd" / "matches" / "matched.csv")
+
+    matcher.output_file_name = "in_memory.csv"
+    table = matcher.perform_Nmatch(log_file=False, return_table="pandas", write_output=False)
+    records = matcher.perform_Nmatch(log_file=False, return_table="numpy", write_output=False)
+
+    assert not (tmp_path / "CatMatcher_cwd" / "matches" / "in_memory.csv").exists()
+    pd.testing.assert_frame_equal(table.reset_index(drop=True), written, check_dtype=False)
+    assert records.dtype.names == tuple(written.columns) and len(records) == len(written)
+
+
+def test_native_skyerr_with_constant_errors_equals_sky(tmp_path):
+    """ Check that skyerr with every error radius at half the match radius gives the sky match, in group and pairs
+    mode."""
+
+    for file in ["Disks_NGC2024.csv", "Megeath_YSOs.csv", "Nemesis_YSOs_OrionB.csv"]:
+        table = pd.read_csv(DATA_DIR / "example_files" / file)
+        table["ERR"] = 0.5
+        (tmp_path / "errors").mkdir(exist_ok=True)
+        table.to_csv(tmp_path / "errors" / file, index=False)
+
+    for multimode in ["group", "pairs"]:
+        sky = generate_example_matcher(tmp_path / "sky", multimode=multimode, join_mode="default")
+        skyerr = StiltsMatcher(file_list=sky.file_list, file_path=str(tmp_path / "errors"), match_radius=1,
+                               match_values=["RAJ2000 DEJ2000 ERR", "RAJ2000 DEJ2000 ERR", "RA DE ERR"],
+                               suffix_list=sky.suffix_list, engine="native", matcher="skyerr", multimode=multimode,
+                               join_mode="default")
+        expected = sky.perform_Nmatch(log_file=False, return_table="pandas", write_output=False)
+        result = skyerr.perform_Nmatch(log_file=False, return_table="pandas", write_output=False)
+
+        assert len(result) > 0
+        pd.testing.assert_frame_equal(result.drop(columns=[c for c in result if c.startswith("ERR")]), expected)
+
+
+def test_pairs_mode_reference_and_join_modes(tmp_path):
+    """ Check the native pairs mode with a reference table and per-table join modes, and their STILTS parameters."""
+
+    matcher = generate_example_matcher(tmp_path, multimode="pairs", iref=2, join_mode=["default", "always", "match"])
+    table = matcher.perform_Nmatch(log_file=False, return_table="pandas", write_output=False)
+
+    # one row per matched Megeath row, each with a Nemesis match (join "match" wins over "always")
+    assert table["Seq"].notna().all() and table["Seq"].is_unique
+    assert len(table) == table["RA"].notna().sum() > 0
+
+    params, _ = matcher._N_match_params("data/", "staged/", "out/")
+    assert params["iref"] == 2
+    assert [params[f"join{idx}"] for idx in (1, 2, 3)] == ["default", "always", "match"]
+
+
+def test_invalid_reference_and_join_modes(tmp_path):
+    """ Check that iref outside the file list and join mode lists of the wrong length are rejected."""
+
+    with pytest.raises(ValueError, match="iref"):
+        generate_example_matcher(tmp_path, multimode="pairs", iref=4)
+    with pytest.raises(ValueError, match="join_mode"):
+        generate_example_matcher(tmp_path, join_mode=["default", "match"])
+
+
+def test_column_pruning_in_commands_and_native_output(tmp_path):
+    """ Check that kept input columns (always with the match columns) and output columns become keepcols filters of
+    STILTS, and that the native engine gives the pruned subset of the full output, with consistent statistics."""
+
+    full = generate_example_matcher(tmp_path).perform_Nmatch(log_file=False, return_table="pandas",
+                                                             write_output=False)
+    matcher = generate_example_matcher(tmp_path, keep_columns=["Name", "Seq Kmag", None],
+                                       input_command="addcol one 1", output_command="sort Seq")
+
+    params, _ = matcher._N_match_params("data/", "staged/", "out/")
+    assert params["icmd1"] == 'addcol one 1; keepcols "RAJ2000 DEJ2000 Name"'
+    assert params["icmd2"] == 'addcol one 1; keepcols "RAJ2000 DEJ2000 Seq Kmag"'
+    assert params["icmd3"] == "addcol one 1" and params["ocmd"] == "sort Seq"
+    matcher.build_N_match()
+    command = (tmp_path / "CatMatcher_cwd" / "scripts" / "Nmatch_commands").read_text()
+    assert "values1='RAJ2000 DEJ2000' icmd1='addcol one 1; keepcols \"RAJ2000 DEJ2000 Name\"' \\\n" in command
+    assert command.endswith("ocmd='sort Seq'")
+
+    table = matcher.perform_Nmatch(return_table="pandas")
+    assert list(table.columns[:7]) == ["RAJ2000_Disks", "DEJ2000_Disks", "Name", "RAJ2000_Megeath", "DEJ2000_Megeath",
+                                       "Seq", "Kmag"]
+    assert len(table.columns) == 7 + len(pd.read_csv(tmp_path / "Nemesis_YSOs_OrionB.csv", nrows=0).columns)
+    pd.testing.assert_frame_equal(table, full[table.columns])
+
+    with open(tmp_path / "CatMatcher_cwd" / "matches" / "matched_log.json") as f:
+        statistics = json.load(f)["statistics"]
+    assert json.loads(json.dumps(matcher._stilts_output_statistics()))["tables"] == statistics["tables"]
+
+    matcher = generate_example_matcher(tmp_path, keep_columns=["", "Seq", "Internal_ID"],
+                                       output_columns="Seq Internal_ID RA")
+    assert matcher._N_match_params("data/", "staged/", "out/")[0]["ocmd"] == 'keepcols "Seq Internal_ID RA"'
+    table = matcher.perform_Nmatch(log_file=False, return_table="pandas", write_output=False)
+    pd.testing.assert_frame_equal(table, full[["Seq", "Internal_ID", "RA"]])
+
+    with pytest.raises(ValueError, match="keep_columns"):
+        generate_example_matcher(tmp_path, keep_columns=["Name", "Seq"])
+
+
+def test_native_match_with_transforms_equals_untransformed(tmp_path):
+    """ Check that a table given in galactic coordinates (radians) matches like the original, with the transformed
+    positions cached under their own key and staged for STILTS."""
+
+    expected = generate_example_matcher(tmp_path / "plain", join_mode="default").perform_Nmatch(
+        return_table="pandas", write_output=False)
+
+    matcher = generate_example_matcher(tmp_path / "galactic", join_mode="default")
+    megeath = pd.read_csv(tmp_path / "galactic" / "Megeath_YSOs.csv")
+    pipeline = TransformPipeline([RotateFrame("icrs", "galactic")])
+    l, b, _ = pipeline.apply(megeath["RAJ2000"], megeath["DEJ2000"])
+    megeath["RAJ2000"], megeath["DEJ2000"] = np.radians(l), np.radians(b)
+    megeath.to_csv(tmp_path / "galactic" / "Megeath_YSOs.csv", index=False)
+
+    matcher.transforms = [None, TransformPipeline([ScaleUnits(ra_unit="rad"), RotateFrame("galactic")]), None]
+    result = matcher.perform_Nmatch(return_table="pandas", write_output=False)
+    pd.testing.assert_frame_equal(result, expected, check_exact=False, rtol=1e-9)
+    assert len(os.listdir(tmp_path / "galactic" / "CatMatcher_cwd" / "index_cache")) == 3 + 1  # + digest memo
+
+    matcher.engine = "stilts"
+    files, formats, conversions = matcher._stage_inputs("../../")
+    with open(tmp_path / "galactic" / "CatMatcher_cwd" / "staged" / os.path.basename(files[1]), "rb") as f:
+        staged = fits_to_dataframe(*read_fits_table(f))
+    assert formats == ["csv", "fits", "csv"] and conversions == []
+    assert np.allclose(staged["RAJ2000"], pd.read_csv(tmp_path / "plain" / "Megeath_YSOs.csv")["RAJ2000"])
+
+
+def test_result_cache_skips_identical_runs(tmp_path, monkeypatch):
+    """ Check that an unchanged re-run restores the stored output without matching, and that changed settings,
+    changed inputs and invalidation lead to a new match."""
+
+    matcher = generate_example_matcher(tmp_path, use_result_cache=True, result_cache_size=100)
+    matches = tmp_path / "CatMatcher_cwd" / "matches"
+    first = matcher.perform_Nmatch(return_table="pandas")
+    expected = pd.read_csv(matches / "matched.csv")
+
+    runs = []
+    original = StiltsMatcher._run_Nmatch
+    monkeypatch.setattr(StiltsMatcher, "_run_Nmatch", lambda self, *args: runs.append(args) or original(self, *args))
+
+    os.remove(matches / "matched.csv")
+    second = matcher.perform_Nmatch(return_table="pandas")
+    assert runs == []
+    pd.testing.assert_frame_equal(second, first)
+    pd.testing.assert_frame_equal(pd.read_csv(matches / "matched.csv"), expected)
+    assert (matches / "matched_log.json").exists()
+
+    matcher.match_radius = 2
+    matcher.perform_Nmatch()
+    assert len(runs) == 1
+
+    matcher.match_radius = 1
+    matcher.perform_Nmatch()
+    assert len(runs) == 1
+
+    assert matcher.invalidate_result_cache() == 1
+    matcher.perform_Nmatch()
+    assert len(runs) == 2
+
+    with open(tmp_path / "Disks_NGC2024.csv", "a") as f:
+        f.write('*,"NEW    ",85.0,-1.9,1.0,0.1,1.0,0.1,99,detected\n')
+    matcher.perform_Nmatch()
+    assert len(runs) == 3
+    assert matcher.invalidate_result_cache(all_entries=True) == 3
+
+
+def test_result_cache_key_ignores_runtime_settings(tmp_path):
+    """ Check that only settings that change the output change the result cache key."""
+
+    matcher = generate_example_matcher(tmp_path, use_result_cache=True)
+    key = matcher._result_cache()[1]
+
+    for name, value in [("n_workers", 3), ("chunk_size", 10), ("executor", "direct"), ("timeout", 60),
+                        ("runner", "sequential"), ("jvm_heap", "2G"), ("disk", True), ("progress", "none")]:
+        setattr(matcher, name, value)
+    assert matcher._result_cache()[1] == key
+
+    for name, value in [("match_radius", 2), ("fixcols", "all"), ("join_mode", "always"), ("ofmt", "votable")]:
+        original = getattr(matcher, name)
+        setattr(matcher, name, value)
+        assert matcher._result_cache()[1] != key
+        setattr(matcher, name, original)
+
+
+def test_checkpointed_match_resumes_and_equals_plain(tmp_path, monkeypatch, capsys):
+    """ Check that an interrupted checkpointed match resumes from its tiles, gives the output of a plain match and
+    removes the tiles at the end."""
+
+    expected = generate_example_matcher(tmp_path / "plain", join_mode="default").perform_Nmatch(
+        return_table="pandas", write_output=False)
+
+    matcher = generate_example_matcher(tmp_path / "tiled", join_mode="default", checkpoint_tiles=4, n_workers=1)
+    tile_dir = tmp_path / "tiled" / "CatMatcher_cwd" / "matches" / "matched_tiles"
+
+    def crash(*args):
+        raise KeyboardInterrupt()
+
+    monkeypatch.setattr("CatMatcher.matcher.group_members", crash)
+    with pytest.raises(KeyboardInterrupt):
+        matcher.perform_Nmatch()
+    assert json.loads((tile_dir / "manifest.json").read_text())["tiles"][0]["done"]
+    monkeypatch.undo()
+
+    capsys.readouterr()
+    result = matcher.perform_Nmatch(return_table="pandas")
+    assert "0 tiles searched" in capsys.readouterr().out
+    pd.testing.assert_frame_equal(result, expected)
+    assert not tile_dir.exists()
+    with pytest.raises(ValueError, match="checkpoint"):
+        generate_example_matcher(tmp_path / "tiled", engine="stilts", checkpoint_tiles=4).perform_Nmatch()
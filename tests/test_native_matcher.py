@@ -0,0 +1,152 @@
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from CatMatcher.matcher import StiltsMatcher
+from CatMatcher.native_matcher import (radec_to_xyz, arcsec_to_chord, chord_to_arcsec, find_sky_pairs, group_members,
+                                       select_joined_rows, output_column_names, find_skyerr_pairs, pair_members,
+                                       reference_pairs)
+
+DATA_DIR = Path(__file__).resolve().parents[1] / "Data"
+
+
+def generate_groups(join_modes):
+    """ Match three small tables with a 1 arcsec radius and return the selected group memberships."""
+
+    ra = [np.array([10.0, 20.0, 30.0]), np.array([10.0 + 0.5 / 3600, 40.0]), np.array([10.0, 30.0 + 0.2 / 3600])]
+    dec = [np.array([0.0, 0.0, 0.0]), np.array([0.0, 0.0]), np.array([0.3 / 3600, 0.0])]
+    xyz_list = [radec_to_xyz(r, d) for r, d in zip(ra, dec)]
+
+    first, second, _ = find_sky_pairs(xyz_list, 1.0)
+    members = group_members([len(xyz) for xyz in xyz_list], first, second, xyz_list)
+    return select_joined_rows(members, join_modes)
+
+
+def test_chord_conversion_roundtrip():
+    """ Check that converting an angular distance to a chord length and back is lossless."""
+
+    radii = np.array([0.01, 1.0, 3600.0, 648000.0])
+    assert np.allclose(chord_to_arcsec(arcsec_to_chord(radii)), radii)
+
+
+def test_find_sky_pairs_across_ra_wrap():
+    """ Check that sources on either side of RA=0 are found as a pair, with the correct separation."""
+
+    xyz_list = [radec_to_xyz([359.9999], [0.0]), radec_to_xyz([0.0001], [0.0])]
+    first, second, sep = find_sky_pairs(xyz_list, 1.0)
+
+    assert list(first) == [0] and list(second) == [1]
+    assert sep[0] == pytest.approx(0.72, rel=1e-6)
+
+
+def test_group_members_join_modes():
+    """ Check that the join modes select the same groups as the STILTS joinN parameters."""
+
+    assert generate_groups(["default"] * 3).tolist() == [[0, 0, 0], [2, -1, 1]]
+    assert generate_groups(["match"] * 3).tolist() == [[0, 0, 0]]
+    assert generate_groups(["default", "nomatch", "default"]).tolist() == [[2, -1, 1]]
+    assert generate_groups(["always", "default", "default"]).tolist() == [[0, 0, 0], [1, -1, -1], [2, -1, 1]]
+
+
+def test_group_members_one_row_per_table():
+    """ Check that a group never holds two rows of the same table, and that the row closest to the group is kept."""
+
+    xyz_list = [radec_to_xyz([10.0, 10.0 + 0.9 / 3600], [0.0, 0.0]), radec_to_xyz([10.0 + 0.1 / 3600], [0.0])]
+    first, second, _ = find_sky_pairs(xyz_list, 1.0)
+    members = group_members([2, 1], first, second, xyz_list)
+
+    assert members.tolist() == [[0, 0], [1, -1]]
+
+
+def test_output_column_names_fixcols():
+    """ Check the renaming of the output columns for all fixcols options."""
+
+    columns = [["RA", "DEC", "Name"], ["RA", "DEC", "Flux"]]
+
+    assert output_column_names(columns, ["a", "b"], "dups") == [["RA_a", "DEC_a", "Name"], ["RA_b", "DEC_b", "Flux"]]
+    assert output_column_names(columns, ["a", "b"], "all")[1] == ["RA_b", "DEC_b", "Flux_b"]
+    assert output_column_names(columns, ["a", "b"], "none") == columns
+
+
+def test_native_engine_reproduces_stilts_output(tmp_path):
+    """ Check that the native engine finds the same matches and output columns as the STILTS run stored in
+    Data/matches for the example files."""
+
+    shutil.copytree(DATA_DIR / "example_files", tmp_path, dirs_exist_ok=True)
+
+    matcher = StiltsMatcher(file_list=["Disks_NGC2024.csv", "Megeath_YSOs.csv", "Nemesis_YSOs_OrionB.csv"],
+                            file_path=str(tmp_path), match_radius=1,
+                            match_values=["RAJ2000 DEJ2000", "RAJ2000 DEJ2000", "RA DE"],
+                            suffix_list=["Disks", "Megeath", "Nemesis"], engine="native")
+    matcher.perform_Nmatch()
+
+    native = pd.read_csv(tmp_path / "CatMatcher_cwd" / "matches" / "matched.csv")
+    stilts = pd.read_csv(DATA_DIR / "matches" / "matched.csv")
+
+    assert list(native.columns) == list(stilts.columns)
+    assert sorted(zip(native.recno, native.Seq, native.Internal_ID)) == \
+           sorted(zip(stilts.recno, stilts.Seq, stilts.Internal_ID))
+
+
+def test_find_skyerr_pairs_matches_brute_force():
+    """ Check the bucketed variable-radius search against all pairwise separations, with errors spanning four orders
+    of magnitude and some missing errors."""
+
+    rng = np.random.default_rng(1)
+    ra = [10 + rng.random(n) * 0.02 for n in (300, 200)]
+    dec = [rng.random(n) * 0.02 for n in (300, 200)]
+    err = [10 ** rng.uniform(-2, 2, n) for n in (300, 200)]
+    err[0][:10] = np.nan
+    xyz_list = [radec_to_xyz(r, d) for r, d in zip(ra, dec)]
+
+    first, second, sep = find_skyerr_pairs(xyz_list, err)
+
+    separation = chord_to_arcsec(np.linalg.norm(xyz_list[0][:, None] - xyz_list[1][None], axis=2))
+    expected = np.argwhere(separation <= err[0][:, None] + err[1][None])
+    found = np.column_stack((first, second - 300))
+    assert sorted(map(tuple, found)) == sorted(map(tuple, expected))
+    assert np.allclose(sep, separation[first, second - 300])
+
+
+def test_pair_members_best_match():
+    """ Check that every reference row gets its lowest-score match per table, with ties going to the lower row."""
+
+    # reference table 1 (3 rows), table 0 (2 rows), table 2 (2 rows)
+    n_rows = [2, 3, 2]
+    first = np.array([0, 1, 0, 2, 2, 3])
+    second = np.array([2, 2, 3, 5, 6, 5])
+    score = np.array([0.5, 0.2, 0.1, 0.3, 0.3, 0.9])
+
+    members = pair_members(n_rows, first, second, score, iref=1)
+
+    # a non-reference row may be the best match of several reference rows
+    assert members.tolist() == [[1, 0, 0], [0, 1, 0], [-1, 2, -1]]
+    assert select_joined_rows(members, ["default"] * 3).tolist() == [[1, 0, 0], [0, 1, 0]]
+
+    # unused rows of tables with join mode "always" are appended
+    members = pair_members(n_rows, first, second, score, iref=1, unmatched_tables=[2])
+    assert members[3:].tolist() == [[-1, -1, 1]]
+    assert select_joined_rows(members, ["default", "default", "always"]).tolist() == [[1, 0, 0], [0, 1, 0],
+                                                                                      [-1, -1, 1]]
+
+
+def test_reference_pairs_are_nearest_neighbours():
+    """ Check that every reference row is paired with its nearest row within the radius in each other table."""
+
+    rng = np.random.default_rng(2)
+    sizes = (500, 80, 120)
+    xyz_list = [radec_to_xyz(10 + rng.random(n) * 0.05, rng.random(n) * 0.05) for n in sizes]
+
+    first, second, sep = reference_pairs(xyz_list, 0, 10.0)
+
+    for t, offset in ((1, 500), (2, 580)):
+        separation = chord_to_arcsec(np.linalg.norm(xyz_list[0][:, None] - xyz_list[t][None], axis=2))
+        nearest = np.where(separation.min(axis=1) <= 10.0, separation.argmin(axis=1), -1)
+        in_table = (second >= offset) & (second < offset + sizes[t])
+        found = np.full(500, -1)
+        found[first[in_table]] = second[in_table] - offset
+        assert np.array_equal(found, nearest)
+        assert np.allclose(sep[in_table], separation[first[in_table], second[in_table] - offset])
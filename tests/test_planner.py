@@ -0,0 +1,81 @@
+import io
+import json
+
+import pandas as pd
+
+from CatMatcher.catalog_io import write_fits_table
+from CatMatcher.matcher import StiltsMatcher
+from CatMatcher.planner import estimate_table, healpix_tuning, plan_resources
+from CatMatcher.synthetic import generate_catalogs, write_catalogs
+
+
+def test_estimate_table_from_sample(tmp_path):
+    """ Check that the row count of a csv file is estimated from a small sample within a few percent."""
+
+    file_list = write_catalogs(generate_catalogs(20_000, 1, seed=0), str(tmp_path))
+    estimate = estimate_table(str(tmp_path / file_list[0]), "csv", sample_rows=200)
+
+    assert estimate.method == "sample"
+    assert estimate.n_columns == 5
+    assert abs(estimate.n_rows - 20_000) < 0.05 * 20_000
+
+
+def test_estimate_table_from_fits_header(tmp_path):
+    """ Check that FITS and colfits tables are estimated exactly from their header, also behind a primary HDU that
+    holds data."""
+
+    table = pd.DataFrame({"RA": [1.0, 2.0, 3.0], "DEC": [-1.0, 0.0, 1.0], "ID": [1, 2, 3]})
+    for fmt in ["fits", "colfits"]:
+        stream = io.BytesIO()
+        write_fits_table(table, stream, colfits=fmt == "colfits")
+        (tmp_path / f"table.{fmt}").write_bytes(stream.getvalue())
+
+        # the same table behind a primary image of one data block, whose bytes happen to look like header cards
+        primary = "".join(f"{key:<8}= {value:>20}".ljust(80) for key, value in
+                          [("SIMPLE", "T"), ("BITPIX", 8), ("NAXIS", 1), ("NAXIS1", 2880), ("EXTEND", "T")])
+        primary = (primary + "END".ljust(80)).ljust(2880).encode("ascii") + "END".ljust(80).encode("ascii") * 36
+        (tmp_path / f"image.{fmt}").write_bytes(primary + stream.getvalue()[2880:])
+
+        for name in ["table", "image"]:
+            estimate = estimate_table(str(tmp_path / f"{name}.{fmt}"), fmt)
+
+            assert estimate.method == "header"
+            assert (estimate.n_rows, estimate.n_columns, estimate.bytes_per_row) == (3, 3, 24.0)
+
+
+def test_healpix_tuning_decreases_with_radius():
+    """ Check that larger radii give coarser sky bins."""
+
+    levels = [healpix_tuning(radius) for radius in (0.1, 1, 10, 3600)]
+    assert levels == sorted(levels, reverse=True)
+    assert 0 <= levels[-1] and levels[0] <= 20
+
+
+def test_plan_switches_to_disk_when_memory_is_short(tmp_path):
+    """ Check the choice of table storage and runner for the same input and different memory limits."""
+
+    files = [str(tmp_path / file) for file in write_catalogs(generate_catalogs(5_000, 2, seed=0), str(tmp_path))]
+
+    roomy = plan_resources(files, ["csv", "csv"], 1, memory_mb=64_000)
+    assert not roomy.disk and roomy.runner == "sequential" and roomy.tuning == healpix_tuning(1)
+
+    tight = plan_resources(files, ["csv", "csv"], 1, memory_mb=100)
+    assert tight.disk
+
+
+def test_auto_plan_in_command(tmp_path):
+    """ Check that the planned settings end up in the command file and that the plan is recorded."""
+
+    file_list = write_catalogs(generate_catalogs(1_000, 2, seed=0), str(tmp_path))
+    matcher = StiltsMatcher(file_list=file_list, file_path=str(tmp_path), match_radius=1, match_values="RA DE",
+                            auto_plan=True, max_memory="100M", tuning=7)
+    matcher.build_N_match()
+
+    command = (tmp_path / "CatMatcher_cwd" / "scripts" / "Nmatch_commands").read_text()
+    with open(tmp_path / "CatMatcher_cwd" / "scripts" / "Nmatch_commands_plan.json") as f:
+        plan = json.load(f)
+
+    assert f"stilts -Xmx{plan['jvm_heap']} -disk tmatchn" in command
+    assert " tuning=7 " in command  # explicitly set values are kept
+    assert f"runner={plan['runner']}" in command
+    assert plan["tables"][0]["n_rows"] > 0
@@ -0,0 +1,44 @@
+import numpy as np
+
+from CatMatcher.native_matcher import radec_to_xyz, find_sky_pairs
+from CatMatcher.sharding import declination_zones, zone_of, find_sky_pairs_sharded
+
+
+def generate_tables(seed=42):
+    """ Generate three overlapping random catalogs in a small sky patch around the celestial equator."""
+
+    rng = np.random.default_rng(seed)
+    ra = rng.uniform(84, 86, 2000)
+    dec = rng.uniform(-1, 1, 2000)
+
+    xyz_list = []
+    for n in (2000, 1500, 800):
+        scatter = rng.normal(0, 0.5 / 3600, (2, n))
+        xyz_list.append(radec_to_xyz(ra[:n] + scatter[0], dec[:n] + scatter[1]))
+    return xyz_list
+
+
+def test_declination_zones_cover_the_sky():
+    """ Check that the zone edges span the full declination range and assign every row to a zone."""
+
+    dec = [np.linspace(-30, 30, 100), np.array([np.nan, 89.9])]
+    edges = declination_zones(dec, 4)
+
+    assert edges[0] == -90 and edges[-1] == 90
+    zones = zone_of(np.concatenate(dec), edges)
+    assert zones[-2] == -1
+    assert set(zones[np.isfinite(np.concatenate(dec))]) == set(range(len(edges) - 1))
+
+
+def test_sharded_pairs_identical_to_unsharded():
+    """ Check that the pair list of a sharded run is identical to the unsharded one, including boundary pairs."""
+
+    xyz_list = generate_tables()
+    first, second, sep = find_sky_pairs(xyz_list, 1.0)
+    order = np.lexsort((second, first))
+
+    sharded = find_sky_pairs_sharded(xyz_list, 1.0, n_shards=7, n_workers=2)
+
+    assert np.array_equal(sharded[0], first[order])
+    assert np.array_equal(sharded[1], second[order])
+    assert np.allclose(sharded[2], sep[order])
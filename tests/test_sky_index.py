@@ -0,0 +1,84 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from CatMatcher.caching import IndexCache
+from CatMatcher.native_matcher import radec_to_xyz, chord_to_arcsec
+from CatMatcher.sky_index import SkyIndex
+
+DATA_DIR = Path(__file__).resolve().parents[1] / "Data" / "example_files"
+
+
+@pytest.fixture(scope="module")
+def catalog():
+    """ The Megeath example catalog, queried with the positions of the NGC 2024 disks."""
+
+    reference = pd.read_csv(DATA_DIR / "Megeath_YSOs.csv")
+    query = pd.read_csv(DATA_DIR / "Disks_NGC2024.csv")
+    index = SkyIndex.from_catalog(DATA_DIR / "Megeath_YSOs.csv", "csv", ["RAJ2000", "DEJ2000"])
+    separations = chord_to_arcsec(np.linalg.norm(radec_to_xyz(query["RAJ2000"], query["DEJ2000"])[:, None] -
+                                                 radec_to_xyz(reference["RAJ2000"], reference["DEJ2000"])[None],
+                                                 axis=2))
+    return index, query, separations
+
+
+def test_cone_search_like_brute_force(catalog):
+    """ Check that batched cone searches with a common and with per-cone radii find all rows inside the cones."""
+
+    index, query, separations = catalog
+
+    query_rows, rows, sep = index.cone_search(query["RAJ2000"], query["DEJ2000"], radius=60)
+    expected_query, expected_rows = np.nonzero(separations <= 60)
+    assert sorted(zip(query_rows, rows)) == sorted(zip(expected_query, expected_rows))
+    np.testing.assert_allclose(sep, separations[query_rows, rows], atol=1e-6)
+    assert (np.diff(query_rows) >= 0).all()
+
+    radius = np.linspace(1, 300, len(query))
+    query_rows, rows, sep = index.cone_search(query["RAJ2000"], query["DEJ2000"], radius=radius)
+    expected_query, expected_rows = np.nonzero(separations <= radius[:, None])
+    assert sorted(zip(query_rows, rows)) == sorted(zip(expected_query, expected_rows))
+    assert (sep <= radius[query_rows]).all()
+
+    with pytest.raises(ValueError):
+        index.cone_search(query["RAJ2000"], query["DEJ2000"], radius=[1, 2])
+
+
+def test_knn_like_brute_force(catalog):
+    """ Check the k nearest rows and their order, the radius limit and queries without position."""
+
+    index, query, separations = catalog
+
+    rows, sep = index.knn(query["RAJ2000"], query["DEJ2000"], k=5)
+    np.testing.assert_allclose(sep, np.sort(separations, axis=1)[:, :5], atol=1e-6)
+    np.testing.assert_allclose(separations[np.arange(len(query))[:, None], rows], sep, atol=1e-6)
+
+    rows, sep = index.knn(query["RAJ2000"], query["DEJ2000"], k=3, max_radius=20, workers=-1)
+    inside = np.sort(separations, axis=1)[:, :3] <= 20
+    assert ((rows >= 0) == inside).all()
+    assert np.isinf(sep[~inside]).all()
+
+    rows, sep = index.knn([np.nan, 85.44087], [np.nan, -1.908333], k=index.n_rows + 2)
+    assert (rows[0] == -1).all() and np.isinf(sep[0]).all()
+    assert (rows[1, -2:] == -1).all() and (rows[1, :-2] >= 0).all()
+
+    with pytest.raises(ValueError):
+        index.knn(query["RAJ2000"], query["DEJ2000"], k=0)
+
+
+def test_from_catalog_uses_index_cache(catalog, tmp_path):
+    """ Check that an index restored from the index cache answers like a freshly built one."""
+
+    index, query, _ = catalog
+    cache = IndexCache(str(tmp_path / "index_cache"))
+
+    built = SkyIndex.from_catalog(DATA_DIR / "Megeath_YSOs.csv", "csv", ["RAJ2000", "DEJ2000"], cache=cache)
+    restored = SkyIndex.from_catalog(DATA_DIR / "Megeath_YSOs.csv", "csv", ["RAJ2000", "DEJ2000"], cache=cache)
+    assert len(list((tmp_path / "index_cache").glob("[!.]*"))) == 1
+
+    for other in (built, restored):
+        np.testing.assert_array_equal(other.xyz, index.xyz)
+        for expected, result in zip(index.knn(query["RAJ2000"], query["DEJ2000"], k=4),
+                                    other.knn(query["RAJ2000"], query["DEJ2000"], k=4)):
+            np.testing.assert_array_equal(result, expected)
@@ -0,0 +1,189 @@
+import os
+import sys
+import stat
+import threading
+from functools import partial
+
+import shutil
+from pathlib import Path
+
+import pytest
+import pandas as pd
+
+import CatMatcher
+from CatMatcher.catalog_io import read_fits_table
+from CatMatcher.matcher import StiltsMatcher
+from CatMatcher.shell_helper import execute_shell_script
+from CatMatcher.stilts_runner import build_argv, parse_progress_line, run_stilts, stream_stilts
+
+DATA_DIR = Path(__file__).resolve().parents[1] / "Data"
+
+FAKE_STILTS = f"""#!{sys.executable}
+# stand-in for STILTS: prints progress lines, allocates some memory and writes the file given by out=..., or fails
+# without writing it if FAKE_STILTS_FAIL is set
+import os, sys, time
+args = dict(arg.split("=", 1) for arg in sys.argv[1:] if "=" in arg)
+print("Binning rows for table 1.......... (120ms)", file=sys.stderr, flush=True)
+buffer = bytearray(50 * 1024 ** 2)
+time.sleep(float(args.get("sleep", 0)))
+if os.environ.get("FAKE_STILTS_FAIL"):
+    print("Error: java.lang.OutOfMemoryError", file=sys.stderr)
+    sys.exit(1)
+print("Locating pairs 1-2...... (1.5s)", file=sys.stderr, flush=True)
+if "out" in args:
+    open(args["out"], "w").write("matched\\n")
+print("done")
+"""
+
+
+FAKE_STREAMING_STILTS = f"""#!{sys.executable}
+# stand-in for STILTS: writes the reference match as FITS to standard output for out=- ofmt=fits
+import sys
+import pandas as pd
+from CatMatcher.catalog_io import write_fits_table
+args = dict(arg.split("=", 1) for arg in sys.argv[1:] if "=" in arg)
+assert args["out"] == "-" and args["ofmt"] == "fits"
+print("Locating pairs 1-2...... (1.5s)", file=sys.stderr, flush=True)
+write_fits_table(pd.read_csv({str(DATA_DIR / "matches" / "matched.csv")!r}), sys.stdout.buffer)
+"""
+
+
+@pytest.fixture
+def fake_stilts(tmp_path, monkeypatch):
+    """ Put a fake `stilts` executable on the PATH and return its path."""
+
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    (bin_dir / "stilts").write_text(FAKE_STILTS)
+    os.chmod(bin_dir / "stilts", stat.S_IRWXU)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    return str(bin_dir / "stilts")
+
+
+def test_build_argv():
+    """ Check that parameters containing spaces end up as single, unquoted arguments."""
+
+    argv = build_argv("tmatchn", {"nin": 2, "values1": "RA DEC"}, jvm_options=["-Xmx2G"])
+    assert argv == ["stilts", "-Xmx2G", "tmatchn", "nin=2", "values1=RA DEC"]
+
+
+def test_parse_progress_line():
+    """ Check the extraction of phase timings from progress lines in different styles."""
+
+    assert parse_progress_line("Binning rows for table 1.......... (120ms)") == ("Binning rows for table 1", 0.12)
+    assert parse_progress_line("Elapsed time: 2.5 s") == ("Elapsed time", 2.5)
+    assert parse_progress_line("Processing table 1 of 3") is None
+
+
+def test_run_stilts_streams_and_measures(fake_stilts):
+    """ Check return code, streamed lines, parsed phase timings and recorded peak memory of a run."""
+
+    streamed = []
+    result = run_stilts(build_argv("tmatchn", {"nin": 2}), on_line=streamed.append)
+
+    assert result.returncode == 0 and not result.timed_out
+    assert result.stdout_lines == ["done"]
+    assert set(streamed) == set(result.stdout_lines + result.stderr_lines)
+    assert [phase for phase, _ in result.phase_times] == ["Binning rows for table 1", "Locating pairs 1-2"]
+    if hasattr(os, "wait4"):
+        assert result.peak_rss_mb > 50
+
+
+def test_run_stilts_timeout_and_cancel(fake_stilts):
+    """ Check that long runs are stopped by the timeout and by the cancel event."""
+
+    result = run_stilts(build_argv("tmatchn", {"sleep": 30}), timeout=0.5)
+    assert result.timed_out and result.returncode != 0 and result.wall_time < 10
+
+    cancel = threading.Event()
+    threading.Timer(0.5, cancel.set).start()
+    result = run_stilts(build_argv("tmatchn", {"sleep": 30}), cancel_event=cancel)
+    assert result.cancelled and result.wall_time < 10
+
+
+@pytest.mark.skipif(os.name != "posix", reason="needs a POSIX shell")
+def test_stream_stilts_timeout():
+    """ Check that a streamed run is stopped by the timeout and reported as timed out instead of failing."""
+
+    for _ in range(3):
+        decoded, result = stream_stilts(["sh", "-c", "sleep 30"], read_fits_table, timeout=0.5)
+        assert decoded is None and result.timed_out and result.returncode != 0 and result.wall_time < 10
+
+
+def test_perform_Nmatch_direct_executor(tmp_path, fake_stilts):
+    """ Check that the direct executor runs the match without a shell and returns the run outcome."""
+
+    matcher = StiltsMatcher(file_list=["a.csv", "b.csv"], file_path=str(tmp_path), match_radius=1,
+                            executor="direct", jvm_heap="1G")
+    result = matcher.perform_Nmatch(return_output=False)
+
+    assert result.returncode == 0
+    assert result.argv[:3] == ["stilts", "-Xmx1G", "tmatchn"]
+    assert f"out={tmp_path}/CatMatcher_cwd/matches/matched.csv" in result.argv
+    assert (tmp_path / "CatMatcher_cwd" / "matches" / "matched.csv").exists()
+
+
+@pytest.mark.parametrize("executor", ["shell", "direct"])
+def test_perform_Nmatch_failed_run_writes_no_log(tmp_path, fake_stilts, monkeypatch, executor):
+    """ Check that a failed STILTS run raises instead of logging the output an earlier run left behind."""
+
+    # the shell executor runs its script with zsh, which is not installed everywhere
+    monkeypatch.setattr(CatMatcher.matcher, "execute_shell_script", partial(execute_shell_script, shell="bash"))
+    # the shell script only executes command files ending in .txt
+    matcher = StiltsMatcher(file_list=["a.csv", "b.csv"], file_path=str(tmp_path), match_radius=1, executor=executor,
+                            command_file_name="Nmatch_commands.txt")
+    matches = tmp_path / "CatMatcher_cwd" / "matches"
+    matcher.perform_Nmatch(return_output=False, log_file=False)
+    assert (matches / "matched.csv").exists()
+
+    monkeypatch.setenv("FAKE_STILTS_FAIL", "1")
+    with pytest.raises(RuntimeError, match="return code 1: .*OutOfMemoryError"):
+        matcher.perform_Nmatch(return_output=False)
+    assert not (matches / "matched_log.json").exists()
+
+
+def test_failed_run_is_not_cached(tmp_path, fake_stilts, monkeypatch):
+    """ Check that the output of an earlier run is not stored in the result cache as the result of a failed run."""
+
+    shutil.copytree(DATA_DIR / "example_files", tmp_path, dirs_exist_ok=True)
+    matcher = StiltsMatcher(file_list=["Disks_NGC2024.csv", "Megeath_YSOs.csv", "Nemesis_YSOs_OrionB.csv"],
+                            file_path=str(tmp_path), match_radius=1,
+                            match_values=["RAJ2000 DEJ2000", "RAJ2000 DEJ2000", "RA DE"],
+                            suffix_list=["Disks", "Megeath", "Nemesis"], engine="native", use_result_cache=True)
+    matcher.perform_Nmatch()
+
+    monkeypatch.setenv("FAKE_STILTS_FAIL", "1")
+    matcher.engine, matcher.executor, matcher.match_radius = "stilts", "direct", 30
+    for _ in range(2):
+        with pytest.raises(RuntimeError, match="return code 1"):
+            matcher.perform_Nmatch(return_output=False)
+    assert len(os.listdir(tmp_path / "CatMatcher_cwd" / "result_cache")) == 2  # the 1 arcsec entry and the digest memo
+
+
+def test_perform_Nmatch_streams_table(tmp_path, monkeypatch):
+    """ Check that the match is decoded from the FITS stream of STILTS, returned, written and logged."""
+
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    (bin_dir / "stilts").write_text(FAKE_STREAMING_STILTS)
+    os.chmod(bin_dir / "stilts", stat.S_IRWXU)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("PYTHONPATH", str(Path(CatMatcher.__file__).resolve().parents[1]))
+
+    shutil.copytree(DATA_DIR / "example_files", tmp_path, dirs_exist_ok=True)
+    matcher = StiltsMatcher(file_list=["Disks_NGC2024.csv", "Megeath_YSOs.csv", "Nemesis_YSOs_OrionB.csv"],
+                            file_path=str(tmp_path), match_radius=1,
+                            match_values=["RAJ2000 DEJ2000", "RAJ2000 DEJ2000", "RA DE"],
+                            suffix_list=["Disks", "Megeath", "Nemesis"], executor="direct")
+    table = matcher.perform_Nmatch(return_output=False, return_table="pandas")
+    reference = pd.read_csv(DATA_DIR / "matches" / "matched.csv")
+    # trailing blanks of FITS strings are not significant
+    strings = [column for column in reference if reference[column].map(type).eq(str).any()]
+    reference[strings] = reference[strings].apply(lambda column: column.str.rstrip())
+
+    pd.testing.assert_frame_equal(table, reference, check_dtype=False)
+    pd.testing.assert_frame_equal(pd.read_csv(tmp_path / "CatMatcher_cwd" / "matches" / "matched.csv"), reference)
+    assert (tmp_path / "CatMatcher_cwd" / "matches" / "matched_log.json").exists()
+
+    array = matcher.perform_Nmatch(return_output=False, log_file=False, return_table="numpy", write_output=False)
+    assert len(array) == len(reference) and set(array.dtype.names) == set(reference.columns)
@@ -0,0 +1,64 @@
+import sys
+import json
+import socket
+from pathlib import Path
+
+import pytest
+
+from CatMatcher.matcher import StiltsMatcher
+from CatMatcher.stilts_server import StiltsServer
+
+STANDIN = Path(__file__).resolve().parent / "stilts_server_standin.py"
+
+
+def free_port():
+    """ Get a currently unused local port."""
+
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def server():
+    """ Run a StiltsServer backed by the local stand-in process."""
+
+    port = free_port()
+    with StiltsServer(port=port, command=[sys.executable, str(STANDIN), str(port)], startup_timeout=20) as server:
+        yield server
+
+
+def test_server_health_check(server):
+    """ Check that a started server is healthy, and an unused port is not."""
+
+    assert server.health_check()
+    assert not StiltsServer(port=free_port(), manage_process=False).health_check()
+
+
+def test_server_task_error_is_raised(server):
+    """ Check that a failing task raises a RuntimeError with the server message."""
+
+    with pytest.raises(RuntimeError, match="No such task: tmatchx"):
+        server.submit("tmatchx", {})
+
+
+def test_perform_Nmatch_on_server_with_restart(tmp_path, server):
+    """ Check that matches are sent to the warm server with absolute paths, including after the server died."""
+
+    for name in ("a.csv", "b.csv"):
+        (tmp_path / name).write_text("RA,DEC\n1,2\n")
+
+    matcher = StiltsMatcher(file_list=["a.csv", "b.csv"], file_path=str(tmp_path), match_radius=2, stage_inputs=True)
+    matcher.perform_Nmatch(server=server)
+
+    params = json.loads((tmp_path / "CatMatcher_cwd" / "matches" / "matched.csv").read_text())
+    assert params["in1"].startswith(str(tmp_path)) and params["ifmt1"] == "colfits"
+    assert Path(params["in2"]).exists()
+    assert params["params"] == "2" and params["join2"] == "match"
+
+    server._process.kill()
+    server._process.wait()
+    matcher.output_file_name = "rematched.csv"
+    matcher.perform_Nmatch(server=server)
+
+    assert (tmp_path / "CatMatcher_cwd" / "matches" / "rematched.csv").exists()
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from CatMatcher.native_matcher import radec_to_xyz, chord_to_arcsec
+from CatMatcher.synthetic import generate_catalogs, write_catalogs
+from CatMatcher.catalog_io import read_table
+
+
+def test_generate_catalogs_is_seeded():
+    """ Check that the same seed gives identical catalogs and a different seed different ones."""
+
+    first = generate_catalogs(500, 3, seed=1)
+    second = generate_catalogs(500, 3, seed=1)
+    other = generate_catalogs(500, 3, seed=2)
+
+    assert all(a.equals(b) for a, b in zip(first, second))
+    assert not first[0].equals(other[0])
+
+
+def test_generate_catalogs_overlap_and_scatter():
+    """ Check the number of common sources and the size of the positional scatter between catalogs."""
+
+    catalogs = generate_catalogs(2000, 2, overlap=0.3, scatter=0.5, seed=0)
+    assert all(len(catalog) == 2000 for catalog in catalogs)
+
+    first, second = (catalog.set_index("source_id") for catalog in catalogs)
+    common = first.index.intersection(second.index)
+    assert len(common) == 600
+
+    separation = chord_to_arcsec(np.linalg.norm(
+        radec_to_xyz(first.loc[common, "RA"], first.loc[common, "DE"]) -
+        radec_to_xyz(second.loc[common, "RA"], second.loc[common, "DE"]), axis=1))
+    # the difference of two scatters per coordinate has a standard deviation of sqrt(2) * 0.5 arcsec
+    assert np.sqrt(np.mean(separation ** 2) / 2) == pytest.approx(np.sqrt(2) * 0.5, rel=0.1)
+
+    with pytest.raises(ValueError):
+        generate_catalogs(10, 2, overlap=1.5)
+
+
+def test_write_catalogs(tmp_path):
+    """ Check the written file names and contents."""
+
+    catalogs = generate_catalogs(100, 2, seed=0)
+    file_list = write_catalogs(catalogs, str(tmp_path / "data"), prefix="orion")
+
+    assert file_list == ["orion_1.csv", "orion_2.csv"]
+    assert np.allclose(read_table(str(tmp_path / "data" / file_list[1]), "csv")["RA"], catalogs[1]["RA"])
@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from CatMatcher.tap_matcher import TapMatcher, TapError, sky_chunks
+from CatMatcher.native_matcher import radec_to_xyz, chord_to_arcsec
+from CatMatcher.synthetic import generate_catalogs, write_catalogs
+
+from tap_server_standin import TapStandin
+
+
+def generate_tap_matcher(path, n_rows=400, **kwargs):
+    """ Write a synthetic local table at the given path and return it with a remote catalog of the same field."""
+
+    local, remote = generate_catalogs(n_rows, 2, scatter=0.2, seed=3)
+    file_list = write_catalogs([local], str(path))
+    remote = remote.rename(columns={"ID": "source_id", "RA": "ra", "DE": "dec", "source_id": "true_id"})
+
+    def matcher(url):
+        return TapMatcher(file_list=file_list, file_path=str(path), match_radius=1, match_values=["RA DE"],
+                          suffix_list=["local"], fixcols="all", tap_url=url, remote_table="remote", backoff=0.01,
+                          **{"tap_chunk_size": 50, "n_workers": 3, **kwargs})
+
+    return local, remote, matcher
+
+
+def brute_force_best(local, remote, radius):
+    """ Closest remote row of every local row within the radius (-1 if none)."""
+
+    chord = np.linalg.norm(radec_to_xyz(local["RA"], local["DE"])[:, None] -
+                           radec_to_xyz(remote["ra"], remote["dec"])[None], axis=2)
+    best = chord.argmin(axis=1)
+    return np.where(chord_to_arcsec(chord.min(axis=1)) <= radius, best, -1)
+
+
+def test_sky_chunks_cover_all_rows():
+    """ Check that the chunks hold every row with a position exactly once and respect the chunk size."""
+
+    rng = np.random.default_rng(0)
+    ra, dec = rng.uniform(80, 90, 1000), rng.uniform(-5, 5, 1000)
+    dec[[3, 17]] = np.nan
+
+    chunks = sky_chunks(ra, dec, 64)
+    rows = np.concatenate(chunks)
+
+    assert all(len(chunk) <= 64 for chunk in chunks)
+    assert sorted(rows.tolist()) == sorted(set(range(1000)) - {3, 17})
+    with pytest.raises(ValueError):
+        sky_chunks(ra, dec, 0)
+
+
+def test_tap_match_equals_brute_force(tmp_path):
+    """ Check that the chunked, concurrent TAP match finds the closest remote source of every local row, in spite
+    of failed requests, and reuses the connections of the worker threads."""
+
+    local, remote, matcher = generate_tap_matcher(tmp_path)
+    with TapStandin(remote, fail_first=2) as service:
+        table = matcher(service.url).perform_TAPmatch(return_table="pandas", return_output=False)
+
+    written = pd.read_csv(tmp_path / "CatMatcher_cwd" / "matches" / "matched.csv")
+    pd.testing.assert_frame_equal(written, table, check_dtype=False)
+
+    best = brute_force_best(local, remote, 1)
+    assert len(table) == (best >= 0).sum()
+    found = dict(zip(table["ID_local"], table["source_id_remote"]))
+    assert found == {int(i): int(remote["source_id"][b]) for i, b in zip(local["ID"], best) if b >= 0}
+    assert (table["Separation"] <= 1).all()
+
+    # 8 chunks and 2 failed requests, sent over at most one connection per worker thread
+    assert len(service.requests) == 10
+    assert len(set(service.requests)) <= 3
+
+
+def test_tap_match_always_keeps_unmatched_rows(tmp_path):
+    """ Check that join_mode="always" keeps every local row, with empty remote columns if unmatched."""
+
+    local, remote, matcher = generate_tap_matcher(tmp_path, join_mode="always", find="all",
+                                                  remote_columns=["source_id", "ra", "dec"])
+    with TapStandin(remote) as service:
+        table = matcher(service.url).perform_TAPmatch(return_table="pandas", write_output=False,
+                                                      return_output=False)
+
+    assert set(table["ID_local"]) == set(local["ID"])
+    assert list(table.columns[-4:]) == ["source_id_remote", "ra_remote", "dec_remote", "Separation"]
+    assert table.loc[table["Separation"].isna(), "source_id_remote"].isna().all()
+
+
+def test_tap_match_fails_after_retries(tmp_path):
+    """ Check that a chunk failing more often than the retries allow raises a TapError."""
+
+    _, remote, matcher = generate_tap_matcher(tmp_path, retries=1)
+    with TapStandin(remote, fail_first=100) as service:
+        with pytest.raises(TapError):
+            matcher(service.url).perform_TAPmatch(return_output=False)
+
+
+def test_tap_matcher_validates_config(tmp_path):
+    """ Check that a missing service URL or more than one local table raises a ValueError."""
+
+    _, _, matcher = generate_tap_matcher(tmp_path)
+    with pytest.raises(ValueError):
+        matcher(None)
+    with pytest.raises(ValueError):
+        TapMatcher(file_list=["a.csv", "b.csv"], file_path=str(tmp_path), match_radius=1,
+                   match_values=["RA DE", "RA DE"], suffix_list=["a", "b"], tap_url="http://localhost/tap")
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from CatMatcher.transforms import TransformPipeline, ScaleUnits, RotateFrame, PropagateEpoch, xyz_to_radec
+from CatMatcher.native_matcher import radec_to_xyz, chord_to_arcsec
+
+
+def separation(ra1, dec1, ra2, dec2):
+    """ Angular separation in arcseconds."""
+
+    return chord_to_arcsec(np.linalg.norm(radec_to_xyz(ra1, dec1) - radec_to_xyz(ra2, dec2), axis=1))
+
+
+def test_galactic_reference_points():
+    """ Check the ICRS positions of the Galactic center and the north Galactic pole."""
+
+    ra, dec, _ = TransformPipeline([RotateFrame("galactic")]).apply([0.0, 123.0], [0.0, 90.0])
+
+    assert separation(ra, dec, [266.40499, 192.85948], [-28.93617, 27.12825]).max() < 0.1
+
+
+def test_frame_round_trips():
+    """ Check that rotating into every frame and back restores the positions."""
+
+    rng = np.random.default_rng(1)
+    ra, dec = rng.uniform(0, 360, 1000), np.degrees(np.arcsin(rng.uniform(-1, 1, 1000)))
+
+    for frame in ["fk5", "galactic", "ecliptic", "supergalactic"]:
+        pipeline = TransformPipeline([RotateFrame("icrs", frame), RotateFrame(frame)])
+        ra2, dec2, _ = pipeline.apply(ra, dec)
+        assert separation(ra, dec, ra2, dec2).max() < 1e-6
+
+
+def test_epoch_propagation():
+    """ Check the motion along RA and Dec, per-row epochs, and that rows without proper motions stay in place."""
+
+    values = {"pmra": np.array([0.0, 1000.0, np.nan]), "pmdec": np.array([1000.0, 0.0, np.nan]),
+              "ep": np.array([2010.0, 2010.0, 2010.0])}
+    pipeline = TransformPipeline([PropagateEpoch(epoch="ep", to_epoch=2020.0)])
+    ra, dec, _ = pipeline.apply([10.0, 10.0, 10.0], [0.0, 60.0, 5.0], values)
+
+    assert pipeline.columns == ["pmra", "pmdec", "ep"]
+    assert dec[0] * 3600 == pytest.approx(10, rel=1e-9)
+    assert (ra[1] - 10) * 3600 * np.cos(np.radians(60)) == pytest.approx(10, rel=1e-6)
+    assert (ra[2], dec[2]) == pytest.approx((10.0, 5.0))
+
+
+def test_unit_scaling_and_fingerprint():
+    """ Check the conversion to degrees and arcseconds, and that the fingerprint identifies the steps."""
+
+    pipeline = TransformPipeline([ScaleUnits(ra_unit="hourangle", error_unit="mas")])
+    ra, dec, error = pipeline.apply([1.5], [-30.0], error=[250.0])
+
+    assert (ra[0], dec[0], error[0]) == pytest.approx((22.5, -30.0, 0.25))
+    assert pipeline.scale_error([500.0])[0] == pytest.approx(0.5)
+    assert pipeline.fingerprint() == TransformPipeline([ScaleUnits(ra_unit="hourangle", error_unit="mas")]).fingerprint()
+    assert pipeline.fingerprint() != TransformPipeline([ScaleUnits(ra_unit="hourangle")]).fingerprint()
+    with pytest.raises(ValueError):
+        ScaleUnits(ra_unit="parsec")
+    with pytest.raises(ValueError):
+        RotateFrame("fk4")
+
+
+def test_xyz_to_radec_inverts_radec_to_xyz():
+    """ Check the conversion of unit vectors back to coordinates."""
+
+    ra, dec = xyz_to_radec(radec_to_xyz([359.5, 0.25], [-89.0, 45.0]))
+
+    assert ra == pytest.approx([359.5, 0.25])
+    assert dec == pytest.approx([-89.0, 45.0])